@@ -1,73 +1,352 @@
 from flask import Flask, render_template, g, request, jsonify, redirect, url_for, make_response
-import sqlite3, pickle, datetime
-# from transformers import AutoProcessor, AutoModel
+import sqlite3, concurrent.futures, datetime, functools, logging, os, threading, time
+from collections import OrderedDict
+import hnswlib
+import numpy as np
+import metrics
+from db import ReadPool, Writer
+from encoder import BACKENDS, QueryEncoder
+from page_cache import CachedResponse, PageCache, etag_for
+from retrieval import filter_category, hybrid_search, knn_query
+from quantized import QUANTIZED_FILE, RERANK, load_quantized
+from shards import SHARDS_FILE, load_sharded
+from stats import StatsCache
 
 DATABASE = 'papers.db'
-INDEX_FILE = 'index.pkl'
+INDEX_FILE = 'index.bin'  # written by scripts/embed_texts.py
+EMBEDDINGS_FILE = 'embeddings.npy'  # row i is the normalized embedding of paper i
+INDEX_EF = 50
+# 'hnsw' (index.bin), 'quantized' (quantized.npz codes re-ranked against embeddings.npy, far less RAM; see quantized.py)
+# or 'sharded' (index split over worker processes listed in shards.json; see shards.py)
+VECTOR_TIER = os.environ.get('ARXIVR_VECTOR_TIER', 'hnsw')
+SHARDS_CONFIG = os.environ.get('ARXIVR_SHARDS', SHARDS_FILE)
+QUANTIZED_RERANK = int(os.environ.get('ARXIVR_RERANK', RERANK))  # more = better recall, slower queries
+ENCODER_BACKEND = os.environ.get('ARXIVR_ENCODER', 'siglip')  # 'hashing' for a small offline stand-in
+ENCODER_TIMEOUT = 10  # seconds
+SEMANTIC_THRESHOLD = 0.0  # default minimum cosine similarity for semantic search results
+SAVED_QUERY_THRESHOLD = 0.3  # default minimum cosine similarity for saved-query alerts
+PAGE_CACHE_DIR = os.environ.get('ARXIVR_PAGE_CACHE_DIR')  # set to share rendered pages between waitress workers
 CATEGORIES = ['cs.CL', 'cs.AI', 'cs.MA', 'cs.CV', 'cs.LG', 'cs.RO', 'cs.SY', 'cs.SI', 'cs.HC', 'cs.IR'] 
 
-vector_index, processor, model = None, None, None
+vector_index, embeddings, query_encoder = None, None, None
+corpus_stats_cache = StatsCache()
+page_cache = PageCache(disk_dir=PAGE_CACHE_DIR)
+read_pool, writer = ReadPool(DATABASE), Writer(DATABASE)
+
+def load_vector_index():
+    global vector_index, embeddings
+    # memory-mapped, so vectors are read from the page cache and shared by all worker processes
+    vectors = np.load(EMBEDDINGS_FILE, mmap_mode='r')
+    if VECTOR_TIER == 'quantized':
+        index = load_quantized(QUANTIZED_FILE, vectors, QUANTIZED_RERANK)
+        if index is None:
+            raise FileNotFoundError(f"{QUANTIZED_FILE} not found; build it with scripts/build_quantized.py")
+    elif VECTOR_TIER == 'sharded':
+        index = load_sharded(SHARDS_CONFIG)
+        if index is None:
+            raise FileNotFoundError(f"{SHARDS_CONFIG} not found; build it with scripts/build_shards.py")
+    else:
+        index = hnswlib.Index(space='cosine', dim=vectors.shape[1])
+        index.load_index(INDEX_FILE)
+        index.set_ef(INDEX_EF)
+    embeddings, vector_index = vectors, index
+    logging.info(f"loaded vector index with {index.get_current_count()} items")
 
 def before_app_init():
-    global vector_index, processor, model
-    with open(INDEX_FILE, 'rb') as f:
-        vector_index = pickle.load(f)
-    # processor = AutoProcessor.from_pretrained("google/siglip-base-patch16-224")
-    # model = AutoModel.from_pretrained("google/siglip-base-patch16-224")
+    global query_encoder
+    # load in the background so the app can serve (without similar papers) while the index loads
+    def load():
+        try:
+            load_vector_index()
+        except Exception:
+            logging.exception("failed to load vector index")
+    threading.Thread(target=load, name='load-vector-index', daemon=True).start()
+    # the encoder loads and warms up its model on its own thread
+    query_encoder = QueryEncoder(BACKENDS[ENCODER_BACKEND]())
 
 before_app_init()
 
 app = Flask(__name__)
 
 def get_db():
+    """This thread's pooled read-only connection; writes go through `writer` (see db.py)."""
     db = getattr(g, '_database', None)
     if db is None:
-        db = g._database = sqlite3.connect(DATABASE)
-        db.row_factory = sqlite3.Row
+        db = g._database = read_pool.connection()
     return db
 
+def cache_version(db):
+    """Sum of the corpus_meta *_version counters (bumped by the ingest, embedding, neighbor and feed jobs) and when one last moved."""
+    try:
+        version, updated = db.execute("SELECT SUM(value), MAX(updated_at) FROM corpus_meta WHERE key LIKE '%_version'").fetchone()
+    except sqlite3.OperationalError:
+        return corpus_version(db), None
+    updated = datetime.datetime.strptime(updated, '%Y-%m-%d %H:%M:%S').replace(tzinfo=datetime.timezone.utc) if updated else None
+    return version, updated
+
+def saved_version(db, user_id):
+    row = db.execute('SELECT saved_version FROM users WHERE id = ?', (user_id,)).fetchone() if user_id else None
+    return row['saved_version'] if row else 0
+
+def cached_response(per_user=False, ttl=None):
+    """Serve the view from `page_cache` and answer conditional GETs with 304.
+
+    Keyed on the full path, the corpus version, whether semantic search is up (it changes
+    rankings and similar papers) and the login cookies (the nav shows them); `per_user` pages
+    also key on the user's saved_version, `ttl` pages (time-window stats) on a ttl-second bucket.
+    Last-Modified (the corpus update time) is only sent on pages nothing else changes: saving a
+    paper or a new stats bucket would otherwise be answered with a stale 304 to If-Modified-Since.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            db = get_db()
+            version, updated = cache_version(db)
+            user_id = request.cookies.get('user_id', '')
+            parts = [request.full_path, str(version), str(semantic_search_ready()), user_id, request.cookies.get('username', '')]
+            if per_user:
+                parts.append(str(saved_version(db, user_id)))
+            if ttl:
+                parts.append(str(int(time.time() // ttl)))
+            key = '|'.join(parts)
+            etag = etag_for(key)
+            modified = updated if not (ttl or per_user) else None
+            if etag in request.if_none_match or (
+                    not request.if_none_match and modified and request.if_modified_since and modified.replace(microsecond=0) <= request.if_modified_since):
+                response = app.response_class(status=304)
+            else:
+                entry = page_cache.get(key)
+                if entry is None:
+                    rendered = make_response(view(*args, **kwargs))
+                    if rendered.status_code != 200 or g.get('degraded'):
+                        return rendered  # redirects, errors and fallback answers aren't cached
+                    entry = CachedResponse(rendered.get_data(), rendered.mimetype, rendered.status_code)
+                    page_cache.put(key, entry)
+                response = app.response_class(entry.body, status=entry.status, mimetype=entry.mimetype)
+            response.set_etag(etag)
+            if modified:
+                response.last_modified = modified
+            response.headers['Cache-Control'] = 'private, no-cache' if user_id else 'no-cache'  # always revalidate
+            response.vary.add('Cookie')
+            return response
+        return wrapper
+    return decorator
+
 @app.route('/')
+@cached_response()
 def index():
     db = get_db()
     per_page = 10  # Number of papers per page
     page = request.args.get('page', 1, type=int)  # Get the page number from the query parameters
     category = request.args.get('category', None)
     search = request.args.get('search', None)
+    sort = request.args.get('sort', 'date')
     offset = (page - 1) * per_page
 
-    # TODO prefix match on category; create index on category
-    if search and category:
-        papers = db.execute("SELECT p.id, p.title, p.author, p.summary, p.category, p.published FROM papers_summary_fts fts JOIN papers p ON fts.rowid = p.id WHERE papers_summary_fts MATCH ? AND p.category LIKE ? ORDER BY p.published DESC LIMIT ? OFFSET ?", (search, '%' + category + '%', per_page, offset)).fetchall()
-        total_papers = db.execute("SELECT COUNT(*) as count FROM papers_summary_fts fts JOIN papers p ON fts.rowid = p.id WHERE papers_summary_fts MATCH ? AND p.category LIKE ?", (search, '%' + category + '%')).fetchone()['count']
-    elif search:
-        papers = db.execute("SELECT p.id, p.title, p.author, p.summary, p.category, p.published FROM papers_summary_fts fts JOIN papers p ON fts.rowid = p.id WHERE papers_summary_fts MATCH ? ORDER BY p.published DESC LIMIT ? OFFSET ?", (search, per_page, offset)).fetchall()
-        total_papers = db.execute("SELECT COUNT(*) as count FROM papers_summary_fts fts JOIN papers p ON fts.rowid = p.id WHERE papers_summary_fts MATCH ?", (search,)).fetchone()['count']
-    elif category:
-        papers = db.execute('SELECT id, title, author, summary, category, published FROM papers WHERE category LIKE ? ORDER BY published DESC LIMIT ? OFFSET ?', ('%' + category + '%', per_page, offset)).fetchall()
-        total_papers = db.execute('SELECT COUNT(*) as count FROM papers WHERE category LIKE ?', ('%' + category + '%',)).fetchone()['count']
+    if search and sort == 'relevance':
+        ranked = relevance_ranking(db, search, category)
+        papers = papers_by_ids(db, ranked[offset:offset + per_page])
+        total_papers = len(ranked)
+        has_prev, has_next, prev_cursor, next_cursor = page > 1, offset + per_page < total_papers, None, None
     else:
-        papers = db.execute('SELECT id, title, author, summary, category, published FROM papers ORDER BY published DESC LIMIT ? OFFSET ?', (per_page, offset)).fetchall()
-        total_papers = db.execute('SELECT COUNT(*) as count FROM papers').fetchone()['count']
+        cursor = parse_cursor(request.args.get('cursor'))
+        direction = 'prev' if request.args.get('dir') == 'prev' else 'next'
+        papers, more = listing_page(db, search, category, per_page, cursor, direction, offset)
+        total_papers = cached_count(db, search, category)
+        if direction == 'prev' and cursor:
+            has_prev, has_next = more, True
+        else:
+            has_prev, has_next = page > 1, more
+        prev_cursor = make_cursor(papers[0]) if papers else None
+        next_cursor = make_cursor(papers[-1]) if papers else None
 
     # Get total count of papers for pagination, considering the category filter
-    total_pages = (total_papers + per_page - 1) // per_page  # Ceiling division
-    return render_template('index.html', papers=papers, page=page, total_pages=total_pages, has_prev=page > 1, has_next=page < total_pages, categories=CATEGORIES)
+    total_pages = max((total_papers + per_page - 1) // per_page, page)  # Ceiling division
+    return render_template('index.html', papers=papers, page=page, total_pages=total_pages, has_prev=has_prev, has_next=has_next,
+                           prev_cursor=prev_cursor, next_cursor=next_cursor, categories=CATEGORIES)
+
+# The listing pages by keyset on (published, id), served by idx_papers_published: a page
+# seeks straight to the row after the cursor instead of stepping over OFFSET rows, so page 5000
+# costs about what page 1 does. `page` is only a label (and the fallback for old ?page=N links).
+LISTING_COLUMNS = 'p.id, p.title, p.author, p.summary, p.category, p.published'
+COUNT_CACHE_SIZE = 1024
+
+def make_cursor(row):
+    return f"{row['published']}_{row['id']}"
+
+def parse_cursor(cursor):
+    try:
+        published, paper_id = cursor.rsplit('_', 1)
+        return published, int(paper_id)
+    except (AttributeError, ValueError):
+        return None
+
+def listing_filters(search, category):
+    """FROM clause, WHERE conditions, params and sort key shared by a listing page and its count.
+
+    A category on its own is listed straight off paper_categories' (category, published, paper_id)
+    key, so neither the page nor the count touches papers outside the category.
+    """
+    source, where, params, key = 'papers p', [], [], ('p.published', 'p.id')
+    if search:
+        source = 'papers_summary_fts fts JOIN papers p ON fts.rowid = p.id'
+        where.append('papers_summary_fts MATCH ?')
+        params.append(search)
+    if category:
+        if search:
+            source += ' JOIN paper_categories pc ON pc.paper_id = p.id'
+        else:
+            source, key = 'paper_categories pc JOIN papers p ON p.id = pc.paper_id', ('pc.published', 'pc.paper_id')
+        where.append('pc.category = ?')
+        params.append(category)
+    return source, where, params, key
+
+def listing_page(db, search, category, per_page, cursor=None, direction='next', offset=0):
+    """Papers newest first, either side of `cursor`; returns (papers, whether there are more that way)."""
+    source, where, params, key = listing_filters(search, category)
+    order = 'DESC'
+    if cursor:
+        where.append(f"({key[0]}, {key[1]}) {'>' if direction == 'prev' else '<'} (?, ?)")
+        params.extend(cursor)
+        order = 'ASC' if direction == 'prev' else 'DESC'
+        offset = 0
+    sql = f"SELECT {LISTING_COLUMNS} FROM {source}"
+    if where:
+        sql += ' WHERE ' + ' AND '.join(where)
+    sql += f" ORDER BY {key[0]} {order}, {key[1]} {order} LIMIT ? OFFSET ?"
+    rows = db.execute(sql, params + [per_page + 1, offset]).fetchall()
+    more, rows = len(rows) > per_page, rows[:per_page]
+    if order == 'ASC':
+        rows.reverse()
+    return rows, more
+
+count_cache, count_cache_version, count_cache_lock = OrderedDict(), None, threading.Lock()
+
+def corpus_version(db):
+    try:
+        return db.execute("SELECT value FROM corpus_meta WHERE key = 'papers_version'").fetchone()[0]
+    except (sqlite3.OperationalError, TypeError):
+        # not migrated yet; new papers still move the max id
+        return db.execute('SELECT MAX(id) FROM papers').fetchone()[0]
+
+def cached_count(db, search, category):
+    """Number of papers in a listing, counted once per corpus version (ingest bumps it)."""
+    global count_cache_version
+    key, version = (search, category), corpus_version(db)
+    with count_cache_lock:
+        if version != count_cache_version:
+            count_cache.clear()
+            count_cache_version = version
+        if key in count_cache:
+            count_cache.move_to_end(key)
+            return count_cache[key]
+    source, where, params, _ = listing_filters(search, category)
+    if category and not search:
+        source = 'paper_categories pc'  # every row there has its paper; no need to join it
+    sql = f"SELECT COUNT(*) FROM {source}" + (' WHERE ' + ' AND '.join(where) if where else '')
+    count = db.execute(sql, params).fetchone()[0]
+    with count_cache_lock:
+        if version == count_cache_version:
+            count_cache[key] = count
+            if len(count_cache) > COUNT_CACHE_SIZE:
+                count_cache.popitem(last=False)
+    return count
+
+def papers_by_ids(db, ids):
+    """Listing rows for `ids`, in the order given (ids that don't exist are dropped)."""
+    if not ids:
+        return []
+    rows = {row['id']: row for row in db.execute(f"SELECT id, title, author, summary, category, published, abstract_link FROM papers WHERE id IN ({','.join('?' * len(ids))})", list(ids))}
+    return [rows[i] for i in ids if i in rows]
+
+def relevance_ranking(db, search, category=None, method='rrf', alpha=0.5):
+    """Paper ids for a text search ranked by fused bm25 + vector similarity (bm25 only until the encoder is ready).
+
+    When the encoder is backed up the ranking falls back to bm25 too, and `g.degraded` keeps it
+    out of the page cache.
+    """
+    vec = None
+    if semantic_search_ready():
+        try:
+            vec = query_encoder.encode(search, timeout=ENCODER_TIMEOUT)
+        except concurrent.futures.TimeoutError:
+            g.degraded = True
+    return [paper_id for paper_id, _ in hybrid_search(db, vector_index, search, vec, method=method, alpha=alpha, category=category)]
+
+def semantic_search(db, query, k=20, threshold=SEMANTIC_THRESHOLD, category=None):
+    """Papers closest to the natural-language `query`, most similar first, with their cosine similarity."""
+    vec = query_encoder.encode(query, timeout=ENCODER_TIMEOUT)
+    with metrics.KNN_SECONDS.time(caller='semantic'):
+        ids, dists = knn_query(vector_index, vec, k)
+    similarity = {int(i): 1.0 - float(d) for i, d in zip(ids[0], dists[0]) if 1.0 - d >= threshold}
+    ranked = filter_category(db, list(similarity), category)
+    return [dict(row, similarity=similarity[row['id']]) for row in papers_by_ids(db, ranked)]
+
+def semantic_search_ready():
+    return vector_index is not None and query_encoder is not None and query_encoder.ready.is_set()
+
+def semantic_search_args():
+    query = request.args.get('q', '').strip()
+    k = min(max(request.args.get('k', 20, type=int), 1), 100)
+    threshold = request.args.get('threshold', SEMANTIC_THRESHOLD, type=float)
+    return query, k, threshold, request.args.get('category') or None
+
+@app.route('/search/semantic')
+def semantic():
+    query, k, threshold, category = semantic_search_args()
+    papers, error, status = [], None, 200
+    if query:
+        if not semantic_search_ready():
+            error = "Semantic search is still warming up, try again in a bit."
+        else:
+            try:
+                papers = semantic_search(get_db(), query, k, threshold, category)
+            except concurrent.futures.TimeoutError:  # the encoder is backed up
+                error, status = "Semantic search is busy right now, try again in a bit.", 503
+    return render_template('semantic.html', papers=papers, query=query, threshold=threshold, error=error,
+                           categories=CATEGORIES, page_title="Semantic Search"), status
+
+@app.route('/api/search/semantic')
+def api_semantic():
+    query, k, threshold, category = semantic_search_args()
+    if not query:
+        return jsonify({'message': 'Missing query parameter q'}), 400
+    if not semantic_search_ready():
+        return jsonify({'message': 'Semantic search is not ready yet'}), 503
+    try:
+        papers = semantic_search(get_db(), query, k, threshold, category)
+    except concurrent.futures.TimeoutError:
+        return jsonify({'message': 'Semantic search is busy, try again later'}), 503
+    return jsonify({'query': query, 'threshold': threshold, 'results': papers})
+
+@app.route('/api/search/hybrid')
+@cached_response()
+def api_hybrid():
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'message': 'Missing query parameter q'}), 400
+    per_page = min(max(request.args.get('per_page', 10, type=int), 1), 100)
+    page = max(request.args.get('page', 1, type=int), 1)
+    method = request.args.get('method', 'rrf')
+    if method not in ('rrf', 'weighted', 'bm25', 'vector'):
+        return jsonify({'message': f'Unknown method {method}'}), 400
+    alpha = min(max(request.args.get('alpha', 0.5, type=float), 0.0), 1.0)
+    db = get_db()
+    ranked = relevance_ranking(db, query, request.args.get('category') or None, method, alpha)
+    papers = [dict(row) for row in papers_by_ids(db, ranked[(page - 1) * per_page:page * per_page])]
+    return jsonify({'query': query, 'method': method, 'page': page, 'total': len(ranked),
+                    'semantic': semantic_search_ready() and not g.get('degraded'), 'results': papers})
 
 @app.route('/about')
+@cached_response(ttl=60)
 def about():
-    db = get_db()
-    current_papers_count = db.execute('SELECT COUNT(*) as count FROM papers').fetchone()['count']
-    earliest_paper_indexed = db.execute('SELECT strftime("%Y-%m-%d", MIN(published)) as earliest FROM papers').fetchone()['earliest']
-    latest_paper_indexed = db.execute('SELECT strftime("%Y-%m-%d", MAX(published)) as latest FROM papers').fetchone()['latest']
-    current_time = datetime.datetime.now()
-    last_24_hours = current_time - datetime.timedelta(hours=24)
-    last_72_hours = current_time - datetime.timedelta(hours=72)
-    last_168_hours = current_time - datetime.timedelta(hours=168)
-
-    papers_last_24 = db.execute('SELECT COUNT(*) as count FROM papers WHERE published >= ?', (last_24_hours,)).fetchone()['count']
-    papers_last_72 = db.execute('SELECT COUNT(*) as count FROM papers WHERE published >= ?', (last_72_hours,)).fetchone()['count']
-    papers_last_168 = db.execute('SELECT COUNT(*) as count FROM papers WHERE published >= ?', (last_168_hours,)).fetchone()['count']
-    return render_template('about.html', current_papers_count=current_papers_count, earliest_paper_indexed=earliest_paper_indexed, latest_paper_indexed=latest_paper_indexed, papers_last_24=papers_last_24, papers_last_72=papers_last_72, papers_last_168=papers_last_168)
+    stats = corpus_stats_cache.get(get_db())
+    return render_template('about.html', current_papers_count=stats['papers'], earliest_paper_indexed=stats['earliest'], latest_paper_indexed=stats['latest'], papers_last_24=stats['last_24h'], papers_last_72=stats['last_72h'], papers_last_168=stats['last_168h'])
+
+@app.route('/api/stats')
+@cached_response(ttl=60)
+def api_stats():
+    return jsonify(corpus_stats_cache.get(get_db()))
 
 @app.errorhandler(404)
 def not_found(error):
@@ -90,10 +369,9 @@ def logout():
 def api_login():
     data = request.get_json()
     username = data.get('username')
-    db = get_db()
-    db.execute('INSERT OR IGNORE INTO users (username) VALUES (?)', (username,))
-    db.commit()
-    user = db.execute('SELECT id FROM users WHERE username = ?', (username,)).fetchone()
+    with writer.transaction() as db:
+        db.execute('INSERT OR IGNORE INTO users (username) VALUES (?)', (username,))
+        user = db.execute('SELECT id FROM users WHERE username = ?', (username,)).fetchone()
     response = make_response(jsonify({'message': 'Login successful', 'user_id': user['id'], 'username': username}), 200)
     response.set_cookie('user_id', str(user['id']))
     response.set_cookie('username', username)
@@ -102,18 +380,24 @@ def api_login():
 # === Paper Routes ===
 
 @app.route('/papers/<int:paper_id>')
+@cached_response()
 def paper(paper_id):
-    global vector_index
     db = get_db()
     paper = db.execute('SELECT * FROM papers WHERE id = ?', (paper_id,)).fetchone()
-    # TODO figure out how to nicely render distances in template
-    # TODO do we want to do a simpler BM25 or TF-IDF search instead to initially get similar papers?, then use the vector index for the final results?
-    try:
-        vec = vector_index.get_items([paper_id])
-        ids, _ = vector_index.knn_query(vec, k=10)
-        similar_papers = db.execute(f"SELECT * FROM papers WHERE id IN ({','.join(map(str, ids[0]))})").fetchall()
-    except:
-        similar_papers = []
+    # precomputed by scripts/neighbors.py, in kNN order
+    similar_papers = db.execute('SELECT p.id, p.title, n.distance FROM paper_neighbors n JOIN papers p ON p.id = n.neighbor_id WHERE n.paper_id = ? ORDER BY n.rank', (paper_id,)).fetchall()
+    if not similar_papers:
+        # papers added since the last neighbors run
+        try:
+            vec = np.asarray(embeddings[paper_id:paper_id + 1], dtype=np.float32)
+            if not vec.any():
+                raise KeyError(paper_id)  # not embedded yet
+            with metrics.KNN_SECONDS.time(caller='similar'):
+                ids, dists = knn_query(vector_index, vec, 11)
+            distance = {int(i): float(d) for i, d in zip(ids[0], dists[0]) if i != paper_id}
+            similar_papers = [dict(row, distance=distance[row['id']]) for row in papers_by_ids(db, list(distance)[:10])]
+        except:
+            similar_papers = []
     return render_template('paper.html', paper=paper, similar_papers=similar_papers, page_title="Paper")
 
 @app.route('/papers/save', methods=['POST'])
@@ -121,9 +405,7 @@ def save_paper():
     data = request.get_json()
     user_id = data.get('user_id')
     paper_id = data.get('paper_id')
-    db = get_db()
-    db.execute('INSERT INTO user_saved_papers (user_id, paper_id) VALUES (?, ?)', (user_id, paper_id))
-    db.commit()
+    writer.execute('INSERT INTO user_saved_papers (user_id, paper_id) VALUES (?, ?)', (user_id, paper_id))
     return jsonify({'message': 'Paper saved successfully'}), 200
 
 @app.route('/papers/unsave', methods=['POST'])
@@ -131,18 +413,79 @@ def unsave_paper():
     data = request.get_json()
     user_id = data.get('user_id')
     paper_id = data.get('paper_id')
-    db = get_db()
-    
     # Check if the paper exists before attempting to delete
-    result = db.execute('DELETE FROM user_saved_papers WHERE user_id = ? AND paper_id = ?', (user_id, paper_id))
-    db.commit()
+    result = writer.execute('DELETE FROM user_saved_papers WHERE user_id = ? AND paper_id = ?', (user_id, paper_id))
     
     if result.rowcount > 0:
         return jsonify({'message': 'Paper unsaved successfully'}), 200
     else:
         return jsonify({'message': 'Paper not found or already unsaved'}), 404
 
+# === Saved Query Routes ===
+# standing queries are matched against new papers by scripts/alerts.py after each ingest
+
+@app.route('/api/queries', methods=['GET', 'POST'])
+def api_queries():
+    user_id = request.cookies.get('user_id')
+    if not user_id:
+        return jsonify({'message': 'Login required'}), 401
+    if request.method == 'GET':
+        queries = get_db().execute('SELECT id, text, threshold, categories, created_at FROM saved_queries WHERE user_id = ? ORDER BY id', (user_id,)).fetchall()
+        return jsonify({'queries': [dict(row) for row in queries]})
+    data = request.get_json() or {}
+    if not isinstance(data, dict):
+        return jsonify({'message': 'Expected a JSON object'}), 400
+    text = data.get('query') or ''
+    if not isinstance(text, str) or not text.strip():
+        return jsonify({'message': 'Missing query'}), 400
+    text = text.strip()
+    threshold = data.get('threshold', SAVED_QUERY_THRESHOLD)
+    # bool is an int, and json accepts NaN/Infinity
+    if isinstance(threshold, bool) or not isinstance(threshold, (int, float)) or not np.isfinite(threshold):
+        return jsonify({'message': 'threshold must be a number'}), 400
+    threshold = min(max(float(threshold), -1.0), 1.0)
+    categories = data.get('categories', [])
+    if not isinstance(categories, list):
+        return jsonify({'message': 'categories must be a list'}), 400
+    categories = [c for c in categories if c in CATEGORIES]
+    if not semantic_search_ready():
+        return jsonify({'message': 'Semantic search is not ready yet'}), 503
+    try:
+        vec = query_encoder.encode(text, timeout=ENCODER_TIMEOUT)
+    except concurrent.futures.TimeoutError:
+        return jsonify({'message': 'Semantic search is busy, try again later'}), 503
+    model = getattr(query_encoder.backend, 'model_id', ENCODER_BACKEND)
+    cursor = writer.execute('INSERT INTO saved_queries (user_id, text, embedding, model, threshold, categories) VALUES (?, ?, ?, ?, ?, ?)',
+                            (user_id, text, np.asarray(vec, dtype=np.float32).tobytes(), model, threshold, ','.join(categories)))
+    return jsonify({'id': cursor.lastrowid, 'query': text, 'threshold': threshold, 'categories': categories}), 201
+
+@app.route('/api/queries/<int:query_id>', methods=['DELETE'])
+def api_delete_query(query_id):
+    user_id = request.cookies.get('user_id')
+    if not user_id:
+        return jsonify({'message': 'Login required'}), 401
+    result = writer.execute('DELETE FROM saved_queries WHERE id = ? AND user_id = ?', (query_id, user_id))
+    if result.rowcount > 0:
+        return jsonify({'message': 'Query deleted'}), 200
+    return jsonify({'message': 'Query not found'}), 404
+
+@app.route('/api/alerts')
+def api_alerts():
+    """Matches for the logged-in user after alert id `after`, oldest first; poll again with `next`."""
+    user_id = request.cookies.get('user_id')
+    if not user_id:
+        return jsonify({'message': 'Login required'}), 401
+    after = request.args.get('after', 0, type=int)
+    limit = min(max(request.args.get('limit', 50, type=int), 1), 500)
+    alerts = get_db().execute('''
+        SELECT a.id, a.query_id, q.text AS query, a.score, a.created_at, p.id AS paper_id, p.title, p.author, p.category, p.published, p.abstract_link
+        FROM query_alerts a JOIN saved_queries q ON q.id = a.query_id JOIN papers p ON p.id = a.paper_id
+        WHERE a.user_id = ? AND a.id > ? ORDER BY a.id LIMIT ?
+    ''', (user_id, after, limit)).fetchall()
+    return jsonify({'alerts': [dict(row) for row in alerts], 'next': alerts[-1]['id'] if alerts else after})
+
 @app.route('/papers/saved')
+@cached_response(per_user=True)
 def saved():
     user_id = request.cookies.get('user_id')
     if not user_id:
@@ -153,7 +496,7 @@ def saved():
     category = request.args.get('category', None)
 
     if category:
-        papers = db.execute('SELECT id, title, author, published, category, summary FROM papers WHERE id IN (SELECT paper_id FROM user_saved_papers WHERE user_id = ?) AND category LIKE ? ORDER BY published DESC', (user_id, '%' + category + '%')).fetchall()
+        papers = db.execute('SELECT p.id, p.title, p.author, p.published, p.category, p.summary FROM user_saved_papers s JOIN paper_categories pc ON pc.paper_id = s.paper_id JOIN papers p ON p.id = s.paper_id WHERE s.user_id = ? AND pc.category = ? ORDER BY p.published DESC', (user_id, category)).fetchall()
     else:
         papers = db.execute('SELECT id, title, author, published, category, summary FROM papers WHERE id IN (SELECT paper_id FROM user_saved_papers WHERE user_id = ?) ORDER BY published DESC', (user_id,)).fetchall()
         papers = [dict(paper) for paper in papers]  # Convert to dict for easier date parsing
@@ -167,7 +510,39 @@ def saved():
     
     return render_template('saved.html', papers=papers, page_title="Saved Papers", categories=CATEGORIES)
 
+@app.route('/papers/for-you')
+@cached_response(per_user=True)
+def for_you():
+    user_id = request.cookies.get('user_id')
+    if not user_id:
+        return redirect(url_for('login'))
+    db = get_db()
+    # precomputed by scripts/recommend.py, best match first
+    papers = db.execute('SELECT p.id, p.title, p.author, p.summary, p.category, p.published, p.abstract_link, r.score AS similarity FROM user_recommendations r JOIN papers p ON p.id = r.paper_id WHERE r.user_id = ? ORDER BY r.rank', (user_id,)).fetchall()
+    pending = db.execute('SELECT 1 FROM user_feed_dirty WHERE user_id = ?', (user_id,)).fetchone() is not None
+    return render_template('for_you.html', papers=papers, pending=pending, page_title="For You")
+
+@app.before_request
+def start_timer():
+    g._started = time.perf_counter()
+
+@app.after_request
+def record_latency(response):
+    started = g.pop('_started', None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        metrics.HTTP_SECONDS.observe(time.perf_counter() - started, route=route, method=request.method, status=response.status_code)
+    return response
+
+@app.route('/metrics')
+def metrics_endpoint():
+    if not metrics.ENABLED:
+        return jsonify({'message': 'Metrics are disabled (ARXIVR_METRICS=0)'}), 404
+    return app.response_class(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.teardown_appcontext
 def close_connection(exception):
-    db = getattr(g, '_database', None)
-    if db is not None:
-        db.close()
+    # the connection goes back to the pool (it belongs to this thread), it isn't closed
+    db = g.pop('_database', None)
+    if db is not None and db.in_transaction:
+        db.rollback()
@@ -0,0 +1,104 @@
+"""
+SQLite connections for the web app.
+
+Reads go through `ReadPool`: one connection per server thread, opened read-only
+(`file:...?mode=ro` + `PRAGMA query_only`), memory-mapped and with a bigger page cache, and
+kept for the life of the thread instead of being opened (and leaked) per request. Each
+connection's statement cache (`cached_statements`) keeps the app's fixed SQL strings
+prepared, so repeated requests skip parsing and planning.
+
+Writes (login, save/unsave, saved queries) go through the single `Writer` connection, one
+statement or transaction at a time under a lock, with `BEGIN IMMEDIATE` so the write lock is
+taken up front and waited for (busy_timeout) rather than failing halfway with "database is
+locked". The database is in WAL mode (see scripts/ingest.py), so readers aren't blocked by
+the writer or by an ingest run.
+
+With metrics on (see metrics.py) both use `TimedConnection`, so statements are timed and slow
+ones logged.
+"""
+import contextlib, os, sqlite3, threading
+from typing import Iterator
+
+from metrics import connection_factory
+
+CACHED_STATEMENTS = 512
+READ_PRAGMAS = (
+    'PRAGMA query_only = ON',
+    'PRAGMA mmap_size = 268435456',  # 256MB: pages are read straight from the OS cache
+    'PRAGMA cache_size = -32768',    # 32MB per connection
+    'PRAGMA temp_store = MEMORY',
+    'PRAGMA busy_timeout = 5000',
+)
+WRITE_PRAGMAS = (
+    'PRAGMA journal_mode = WAL',
+    'PRAGMA synchronous = NORMAL',
+    'PRAGMA busy_timeout = 30000',   # an ingest batch can hold the write lock for a while
+)
+
+
+class ReadPool:
+    def __init__(self, db_file: str):
+        self.uri = f"file:{os.path.abspath(db_file)}?mode=ro"
+        self.local = threading.local()
+        self.connections = []
+        self.lock = threading.Lock()
+
+    def connection(self) -> sqlite3.Connection:
+        db = getattr(self.local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.uri, uri=True, check_same_thread=False, cached_statements=CACHED_STATEMENTS,
+                                 factory=connection_factory())
+            db.row_factory = sqlite3.Row
+            for pragma in READ_PRAGMAS:
+                db.execute(pragma)
+            self.local.db = db
+            with self.lock:
+                self.connections.append(db)
+        return db
+
+    def close(self):
+        with self.lock:
+            for db in self.connections:
+                db.close()
+            self.connections = []
+        self.local = threading.local()
+
+
+class Writer:
+    def __init__(self, db_file: str):
+        self.db_file = db_file
+        self.db = None
+        self.lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self.db is None:
+            # autocommit mode; transactions are explicit below
+            self.db = sqlite3.connect(self.db_file, check_same_thread=False, isolation_level=None,
+                                      cached_statements=CACHED_STATEMENTS, factory=connection_factory())
+            self.db.row_factory = sqlite3.Row
+            for pragma in WRITE_PRAGMAS:
+                self.db.execute(pragma)
+        return self.db
+
+    @contextlib.contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        with self.lock:
+            db = self._connect()
+            db.execute('BEGIN IMMEDIATE')
+            try:
+                yield db
+            except BaseException:
+                db.execute('ROLLBACK')
+                raise
+            db.execute('COMMIT')
+
+    def execute(self, sql: str, params=()) -> sqlite3.Cursor:
+        """Run one statement in its own transaction; the cursor keeps rowcount/lastrowid."""
+        with self.transaction() as db:
+            return db.execute(sql, params)
+
+    def close(self):
+        with self.lock:
+            if self.db is not None:
+                self.db.close()
+                self.db = None
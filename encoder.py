@@ -0,0 +1,155 @@
+"""
+Long-lived query encoder for semantic search.
+
+A single background thread owns the model. Requests from concurrent web threads are queued,
+and whatever arrives within `max_wait` seconds (up to `max_batch` texts) goes through the
+model in one forward pass. Encoded queries are kept in a per-process LRU cache, so popular
+queries skip the model entirely.
+"""
+import hashlib, logging, queue, threading, time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import List, Optional
+
+import numpy as np
+
+import metrics
+
+MODEL_ID = 'google/siglip-base-patch16-224'
+
+
+class SiglipBackend:
+    """The model the abstracts were embedded with (see scripts/embed_texts.py)."""
+
+    def __init__(self, model_id: str = MODEL_ID, device: Optional[str] = None):
+        self.model_id = model_id
+        self.device = device
+        self.processor = self.model = self.tokenizer = None
+
+    def load(self):
+        import torch
+        from transformers import AutoProcessor, AutoModel
+        self.torch = torch
+        self.device = self.device or ('cuda' if torch.cuda.is_available() else 'cpu')
+        self.processor = AutoProcessor.from_pretrained(self.model_id)
+        self.model = AutoModel.from_pretrained(self.model_id).to(self.device).eval()
+        self.tokenizer = self.processor.tokenizer
+
+    def token_lengths(self, texts: List[str]) -> List[int]:
+        """Tokens per text after truncation, i.e. what each text costs in a padded batch. Only needs the tokenizer."""
+        if self.tokenizer is None:
+            from transformers import AutoTokenizer
+            self.tokenizer = AutoTokenizer.from_pretrained(self.model_id)
+        return [len(ids) for ids in self.tokenizer(texts, truncation=True)['input_ids']]
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        inputs = self.processor(text=texts, return_tensors="pt", padding=True, truncation=True).to(self.device)
+        with self.torch.no_grad():
+            text_embeds = self.model.get_text_features(**inputs)
+            text_embeds = text_embeds / text_embeds.norm(p=2, dim=-1, keepdim=True)
+        return text_embeds.cpu().numpy().astype(np.float32)
+
+
+class HashingBackend:
+    """Small offline stand-in: hashed bag of words -> embedding table -> dense projection.
+
+    Not in the same space as the SigLIP index, so only useful for development and benchmarks,
+    but it batches like a real model (one matmul per batch).
+    """
+
+    def __init__(self, dim: int = 768, buckets: int = 1 << 15, hidden: int = 256, seed: int = 0):
+        self.dim, self.buckets, self.hidden, self.seed = dim, buckets, hidden, seed
+
+    def load(self):
+        rng = np.random.default_rng(self.seed)
+        self.table = rng.standard_normal((self.buckets, self.hidden), dtype=np.float32)
+        self.projection = rng.standard_normal((self.hidden, self.dim), dtype=np.float32) / np.sqrt(self.hidden)
+
+    def _bucket(self, token: str) -> int:
+        return int.from_bytes(hashlib.blake2b(token.encode(), digest_size=4).digest(), 'little') % self.buckets
+
+    def token_lengths(self, texts: List[str]) -> List[int]:
+        return [max(len(text.split()), 1) for text in texts]
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        bags = np.zeros((len(texts), self.hidden), dtype=np.float32)
+        for i, text in enumerate(texts):
+            tokens = [self._bucket(t) for t in text.lower().split()] or [0]
+            bags[i] = self.table[tokens].mean(axis=0)
+        out = np.tanh(bags) @ self.projection
+        return out / np.linalg.norm(out, axis=1, keepdims=True)
+
+
+BACKENDS = {'siglip': SiglipBackend, 'hashing': HashingBackend}
+
+
+class QueryEncoder:
+    def __init__(self, backend, max_batch: int = 32, max_wait: float = 0.005, cache_size: int = 4096):
+        self.backend = backend
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.cache_lock = threading.Lock()
+        self.requests = queue.Queue()
+        self.ready = threading.Event()
+        self.batches = self.encoded = self.cache_hits = 0
+        self.thread = threading.Thread(target=self._run, name='query-encoder', daemon=True)
+        self.thread.start()
+
+    def encode(self, text: str, timeout: Optional[float] = None) -> np.ndarray:
+        """Normalized float32 embedding of `text`; blocks until its batch has run."""
+        text = ' '.join(text.split())
+        with self.cache_lock:
+            vector = self.cache.get(text)
+            if vector is not None:
+                self.cache.move_to_end(text)
+                self.cache_hits += 1
+                metrics.ENCODER_CACHE_HITS.inc()
+                return vector
+        future = Future()
+        self.requests.put((text, future))
+        vector = future.result(timeout)
+        with self.cache_lock:
+            self.cache[text] = vector
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return vector
+
+    def _collect(self) -> list:
+        batch = [self.requests.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.requests.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        try:
+            self.backend.load()
+            self.backend.encode(['warm up'])  # first forward pass is slow; don't make a user wait for it
+        except Exception:
+            logging.exception("failed to load query encoder")
+            return
+        self.ready.set()
+        while True:
+            batch = self._collect()
+            # identical queries in one batch are encoded once
+            texts = list(dict.fromkeys(text for text, _ in batch))
+            try:
+                with metrics.ENCODER_BATCH_SECONDS.time():
+                    vectors = dict(zip(texts, self.backend.encode(texts)))
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            self.batches += 1
+            self.encoded += len(texts)
+            metrics.ENCODER_BATCH_SIZE.observe(len(texts))
+            for text, future in batch:
+                future.set_result(vectors[text])
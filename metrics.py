@@ -0,0 +1,195 @@
+"""
+Lightweight in-process instrumentation: counters and latency histograms with labels, exposed in
+Prometheus text format (the app's /metrics) and as a JSON summary (written by the scrape and
+embed scripts when they finish).
+
+Set ARXIVR_METRICS=0 to turn it off: every inc/observe/time returns before taking a lock or
+reading the clock, and SQLite connections are plain ones. ARXIVR_SLOW_QUERY_MS (default 100)
+is the threshold above which a statement is logged with its SQL.
+"""
+import contextlib, json, logging, os, sqlite3, threading, time
+from typing import Dict, Iterator, Sequence, Tuple
+
+ENABLED = os.environ.get('ARXIVR_METRICS', '1').lower() not in ('0', 'false', 'off')
+SLOW_QUERY_SECONDS = float(os.environ.get('ARXIVR_SLOW_QUERY_MS', 100)) / 1000
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+logger = logging.getLogger('arxivr.metrics')
+REGISTRY = []
+
+
+class Metric:
+    kind = ''
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self.values: Dict[Tuple[str, ...], object] = {}
+        self.lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels: dict) -> Tuple[str, ...]:
+        return tuple(str(labels.get(label, '')) for label in self.labels)
+
+    def _label_text(self, key: Tuple[str, ...], extra: str = '') -> str:
+        pairs = [f'{label}="{value}"' for label, value in zip(self.labels, key)] + ([extra] if extra else [])
+        return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        if not ENABLED:
+            return
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self) -> Iterator[str]:
+        for key, value in sorted(self.values.items()):
+            yield f'{self.name}{self._label_text(key)} {value}'
+
+    def summary(self) -> dict:
+        return {','.join(key) or 'total': value for key, value in sorted(self.values.items())}
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels):
+        if not ENABLED:
+            return
+        key = self._key(labels)
+        with self.lock:
+            state = self.values.get(key)
+            if state is None:
+                state = self.values[key] = [[0] * len(self.buckets), 0, 0.0]  # per-bucket counts, count, sum
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += 1
+            state[2] += value
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        if not ENABLED:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> Iterator[str]:
+        for key, (counts, count, total) in sorted(self.values.items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                le = f'le="{bound}"'
+                yield f'{self.name}_bucket{self._label_text(key, le)} {cumulative}'
+            le = 'le="+Inf"'
+            yield f'{self.name}_bucket{self._label_text(key, le)} {count}'
+            yield f'{self.name}_count{self._label_text(key)} {count}'
+            yield f'{self.name}_sum{self._label_text(key)} {total}'
+
+    def quantile(self, counts, count, q: float) -> float:
+        # upper bound of the bucket the quantile falls in (inf if past the last one)
+        cumulative = 0
+        for bound, n in zip(self.buckets, counts):
+            cumulative += n
+            if cumulative >= q * count:
+                return bound
+        return float('inf')
+
+    def summary(self) -> dict:
+        return {','.join(key) or 'total': {'count': count, 'sum': total, 'mean': total / count if count else 0.0,
+                                           'p50_le': self.quantile(counts, count, 0.5), 'p99_le': self.quantile(counts, count, 0.99)}
+                for key, (counts, count, total) in sorted(self.values.items())}
+
+
+def render() -> str:
+    """Every metric in Prometheus text exposition format."""
+    lines = []
+    for metric in REGISTRY:
+        with metric.lock:
+            if not metric.values:
+                continue
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+def summary() -> dict:
+    out = {}
+    for metric in REGISTRY:
+        with metric.lock:
+            if metric.values:
+                out[metric.name] = metric.summary()
+    return out
+
+
+def write_summary(path: str, **extra):
+    if not ENABLED:
+        return
+    with open(path, 'w') as f:
+        json.dump({'written_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()), **extra, 'metrics': summary()}, f, indent=1)
+    logger.info(f"wrote metrics summary to {path}")
+
+
+# app
+HTTP_SECONDS = Histogram('arxivr_http_request_duration_seconds', 'Request latency by route', ('route', 'method', 'status'))
+KNN_SECONDS = Histogram('arxivr_knn_query_duration_seconds', 'Vector index query latency', ('caller',))
+ENCODER_BATCH_SECONDS = Histogram('arxivr_encoder_batch_duration_seconds', 'Query encoder forward pass latency')
+ENCODER_BATCH_SIZE = Histogram('arxivr_encoder_batch_size', 'Texts per query encoder batch', buckets=(1, 2, 4, 8, 16, 32, 64, 128))
+ENCODER_CACHE_HITS = Counter('arxivr_encoder_cache_hits_total', 'Queries answered from the encoder cache')
+SHARD_SECONDS = Histogram('arxivr_shard_query_duration_seconds', 'kNN round trip to one shard worker', ('shard',))
+SHARD_FAILURES = Counter('arxivr_shard_failures_total', 'Shard queries that timed out or failed', ('shard', 'reason'))
+PARTIAL_RESULTS = Counter('arxivr_shard_partial_results_total', 'Sharded kNN answers missing at least one shard')
+# sqlite (app and ingest connections)
+SQL_SECONDS = Histogram('arxivr_sqlite_statement_duration_seconds', 'SQLite statement latency (execute, not fetching)', ('op',))
+SLOW_QUERIES = Counter('arxivr_sqlite_slow_statements_total', 'Statements slower than ARXIVR_SLOW_QUERY_MS', ('op',))
+# pipelines
+PAGES_FETCHED = Counter('arxivr_ingest_pages_fetched_total', 'arXiv API pages fetched')
+PAGE_RETRIES = Counter('arxivr_ingest_page_retries_total', 'arXiv API page attempts that errored or came back empty')
+FAILED_QUERIES = Counter('arxivr_ingest_failed_queries_total', 'arXiv API queries given up on (also logged to failed_queries.txt)')
+ROWS_UPSERTED = Counter('arxivr_ingest_rows_total', 'Paper rows by what the writer did with them', ('result',))
+EMBEDDED = Counter('arxivr_embed_papers_total', 'Papers embedded or removed from the index', ('result',))
+EMBED_STEP_SECONDS = Histogram('arxivr_embed_step_duration_seconds', 'Time per update_index step', ('step',))
+
+
+def _statement_op(sql: str) -> str:
+    words = sql.lstrip().split(None, 1)
+    return words[0].upper() if words else ''
+
+
+class TimedConnection(sqlite3.Connection):
+    """sqlite3 connection that times `execute`/`executemany` and logs slow statements."""
+
+    def _timed(self, method, sql, params):
+        start = time.perf_counter()
+        try:
+            return method(sql, params)
+        finally:
+            elapsed = time.perf_counter() - start
+            op = _statement_op(sql)
+            SQL_SECONDS.observe(elapsed, op=op)
+            if elapsed >= SLOW_QUERY_SECONDS:
+                SLOW_QUERIES.inc(op=op)
+                logger.warning(f"slow statement ({elapsed * 1000:.0f} ms): {' '.join(sql.split())[:500]}")
+
+    def execute(self, sql, params=()):
+        return self._timed(super().execute, sql, params)
+
+    def executemany(self, sql, params):
+        return self._timed(super().executemany, sql, params)
+
+
+def connection_factory():
+    return TimedConnection if ENABLED else sqlite3.Connection
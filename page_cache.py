@@ -0,0 +1,124 @@
+"""
+Rendered-response cache for pages and JSON that only change when the corpus does.
+
+Entries are keyed by the request (path + query string), the corpus version the app read from
+corpus_meta (bumped by ingest, embedding, neighbor and feed jobs) and whatever else the
+response depends on (the login cookies the nav bar shows, a user's saved_version...). Since
+the version is part of the key, nothing is ever invalidated: a new corpus version just stops
+hitting the old entries, which age out of the LRU.
+
+The in-process LRU is bounded by entry count and total bytes. With `disk_dir` set, entries
+are also written there (one file per key, replaced atomically), so the waitress worker
+processes share what any of them rendered; the directory is pruned to `disk_entries` files
+by age.
+"""
+import hashlib, os, pickle, tempfile, threading
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+MAX_ENTRIES = 2048
+MAX_BYTES = 64 * 2**20
+DISK_ENTRIES = 20000
+PRUNE_EVERY = 500  # disk writes between prunes
+
+
+class CachedResponse(NamedTuple):
+    body: bytes
+    mimetype: str
+    status: int
+
+
+def etag_for(key: str) -> str:
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+class PageCache:
+    def __init__(self, max_entries: int = MAX_ENTRIES, max_bytes: int = MAX_BYTES,
+                 disk_dir: Optional[str] = None, disk_entries: int = DISK_ENTRIES):
+        self.max_entries, self.max_bytes = max_entries, max_bytes
+        self.disk_dir, self.disk_entries = disk_dir, disk_entries
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.lock = threading.Lock()
+        self.hits = self.disk_hits = self.misses = 0
+        self.disk_writes = 0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry
+        entry = self._read_disk(key)
+        with self.lock:
+            if entry is None:
+                self.misses += 1
+            else:
+                self.disk_hits += 1
+                self._remember(key, entry)
+        return entry
+
+    def put(self, key: str, entry: CachedResponse):
+        with self.lock:
+            self._remember(key, entry)
+        self._write_disk(key, entry)
+
+    def _remember(self, key: str, entry: CachedResponse):
+        if len(entry.body) > self.max_bytes:
+            return
+        old = self.entries.pop(key, None)
+        if old is not None:
+            self.bytes -= len(old.body)
+        self.entries[key] = entry
+        self.bytes += len(entry.body)
+        while len(self.entries) > self.max_entries or self.bytes > self.max_bytes:
+            _, evicted = self.entries.popitem(last=False)
+            self.bytes -= len(evicted.body)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, etag_for(key))
+
+    def _read_disk(self, key: str) -> Optional[CachedResponse]:
+        if not self.disk_dir:
+            return None
+        try:
+            with open(self._path(key), 'rb') as f:
+                stored_key, entry = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        return CachedResponse(*entry) if stored_key == key else None
+
+    def _write_disk(self, key: str, entry: CachedResponse):
+        if not self.disk_dir:
+            return
+        fd, tmp = tempfile.mkstemp(dir=self.disk_dir, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump((key, tuple(entry)), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self._path(key))
+        except OSError:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            return
+        with self.lock:
+            self.disk_writes += 1
+            prune = self.disk_writes % PRUNE_EVERY == 0
+        if prune:
+            self.prune_disk()
+
+    def prune_disk(self):
+        try:
+            files = [e for e in os.scandir(self.disk_dir) if e.is_file() and not e.name.startswith('.')]
+        except OSError:
+            return
+        if len(files) <= self.disk_entries:
+            return
+        files.sort(key=lambda e: e.stat().st_mtime)
+        for entry in files[:len(files) - self.disk_entries]:
+            try:
+                os.unlink(entry.path)
+            except OSError:
+                pass  # another worker got there first
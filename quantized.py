@@ -0,0 +1,157 @@
+"""
+Compact vector tier: quantized codes for candidate generation, exact re-rank from the memmap.
+
+Instead of an hnswlib graph over full float32 vectors (3KB per paper plus the graph), only a
+code per paper is kept in RAM:
+
+  int8  one signed byte per dimension with a per-dimension scale (dim bytes, 4x smaller)
+  pq    product quantization: the vector is cut into `m` subvectors, each replaced by the id
+        of its nearest of 256 centroids learned on a sample (m bytes, e.g. 96 for 32x smaller)
+
+A query scans the codes (chunked, so the scan never materializes more than CHUNK rows of
+floats), keeps the `rerank` best approximate matches and re-scores those against the exact
+vectors in embeddings.npy, which is memory-mapped so only the rows touched are paged in.
+Smaller codes save RAM and lose recall in the first stage; a deeper `rerank` buys it back at
+the cost of more random reads. `QuantizedIndex.knn_query` has the same shape as hnswlib's,
+so the app can serve from either tier.
+"""
+import os
+from typing import Optional, Tuple
+
+import numpy as np
+
+QUANTIZED_FILE = 'quantized.npz'  # written by scripts/build_quantized.py (np.savez of kind, ids, codes + quantizer state)
+RERANK = 100
+PQ_M = 96
+PQ_CENTROIDS = 256
+CHUNK = 8192  # codes scored at a time (an int8 chunk is widened to float32 for the matmul)
+
+
+def kmeans(x: np.ndarray, k: int, iterations: int = 20, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centroids = x[rng.choice(len(x), size=k, replace=len(x) < k)].copy()
+    for _ in range(iterations):
+        assign = nearest(x, centroids)
+        for c in range(k):
+            members = x[assign == c]
+            # an empty cluster takes a random point so all k codes stay in use
+            centroids[c] = members.mean(axis=0) if len(members) else x[rng.integers(len(x))]
+    return centroids
+
+
+def nearest(x: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    # argmin ||x - c||^2 = argmin ||c||^2 - 2 x.c
+    return np.argmin((centroids ** 2).sum(axis=1) - 2 * x @ centroids.T, axis=1)
+
+
+class Int8Quantizer:
+    kind = 'int8'
+
+    def __init__(self, scale: Optional[np.ndarray] = None):
+        self.scale = scale
+
+    def fit(self, sample: np.ndarray):
+        scale = np.abs(sample).max(axis=0) / 127
+        self.scale = np.where(scale > 0, scale, 1.0).astype(np.float32)
+        return self
+
+    def encode(self, x: np.ndarray) -> np.ndarray:
+        return np.clip(np.rint(x / self.scale), -127, 127).astype(np.int8)
+
+    def scores(self, query: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        # fold the scale into the query: x.q ~ (codes * scale).q = codes.(scale * q)
+        return codes.astype(np.float32) @ (query * self.scale)
+
+    def state(self) -> dict:
+        return {'scale': self.scale}
+
+
+class PQQuantizer:
+    kind = 'pq'
+
+    def __init__(self, m: int = PQ_M, centroids: Optional[np.ndarray] = None):
+        self.m = m
+        self.centroids = centroids  # (m, PQ_CENTROIDS, dim // m)
+
+    def fit(self, sample: np.ndarray, iterations: int = 20):
+        if sample.shape[1] % self.m:
+            raise ValueError(f"dim {sample.shape[1]} isn't divisible into {self.m} subvectors")
+        sub = sample.shape[1] // self.m
+        self.centroids = np.stack([kmeans(sample[:, j * sub:(j + 1) * sub], PQ_CENTROIDS, iterations, seed=j)
+                                   for j in range(self.m)]).astype(np.float32)
+        return self
+
+    def encode(self, x: np.ndarray) -> np.ndarray:
+        sub = self.centroids.shape[2]
+        return np.stack([nearest(x[:, j * sub:(j + 1) * sub], self.centroids[j]) for j in range(self.m)], axis=1).astype(np.uint8)
+
+    def scores(self, query: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        # asymmetric distance: the query stays exact, so per subvector its inner product with
+        # each of the 256 centroids is a table lookup
+        tables = np.einsum('md,mkd->mk', query.reshape(self.m, -1), self.centroids)
+        return tables[np.arange(self.m), codes].sum(axis=1)
+
+    def state(self) -> dict:
+        return {'centroids': self.centroids}
+
+
+QUANTIZERS = {'int8': Int8Quantizer, 'pq': PQQuantizer}
+
+
+class QuantizedIndex:
+    """Codes for `ids` (paper ids), re-ranked against `vectors` (row == paper id) when given."""
+
+    def __init__(self, quantizer, ids: np.ndarray, codes: np.ndarray, vectors: Optional[np.ndarray] = None, rerank: int = RERANK):
+        self.quantizer, self.ids, self.codes = quantizer, ids, codes
+        self.vectors, self.rerank = vectors, rerank
+
+    def get_current_count(self) -> int:
+        return len(self.ids)
+
+    @property
+    def nbytes(self) -> int:
+        return self.ids.nbytes + self.codes.nbytes + sum(v.nbytes for v in self.quantizer.state().values())
+
+    def _candidates(self, query: np.ndarray, n: int) -> Tuple[np.ndarray, np.ndarray]:
+        best_rows, best_scores = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        for start in range(0, len(self.codes), CHUNK):
+            scores = self.quantizer.scores(query, self.codes[start:start + CHUNK])
+            top = np.argpartition(-scores, n - 1)[:n] if len(scores) > n else np.arange(len(scores))
+            best_rows = np.concatenate([best_rows, top + start])
+            best_scores = np.concatenate([best_scores, scores[top]])
+            if len(best_rows) > n:
+                keep = np.argpartition(-best_scores, n - 1)[:n]
+                best_rows, best_scores = best_rows[keep], best_scores[keep]
+        return best_rows, best_scores
+
+    def knn_query(self, vec: np.ndarray, k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        """(labels, cosine distances) of shape (queries, k), nearest first, like hnswlib.Index.knn_query."""
+        queries = np.atleast_2d(np.asarray(vec, dtype=np.float32))
+        k = min(k, len(self.ids))
+        labels = np.empty((len(queries), k), dtype=np.uint64)
+        distances = np.empty((len(queries), k), dtype=np.float32)
+        for qi, query in enumerate(queries):
+            query = query / (np.linalg.norm(query) or 1.0)
+            rows, scores = self._candidates(query, max(k, self.rerank))
+            if self.vectors is not None:
+                # sorted ids so the memmap is read front to back
+                ids = np.sort(self.ids[rows])
+                scores = np.asarray(self.vectors[ids], dtype=np.float32) @ query
+            else:
+                ids = self.ids[rows]
+            order = np.argsort(-scores)[:k]
+            labels[qi], distances[qi] = ids[order], 1.0 - scores[order]
+        return labels, distances
+
+
+def load_quantized(path: str = QUANTIZED_FILE, vectors: Optional[np.ndarray] = None, rerank: int = RERANK) -> Optional[QuantizedIndex]:
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as data:
+        kind = str(data['kind'])
+        state = {name: data[name] for name in data.files if name not in ('kind', 'ids', 'codes')}
+        if kind == 'pq':
+            quantizer = PQQuantizer(m=state['centroids'].shape[0], centroids=state['centroids'])
+        else:
+            quantizer = QUANTIZERS[kind](**state)
+        return QuantizedIndex(quantizer, data['ids'], data['codes'], vectors, rerank)
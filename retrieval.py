@@ -0,0 +1,133 @@
+"""
+Hybrid lexical + vector retrieval.
+
+Candidates come from two bounded pools: the top `pool` FTS5 matches by bm25() and the top
+`pool` HNSW neighbours of the query embedding. The pools are fused either with reciprocal
+rank fusion (score = sum of 1 / (rrf_k + rank) over the lists a paper appears in) or with a
+weighted sum of min-max normalized scores. Since both pools are capped, the cost of a query
+(and the number of result pages) doesn't grow with the corpus.
+
+A category filter is applied inside each pool rather than to the fused list, so a rare category
+still gets up to `pool` candidates from each side: the FTS query joins paper_categories, and
+the kNN query over-fetches VECTOR_OVERFETCH x `pool` neighbours and keeps the ones in it.
+"""
+import re
+import sqlite3
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import metrics
+
+POOL = 200
+RRF_K = 60
+VECTOR_OVERFETCH = 10  # neighbours fetched per kept one when filtering by category (most categories are >10% of the corpus)
+
+
+def fts_query(text: str) -> str:
+    # user text isn't valid FTS5 syntax in general (quotes, colons, AND/OR...), so match any of its
+    # words as quoted strings; bm25 ranks papers matching more/rarer words higher
+    words = re.findall(r'\w+', text)
+    return ' OR '.join('"' + w + '"' for w in words)
+
+
+def filter_category(db: sqlite3.Connection, ids: List[int], category: Optional[str]) -> List[int]:
+    """`ids` that are in `category` (any of a paper's categories), in the order given."""
+    if not category or not ids:
+        return list(ids)
+    keep = {row[0] for row in db.execute(f"SELECT paper_id FROM paper_categories WHERE paper_id IN ({','.join('?' * len(ids))}) AND category = ?",
+                                         [*ids, category])}
+    return [i for i in ids if i in keep]
+
+
+def bm25_candidates(db: sqlite3.Connection, query: str, pool: int = POOL, category: Optional[str] = None) -> List[Tuple[int, float]]:
+    """(paper id, bm25 score) for the best `pool` FTS matches (in `category`, if given), best first. Higher score is better."""
+    match = fts_query(query)
+    if not match:
+        return []
+    if category:
+        rows = db.execute('''
+            SELECT rowid, bm25(papers_summary_fts) AS score FROM papers_summary_fts
+            JOIN paper_categories c ON c.paper_id = papers_summary_fts.rowid AND c.category = ?
+            WHERE papers_summary_fts MATCH ? ORDER BY score LIMIT ?
+        ''', (category, match, pool)).fetchall()
+    else:
+        rows = db.execute('''
+            SELECT rowid, bm25(papers_summary_fts) AS score FROM papers_summary_fts
+            WHERE papers_summary_fts MATCH ? ORDER BY score LIMIT ?
+        ''', (match, pool)).fetchall()
+    # FTS5's bm25() is negated so that ORDER BY ascending gives the best match first
+    return [(row[0], -row[1]) for row in rows]
+
+
+def knn_query(index, vectors: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """`index.knn_query` with k capped at what the index can return.
+
+    get_current_count() includes papers scripts/embed_index.py has mark_deleted, and hnswlib
+    raises rather than return a short row when fewer than k live vectors are reachable, so k is
+    halved until the query succeeds.
+    """
+    k = min(k, index.get_current_count())
+    while k:
+        try:
+            return index.knn_query(vectors, k=k)
+        except RuntimeError:
+            k //= 2
+    rows = len(np.atleast_2d(vectors))
+    return np.empty((rows, 0), dtype=np.uint64), np.empty((rows, 0), dtype=np.float32)
+
+
+def vector_candidates(index, vec: Optional[np.ndarray], pool: int = POOL) -> List[Tuple[int, float]]:
+    """(paper id, cosine similarity) for the `pool` nearest neighbours of `vec`, best first."""
+    if index is None or vec is None:
+        return []
+    with metrics.KNN_SECONDS.time(caller='hybrid'):
+        ids, dists = knn_query(index, vec, pool)
+    return [(int(i), 1.0 - float(d)) for i, d in zip(ids[0], dists[0])]
+
+
+def rrf(rankings: Sequence[List[Tuple[int, float]]], weights: Optional[Sequence[float]] = None,
+        rrf_k: int = RRF_K) -> List[Tuple[int, float]]:
+    scores: Dict[int, float] = {}
+    for ranking, weight in zip(rankings, weights or [1.0] * len(rankings)):
+        for rank, (paper_id, _) in enumerate(ranking):
+            scores[paper_id] = scores.get(paper_id, 0.0) + weight / (rrf_k + rank + 1)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+def weighted(rankings: Sequence[List[Tuple[int, float]]], weights: Sequence[float]) -> List[Tuple[int, float]]:
+    # bm25 and cosine live on different scales, so squash each list to [0, 1] before mixing;
+    # a paper missing from a list gets 0 from it
+    scores: Dict[int, float] = {}
+    for ranking, weight in zip(rankings, weights):
+        if not ranking:
+            continue
+        values = np.array([score for _, score in ranking])
+        low, span = values.min(), values.max() - values.min()
+        for (paper_id, _), value in zip(ranking, values):
+            normalized = (value - low) / span if span > 0 else 1.0
+            scores[paper_id] = scores.get(paper_id, 0.0) + weight * float(normalized)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+def hybrid_search(db: sqlite3.Connection, index, query: str, vec: Optional[np.ndarray], method: str = 'rrf',
+                  alpha: float = 0.5, pool: int = POOL, category: Optional[str] = None) -> List[Tuple[int, float]]:
+    """Fused ranking of (paper id, score), best first; at most 2 * `pool` papers, all in `category` if given.
+
+    `alpha` is the weight of the vector list (the lexical list gets 1 - alpha). With no `vec`
+    (e.g. the encoder is still loading) this degrades to plain bm25 ranking.
+    """
+    lexical = bm25_candidates(db, query, pool, category)
+    if category:
+        semantic = vector_candidates(index, vec, pool * VECTOR_OVERFETCH)
+        keep = set(filter_category(db, [paper_id for paper_id, _ in semantic], category))
+        semantic = [(paper_id, score) for paper_id, score in semantic if paper_id in keep][:pool]
+    else:
+        semantic = vector_candidates(index, vec, pool)
+    if method == 'bm25':
+        return lexical
+    if method == 'vector':
+        return semantic
+    if method == 'weighted':
+        return weighted([lexical, semantic], [1.0 - alpha, alpha])
+    return rrf([lexical, semantic], [2 * (1.0 - alpha), 2 * alpha])
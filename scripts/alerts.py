@@ -0,0 +1,128 @@
+"""
+Alert stage: match newly embedded papers against every saved query (saved_queries) and queue
+the hits in the query_alerts outbox.
+
+Run after embed_texts.py in the ingest pipeline. Papers embedded since the last run (ids past
+the `alerts_scored_through` mark) are scored against all standing queries a block at a time:
+one matrix product gives every query x paper similarity, the category prefilter is a second
+(boolean) product of query and paper category masks, and the hits are whatever clears both
+the query's threshold and its filter. Matches are written with INSERT OR IGNORE on
+(query_id, paper_id), and the mark moves in the same transaction, so re-runs never alert twice.
+
+    python scripts/alerts.py --db papers.db
+"""
+import argparse, logging, os, sqlite3, sys, time
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from embed_index import EMBEDDINGS_FILE, MODEL_ID
+from neighbors import chunks
+
+logging.basicConfig(level=logging.INFO)
+
+QUERY_BATCH = 16384
+PAPER_BATCH = 1024
+
+
+class StandingQueries:
+    """Saved queries as arrays: ids, users, (n, dim) vectors, thresholds and a (n, categories) mask."""
+
+    def __init__(self, ids, users, vectors, thresholds, categories: List[str], vocabulary: Dict[str, int]):
+        self.ids, self.users = np.asarray(ids), np.asarray(users)
+        self.vectors, self.thresholds = vectors, np.asarray(thresholds, dtype=np.float32)
+        self.vocabulary = vocabulary
+        self.mask = category_mask(categories, vocabulary)
+        self.any_category = ~self.mask.any(axis=1)
+
+    @classmethod
+    def load(cls, db: sqlite3.Connection, model_id: str = MODEL_ID) -> 'StandingQueries':
+        rows = db.execute('SELECT id, user_id, embedding, threshold, categories FROM saved_queries WHERE model = ? ORDER BY id',
+                          (model_id,)).fetchall()
+        vocabulary = {c: i for i, (c,) in enumerate(db.execute('SELECT DISTINCT category FROM paper_categories ORDER BY category'))}
+        vectors = np.vstack([np.frombuffer(row[2], dtype=np.float32) for row in rows]) if rows else np.zeros((0, 0), dtype=np.float32)
+        return cls([r[0] for r in rows], [r[1] for r in rows], vectors, [r[3] for r in rows], [r[4] for r in rows], vocabulary)
+
+
+def category_mask(categories: List[str], vocabulary: Dict[str, int]) -> np.ndarray:
+    mask = np.zeros((len(categories), max(len(vocabulary), 1)), dtype=bool)
+    for row, joined in enumerate(categories):
+        for category in filter(None, (c.strip() for c in joined.split(','))):
+            if category in vocabulary:
+                mask[row, vocabulary[category]] = True
+    return mask
+
+
+def match(queries: StandingQueries, paper_vectors: np.ndarray, paper_mask: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(query rows, paper rows, scores) of every query x paper pair over threshold and allowed by the category filter."""
+    q_rows, p_rows, scores = [], [], []
+    for q in range(0, len(queries.ids), QUERY_BATCH):
+        vectors = queries.vectors[q:q + QUERY_BATCH]
+        similarity = vectors @ paper_vectors.T
+        hits = similarity >= queries.thresholds[q:q + QUERY_BATCH, None]
+        if hits.any():
+            # a query with categories only matches papers sharing one of them
+            allowed = (queries.mask[q:q + QUERY_BATCH].astype(np.float32) @ paper_mask.T.astype(np.float32)) > 0
+            hits &= allowed | queries.any_category[q:q + QUERY_BATCH, None]
+        rows, cols = np.nonzero(hits)
+        q_rows.append(rows + q)
+        p_rows.append(cols)
+        scores.append(similarity[rows, cols])
+    if not q_rows:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+    return np.concatenate(q_rows), np.concatenate(p_rows), np.concatenate(scores)
+
+
+class AlertJob:
+    def __init__(self, db_file: str, embeddings_file: str = EMBEDDINGS_FILE, model_id: str = MODEL_ID):
+        self.db = sqlite3.connect(db_file)
+        self.vectors = np.load(embeddings_file, mmap_mode='r')
+        self.model_id = model_id
+
+    def new_papers(self, after: int) -> List[int]:
+        return [row[0] for row in self.db.execute('SELECT paper_id FROM paper_embeddings WHERE paper_id > ? AND paper_id < ? ORDER BY paper_id',
+                                                  (after, len(self.vectors)))]
+
+    def paper_mask(self, ids: List[int], vocabulary: Dict[str, int]) -> np.ndarray:
+        position = {paper_id: i for i, paper_id in enumerate(ids)}
+        mask = np.zeros((len(ids), max(len(vocabulary), 1)), dtype=bool)
+        for chunk in chunks(ids, 500):
+            for paper_id, category in self.db.execute(
+                    f"SELECT paper_id, category FROM paper_categories WHERE paper_id IN ({','.join('?' * len(chunk))})", chunk):
+                if category in vocabulary:
+                    mask[position[paper_id], vocabulary[category]] = True
+        return mask
+
+    def run(self) -> dict:
+        start = time.monotonic()
+        mark = self.db.execute("SELECT value FROM corpus_meta WHERE key = 'alerts_scored_through'").fetchone()[0]
+        queries = StandingQueries.load(self.db, self.model_id)
+        papers = self.new_papers(mark)
+        logging.info(f"{len(papers)} new papers against {len(queries.ids)} saved queries")
+        alerts = 0
+        for block in chunks(papers, PAPER_BATCH):
+            matches = []
+            if len(queries.ids):
+                q_rows, p_rows, scores = match(queries, np.asarray(self.vectors[block], dtype=np.float32),
+                                               self.paper_mask(block, queries.vocabulary))
+                matches = [(int(queries.ids[q]), int(queries.users[q]), block[p], float(s)) for q, p, s in zip(q_rows, p_rows, scores)]
+            with self.db:
+                cursor = self.db.executemany('INSERT OR IGNORE INTO query_alerts (query_id, user_id, paper_id, score) VALUES (?, ?, ?, ?)', matches)
+                self.db.execute("UPDATE corpus_meta SET value = ?, updated_at = CURRENT_TIMESTAMP WHERE key = 'alerts_scored_through'",
+                                (block[-1],))
+            alerts += max(cursor.rowcount, 0)
+        return {'papers': len(papers), 'queries': len(queries.ids), 'alerts': alerts, 'seconds': time.monotonic() - start}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default='papers.db')
+    parser.add_argument('--embeddings', default=EMBEDDINGS_FILE)
+    parser.add_argument('--model', default=MODEL_ID, help='only queries encoded with this model are in the same space as the embeddings')
+    args = parser.parse_args()
+
+    stats = AlertJob(args.db, args.embeddings, args.model).run()
+    logging.info(f"queued {stats['alerts']} alerts from {stats['papers']} papers x {stats['queries']} queries in {stats['seconds']:.1f}s")
@@ -0,0 +1,58 @@
+"""
+Streaming parser for arXiv Atom feeds.
+
+`ET.fromstring(response.text)` decodes the whole body to a str and builds the full tree before
+the first paper comes out. AtomStream feeds raw byte chunks (e.g. `response.iter_content()`)
+into a pull parser, yields a paper tuple (see `init_db.extract_paper_data`) as soon as each
+`<entry>` closes, and drops the entry from the tree right after, so memory stays at roughly
+one chunk + one entry regardless of how many results the page holds.
+"""
+import xml.etree.ElementTree as ET
+from typing import Iterable, Iterator, Optional
+
+from init_db import extract_paper_data
+
+ATOM_ENTRY = '{http://www.w3.org/2005/Atom}entry'
+OPENSEARCH_TOTAL = '{http://a9.com/-/spec/opensearch/1.1/}totalResults'
+
+CHUNK_SIZE = 64 * 1024
+
+
+class AtomStream:
+    """Iterate paper tuples from an Atom feed given as byte chunks.
+
+    `total_results` is filled in once the feed header has been read, which arXiv sends
+    before the first entry.
+    """
+
+    def __init__(self, chunks: Iterable[bytes]):
+        self.chunks = chunks
+        self.total_results: Optional[int] = None
+
+    def __iter__(self) -> Iterator[tuple]:
+        parser = ET.XMLPullParser(events=('start', 'end'))
+        self._root = None
+        for chunk in self.chunks:
+            parser.feed(chunk)
+            yield from self._drain(parser)
+        parser.close()
+        yield from self._drain(parser)
+
+    def _drain(self, parser: ET.XMLPullParser) -> Iterator[tuple]:
+        for event, elem in parser.read_events():
+            if event == 'start':
+                if self._root is None:
+                    self._root = elem
+                continue
+            if elem.tag == ATOM_ENTRY:
+                yield extract_paper_data(elem)
+                # entries are direct children of <feed>; detach them so the tree never grows
+                elem.clear()
+                self._root.remove(elem)
+            elif elem.tag == OPENSEARCH_TOTAL:
+                self.total_results = int(elem.text)
+
+
+def stream_response(response, chunk_size: int = CHUNK_SIZE) -> AtomStream:
+    """Wrap a `requests` response opened with `stream=True`."""
+    return AtomStream(response.iter_content(chunk_size=chunk_size))
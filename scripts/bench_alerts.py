@@ -0,0 +1,64 @@
+"""
+Alert matching throughput: --queries standing queries against a day's --papers new papers.
+
+Synthetic clustered unit vectors (queries are drawn near the same cluster centers as papers,
+so thresholds produce a realistic trickle of hits); a third of the queries carry 1-2 category
+filters. Times `alerts.match` (blocked matrix products + category mask product) end to end,
+and a per-query loop (one matvec + filter per query, as a naive implementation would do) on a
+sample of queries, extrapolated to all of them.
+
+    python scripts/bench_alerts.py --queries 100000 --papers 2000
+"""
+import argparse, os, random, sys, time
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from alerts import StandingQueries, category_mask, match
+
+CATEGORIES = ['cs.CL', 'cs.AI', 'cs.MA', 'cs.CV', 'cs.LG', 'cs.RO', 'cs.SY', 'cs.SI', 'cs.HC', 'cs.IR', 'stat.ML', 'math.OC']
+
+
+def clustered(rng, centers: np.ndarray, n: int, noise: float) -> np.ndarray:
+    x = centers[rng.integers(len(centers), size=n)] + noise * rng.standard_normal((n, centers.shape[1]), dtype=np.float32)
+    return x / np.linalg.norm(x, axis=1, keepdims=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--queries', type=int, default=100000)
+    parser.add_argument('--papers', type=int, default=2000, help='a day of new papers')
+    parser.add_argument('--dim', type=int, default=768)
+    parser.add_argument('--threshold', type=float, default=0.5)
+    parser.add_argument('--naive-sample', type=int, default=2000)
+    args = parser.parse_args()
+
+    rng, pyrng = np.random.default_rng(0), random.Random(0)
+    centers = rng.standard_normal((500, args.dim), dtype=np.float32) / np.sqrt(args.dim)
+    vocabulary = {c: i for i, c in enumerate(CATEGORIES)}
+    query_categories = [','.join(pyrng.sample(CATEGORIES, pyrng.randint(1, 2))) if pyrng.random() < 1 / 3 else '' for _ in range(args.queries)]
+    queries = StandingQueries(np.arange(1, args.queries + 1), rng.integers(1, args.queries // 10 + 2, size=args.queries),
+                              clustered(rng, centers, args.queries, 0.04), np.full(args.queries, args.threshold),
+                              query_categories, vocabulary)
+    papers = clustered(rng, centers, args.papers, 0.04)
+    paper_mask = category_mask([','.join(pyrng.sample(CATEGORIES, pyrng.randint(1, 3))) for _ in range(args.papers)], vocabulary)
+    print(f"{args.queries} queries x {args.papers} papers, dim {args.dim}, {queries.vectors.nbytes / 2**20:.0f}MB of query vectors")
+
+    start = time.perf_counter()
+    q_rows, p_rows, scores = match(queries, papers, paper_mask)
+    vectorized = time.perf_counter() - start
+    print(f"{'vectorized':>12}: {vectorized:8.2f}s  {len(q_rows)} matches  {args.queries * args.papers / vectorized / 1e6:.0f}M pairs/s")
+
+    sample = rng.choice(args.queries, size=min(args.naive_sample, args.queries), replace=False)
+    start = time.perf_counter()
+    naive_matches = 0
+    for q in sample:
+        similarity = papers @ queries.vectors[q]
+        hit = similarity >= queries.thresholds[q]
+        if not queries.any_category[q]:
+            hit &= (paper_mask & queries.mask[q]).any(axis=1)
+        naive_matches += int(hit.sum())
+    naive = (time.perf_counter() - start) * args.queries / len(sample)
+    print(f"{'per query':>12}: {naive:8.2f}s  (extrapolated from {len(sample)} queries)  {args.queries * args.papers / naive / 1e6:.0f}M pairs/s")
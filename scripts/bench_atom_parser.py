@@ -0,0 +1,86 @@
+"""
+Compare the DOM parser (ET.fromstring on the decoded body, as scrape_arxiv does) with the
+streaming AtomStream parser on synthetic feeds.
+
+Each (parser, feed size) pair runs in a fresh subprocess so peak RSS is measured in isolation.
+The feed is read from a temp file the way each path reads an HTTP body: the DOM path reads and
+decodes the whole thing, the streaming path reads 64KB chunks.
+
+    python scripts/bench_atom_parser.py --entries 1000 10000 50000
+"""
+import argparse, json, os, resource, subprocess, sys, tempfile, time
+import xml.etree.ElementTree as ET
+from datetime import datetime, timedelta
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from atom_stream import CHUNK_SIZE, AtomStream
+from fake_arxiv import build_entry, build_feed
+from init_db import extract_paper_data
+
+
+def write_feed(path: str, entries: int):
+    start = datetime(2024, 1, 1)
+    header, footer = build_feed(['<!--entries-->'], total=entries).split('<!--entries-->')
+    with open(path, 'w') as f:
+        f.write(header)
+        for i in range(entries):
+            f.write(build_entry(i, start + timedelta(minutes=i)))
+        f.write(footer)
+
+
+def peak_rss_kb() -> int:
+    # VmHWM resets on exec; ru_maxrss on Linux can carry over the parent's peak from fork
+    try:
+        with open('/proc/self/status') as f:
+            return next(int(line.split()[1]) for line in f if line.startswith('VmHWM:'))
+    except (OSError, StopIteration):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def parse_dom(path: str) -> int:
+    with open(path, 'rb') as f:
+        text = f.read().decode('utf-8')
+    root = ET.fromstring(text)
+    return sum(1 for entry in root.findall('{http://www.w3.org/2005/Atom}entry') if extract_paper_data(entry))
+
+
+def parse_stream(path: str) -> int:
+    def chunks():
+        with open(path, 'rb') as f:
+            while chunk := f.read(CHUNK_SIZE):
+                yield chunk
+    return sum(1 for _ in AtomStream(chunks()))
+
+
+def run_one(mode: str, path: str):
+    baseline = peak_rss_kb()
+    start = time.perf_counter()
+    count = {'dom': parse_dom, 'stream': parse_stream}[mode](path)
+    elapsed = time.perf_counter() - start
+    peak = peak_rss_kb()
+    print(json.dumps({'entries': count, 'seconds': elapsed, 'peak_rss_kb': peak, 'rss_growth_kb': peak - baseline}))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--entries', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--worker', nargs=2, metavar=('MODE', 'PATH'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_one(*args.worker)
+        sys.exit(0)
+
+    print(f"{'entries':>8} {'parser':>7} {'MB':>7} {'entries/s':>10} {'MB/s':>7} {'peak RSS MB':>12} {'RSS growth MB':>14}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for entries in args.entries:
+            path = os.path.join(tmp, f'feed_{entries}.xml')
+            write_feed(path, entries)
+            size_mb = os.path.getsize(path) / 2**20
+            for mode in ('dom', 'stream'):
+                out = subprocess.run([sys.executable, __file__, '--worker', mode, path], capture_output=True, text=True, check=True)
+                r = json.loads(out.stdout)
+                print(f"{entries:>8} {mode:>7} {size_mb:>7.1f} {r['entries'] / r['seconds']:>10.0f} {size_mb / r['seconds']:>7.1f} "
+                      f"{r['peak_rss_kb'] / 1024:>12.1f} {r['rss_growth_kb'] / 1024:>14.1f}")
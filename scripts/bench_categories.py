@@ -0,0 +1,88 @@
+"""
+Category filtering: LIKE '%cat%' on papers.category vs the paper_categories join.
+
+Builds a synthetic db of --papers papers, each in 1-3 categories drawn with a skewed
+distribution (so there are both common and rare categories), migrates it (which backfills
+paper_categories) and times, per category, the first listing page and the listing count
+both ways. The old queries are the ones `index` ran before paper_categories existed.
+
+    python scripts/bench_categories.py --papers 1000000
+"""
+import argparse, os, random, sqlite3, statistics, sys, tempfile, time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from fake_arxiv import WORDS
+from migrate import migrate
+
+CATEGORIES = ['cs.LG', 'cs.CV', 'cs.CL', 'cs.AI', 'stat.ML', 'cs.RO', 'cs.IR', 'cs.SY', 'cs.HC', 'cs.SI', 'cs.MA']
+WEIGHTS = [30, 20, 15, 12, 8, 5, 4, 3, 1.5, 1, 0.5]
+
+QUERIES = {
+    'page, LIKE': "SELECT id, title, author, summary, category, published FROM papers WHERE category LIKE ? ORDER BY published DESC LIMIT 11",
+    'page, join': "SELECT p.id, p.title, p.author, p.summary, p.category, p.published FROM paper_categories pc JOIN papers p ON p.id = pc.paper_id "
+                  "WHERE pc.category = ? ORDER BY pc.published DESC, pc.paper_id DESC LIMIT 11",
+    'count, LIKE': "SELECT COUNT(*) FROM papers WHERE category LIKE ?",
+    'count, join': "SELECT COUNT(*) FROM paper_categories pc WHERE pc.category = ?",
+}
+
+
+def build_db(db_file: str, n: int):
+    db = sqlite3.connect(db_file)
+    for script in ('schema.sql', 'fts5.sql'):
+        with open(os.path.join(REPO_ROOT, 'scripts', script)) as f:
+            db.executescript(f.read())
+    rng = random.Random(0)
+    start = time.mktime((2015, 1, 1, 0, 0, 0, 0, 0, 0))
+
+    def rows():
+        for i in range(1, n + 1):
+            published = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(start + rng.randrange(10 * 365 * 86400)))
+            categories = ', '.join(dict.fromkeys(rng.choices(CATEGORIES, WEIGHTS, k=rng.randint(1, 3))))
+            yield (i, f'paper {i}', f'synthetic/{i}', published, published,
+                   ' '.join(rng.choice(WORDS) for _ in range(20)), 'someone', categories)
+
+    with db:
+        db.executemany('''
+            INSERT INTO papers (id, title, arxiv_id, published, updated, summary, author, category, pdf_link, abstract_link, arxiv_link)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, '', '', '')
+        ''', rows())
+    db.close()
+    start = time.perf_counter()
+    migrate(db_file)
+    print(f"migrated (paper_categories backfill) in {time.perf_counter() - start:.1f}s")
+    db = sqlite3.connect(db_file)
+    db.execute('ANALYZE')
+    db.close()
+
+
+def timed(db, sql: str, param: str, repeat: int) -> float:
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        db.execute(sql, (param,)).fetchall()
+        latencies.append(time.perf_counter() - start)
+    return statistics.median(latencies) * 1000
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--papers', type=int, default=1_000_000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = os.path.join(tmp, 'papers.db')
+        print(f"building {args.papers} paper db")
+        build_db(db_file, args.papers)
+        db = sqlite3.connect(db_file)
+
+        print(f"{'category':>9} {'papers':>8} " + ' '.join(f"{name + ' ms':>15}" for name in QUERIES))
+        for category in (CATEGORIES[0], CATEGORIES[4], CATEGORIES[-1]):
+            count = db.execute(QUERIES['count, join'], (category,)).fetchone()[0]
+            cells = []
+            for name, sql in QUERIES.items():
+                ms = timed(db, sql, '%' + category + '%' if 'LIKE' in name else category, args.repeat)
+                cells.append(f"{ms:>15.2f}")
+            print(f"{category:>9} {count:>8} " + ' '.join(cells))
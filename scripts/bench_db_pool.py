@@ -0,0 +1,166 @@
+"""
+Load test for the app's database access while an ingest is writing.
+
+Serves the app with waitress (--threads worker threads) on a synthetic papers.db, drives it
+from --clients client threads (listing pages, paper pages, save/unsave) and meanwhile runs a
+PaperWriter upserting batches of new papers, as the daily scrape would. Runs twice:
+
+  per-request  the old get_db: sqlite3.connect per request (never closed), default pragmas,
+               writes committed on that same connection
+  pooled       db.py: per-thread read-only connections + the serialized BEGIN IMMEDIATE writer
+
+The page cache is disabled so every request reaches SQLite. Reports p50/p99 latency, QPS,
+5xx responses and how many of them were "database is locked".
+
+    python scripts/bench_db_pool.py --papers 200000 --threads 16 --clients 32 --seconds 20
+"""
+import argparse, contextlib, json, logging, os, random, sqlite3, sys, tempfile, threading, time
+import urllib.error, urllib.request
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from bench_listing import build_db
+from ingest import PaperWriter
+
+
+class LockedCounter(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.locked = 0
+
+    def emit(self, record):
+        if record.exc_info and 'database is locked' in str(record.exc_info[1]):
+            self.locked += 1
+
+
+class PerRequestWriter:
+    """What the save/unsave/login routes did before db.py: write and commit on a fresh default connection."""
+
+    def __init__(self, db_file):
+        self.db_file = db_file
+
+    @contextlib.contextmanager
+    def transaction(self):
+        db = sqlite3.connect(self.db_file)
+        db.row_factory = sqlite3.Row
+        yield db
+        db.commit()
+
+    def execute(self, sql, params=()):
+        with self.transaction() as db:
+            return db.execute(sql, params)
+
+
+def per_request_get_db(arxivr):
+    def get_db():
+        db = getattr(arxivr.g, '_database', None)
+        if db is None:
+            db = arxivr.g._database = sqlite3.connect(arxivr.DATABASE)
+            db.row_factory = sqlite3.Row
+        return db
+    return get_db
+
+
+def ingest(db_file: str, stop: threading.Event, start_id: int, batch: int):
+    writer = PaperWriter(db_file, batch_size=batch)
+    rng, seq = random.Random(2), start_id
+    while not stop.is_set():
+        papers = []
+        for _ in range(batch):
+            seq += 1
+            published = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(time.time() - rng.randrange(86400)))
+            papers.append((f'new paper {seq}', f'ingest/{seq}', published, published, 'fresh words ' * 20, 'someone',
+                           'cs.LG', '', '', '', 'cs.LG'))
+        writer.add(papers)
+    writer.close()
+    return writer.inserted
+
+
+def client(base: str, papers: int, users: int, stop: threading.Event, seed: int, out: list, lock: threading.Lock):
+    rng, mine = random.Random(seed), []
+    while not stop.is_set():
+        roll = rng.random()
+        if roll < 0.6:
+            request = urllib.request.Request(f"{base}/?page={rng.randint(1, 50)}")
+        elif roll < 0.9:
+            request = urllib.request.Request(f"{base}/papers/{rng.randint(1, papers)}")
+        else:
+            action = 'save' if rng.random() < 0.5 else 'unsave'
+            body = json.dumps({'user_id': rng.randint(1, users), 'paper_id': rng.randint(1, 1000)}).encode()
+            request = urllib.request.Request(f"{base}/papers/{action}", data=body, headers={'Content-Type': 'application/json'})
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=60) as response:
+                response.read()
+                status = response.status
+        except urllib.error.HTTPError as e:
+            status = e.code
+        mine.append((time.perf_counter() - start, status))
+    with lock:
+        out.extend(mine)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--papers', type=int, default=200000)
+    parser.add_argument('--threads', type=int, default=16, help='waitress worker threads')
+    parser.add_argument('--clients', type=int, default=32)
+    parser.add_argument('--seconds', type=float, default=20)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--ingest-batch', type=int, default=2000)
+    args = parser.parse_args()
+
+    os.environ['ARXIVR_ENCODER'] = 'hashing'
+    from waitress.server import create_server
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = os.path.join(tmp, 'papers.db')
+        print(f"building {args.papers} paper db")
+        build_db(db_file, args.papers)
+        db = sqlite3.connect(db_file)
+        db.execute('PRAGMA journal_mode = WAL')
+        with db:
+            db.executemany('INSERT INTO users (username) VALUES (?)', [(f'user{i}',) for i in range(args.users)])
+        db.close()
+        os.chdir(tmp)
+        import app as arxivr
+        from db import ReadPool, Writer
+        from page_cache import PageCache
+        arxivr.page_cache = PageCache(max_entries=0)
+        counter = LockedCounter()
+        arxivr.app.logger.addHandler(counter)
+        pooled_get_db = arxivr.get_db
+
+        print(f"{'mode':>12} {'requests':>9} {'QPS':>7} {'p50 ms':>8} {'p99 ms':>8} {'5xx':>6} {'locked':>7} {'ingested':>9}")
+        seq = args.papers
+        for mode in ('per-request', 'pooled'):
+            if mode == 'per-request':
+                arxivr.get_db, arxivr.writer = per_request_get_db(arxivr), PerRequestWriter(db_file)
+            else:
+                arxivr.get_db, arxivr.read_pool, arxivr.writer = pooled_get_db, ReadPool(db_file), Writer(db_file)
+            counter.locked = 0
+            server = create_server(arxivr.app, host='127.0.0.1', port=0, threads=args.threads)
+            threading.Thread(target=server.run, daemon=True).start()
+            base = f"http://127.0.0.1:{server.effective_port}"
+
+            stop, lock, results, ingested = threading.Event(), threading.Lock(), [], []
+            ingester = threading.Thread(target=lambda: ingested.append(ingest(db_file, stop, seq, args.ingest_batch)))
+            clients = [threading.Thread(target=client, args=(base, args.papers, args.users, stop, i, results, lock)) for i in range(args.clients)]
+            ingester.start()
+            for c in clients:
+                c.start()
+            time.sleep(args.seconds)
+            stop.set()
+            for c in clients:
+                c.join()
+            ingester.join()
+            server.close()
+            seq += ingested[0] + args.ingest_batch
+
+            latencies = np.array([l for l, _ in results]) * 1000
+            errors = sum(1 for _, status in results if status >= 500)
+            print(f"{mode:>12} {len(results):>9} {len(results) / args.seconds:>7.0f} {np.percentile(latencies, 50):>8.1f} "
+                  f"{np.percentile(latencies, 99):>8.1f} {errors:>6} {counter.locked:>7} {ingested[0]:>9}")
@@ -0,0 +1,92 @@
+"""
+Show that an incremental embedding run costs time proportional to the delta, not the corpus.
+
+For each corpus size a synthetic papers.db is built and fully indexed once, then a "daily
+delta" (new papers, a few edited abstracts and a few deletions) is applied with update_index.
+The model is replaced by a hash-seeded random embedder with an optional simulated per-abstract
+cost, so this runs offline; with a real model the embed column dominates even more.
+
+    python scripts/bench_embed_delta.py --corpus 10000 50000 --delta 500 --embed-ms 2
+"""
+import argparse, hashlib, os, sqlite3, sys, tempfile, time
+from typing import List
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from embed_index import update_index
+from migrate import migrate
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def fake_embedder(dim: int, cost: float):
+    def embed(abstracts: List[str]) -> np.ndarray:
+        out = np.empty((len(abstracts), dim), dtype=np.float32)
+        for i, text in enumerate(abstracts):
+            seed = int.from_bytes(hashlib.blake2b(text.encode(), digest_size=8).digest(), 'little')
+            out[i] = np.random.default_rng(seed).standard_normal(dim)
+        if cost:
+            time.sleep(cost * len(abstracts))
+        return out / np.linalg.norm(out, axis=1, keepdims=True)
+    return embed
+
+
+def make_db(path: str, n: int):
+    db = sqlite3.connect(path)
+    for script in ('schema.sql', 'fts5.sql'):
+        with open(os.path.join(SCRIPTS_DIR, script)) as f:
+            db.executescript(f.read())
+    db.close()
+    migrate(path)
+    add_papers(path, 0, n)
+
+
+def add_papers(path: str, first: int, n: int):
+    db = sqlite3.connect(path)
+    with db:
+        db.executemany('''
+            INSERT INTO papers (title, arxiv_id, published, updated, summary, author, category, pdf_link, abstract_link, arxiv_link)
+            VALUES (?, ?, '2024-01-01T00:00:00Z', '2024-01-01T00:00:00Z', ?, 'someone', 'cs.LG', '', '', '')
+        ''', [(f'paper {i}', f'synthetic/{i}', f'abstract number {i}') for i in range(first, first + n)])
+    db.close()
+
+
+def apply_delta(path: str, corpus: int, new: int, edited: int, deleted: int):
+    add_papers(path, corpus, new)
+    db = sqlite3.connect(path)
+    with db:
+        db.execute("UPDATE papers SET summary = summary || ' (revised)', updated = '2024-02-01T00:00:00Z' "
+                   "WHERE id IN (SELECT id FROM papers ORDER BY id LIMIT ?)", (edited,))
+        db.execute('DELETE FROM papers WHERE id IN (SELECT id FROM papers ORDER BY id DESC LIMIT ? OFFSET ?)', (deleted, new))
+    db.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--corpus', type=int, nargs='+', default=[10000, 50000])
+    parser.add_argument('--delta', type=int, nargs='+', default=[100, 1000], help='new papers per daily run')
+    parser.add_argument('--dim', type=int, default=768)
+    parser.add_argument('--embed-ms', type=float, default=0.0, help='simulated model cost per abstract')
+    args = parser.parse_args()
+
+    embed = fake_embedder(args.dim, args.embed_ms / 1000)
+    steps = ('load', 'diff', 'embed', 'index', 'save')
+    print(f"{'corpus':>8} {'run':>12} {'embedded':>9} {'removed':>8} " + ' '.join(f'{s:>7}' for s in steps) + f" {'total s':>8}")
+    for corpus in args.corpus:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_file, index_file, embeddings_file = (os.path.join(tmp, f) for f in ('papers.db', 'index.bin', 'embeddings.npy'))
+            make_db(db_file, corpus)
+            runs = [('full', None)] + [(f'delta {d}', d) for d in args.delta]
+            size = corpus
+            for name, delta in runs:
+                if delta:
+                    apply_delta(db_file, size, delta, edited=delta // 10, deleted=delta // 20)
+                    size += delta
+                start = time.monotonic()
+                stats = update_index(db_file, embed, index_file=index_file, embeddings_file=embeddings_file, full=delta is None)
+                total = time.monotonic() - start
+                print(f"{corpus:>8} {name:>12} {stats['embedded']:>9} {stats['removed']:>8} "
+                      + ' '.join(f"{stats.get(s, 0):>7.2f}" for s in steps) + f" {total:>8.2f}")
@@ -0,0 +1,90 @@
+"""
+Throughput and peak memory of the embedding engine configurations.
+
+Each configuration embeds the same abstracts in a fresh subprocess: the old embed_texts.py
+path (fixed batches of 1024 in corpus order, collected in a list and np.vstack'ed), then
+EmbeddingEngine with fixed batches, with length-bucketed token-budget batches in-process, and
+with a CPU worker pool at a few workers x threads splits. Abstracts come from --db if given,
+otherwise they're synthetic with arxiv-like length spread. Peak RSS is reported for the
+parent and for the largest worker (workers each hold a copy of the model).
+
+    python scripts/bench_embed_engine.py --backend siglip --n 20000
+    python scripts/bench_embed_engine.py --backend hashing --n 200000
+"""
+import argparse, json, os, random, resource, sqlite3, subprocess, sys, time
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from bench_atom_parser import peak_rss_kb
+from embed_engine import MAX_BATCH, EmbeddingEngine
+from encoder import BACKENDS
+from fake_arxiv import WORDS
+
+
+def load_abstracts(db_file, n: int):
+    if db_file:
+        db = sqlite3.connect(db_file)
+        return [row[0] for row in db.execute('SELECT summary FROM papers ORDER BY id LIMIT ?', (n,))]
+    rng = random.Random(0)
+    # abstracts run from a couple of sentences to ~300 words, most around 150
+    return [' '.join(rng.choice(WORDS) for _ in range(int(min(max(rng.lognormvariate(5.0, 0.4), 20), 320)))) for _ in range(n)]
+
+
+def vstack_baseline(backend: str, texts):
+    model = BACKENDS[backend]()
+    model.load()
+    embeddings = []
+    for i in range(0, len(texts), MAX_BATCH):
+        embeddings.append(model.encode(texts[i:i + MAX_BATCH]))
+    return np.vstack(embeddings)
+
+
+def run_one(config: dict, db_file, n: int):
+    texts = load_abstracts(db_file, n)
+    baseline = peak_rss_kb()
+    start = time.perf_counter()
+    if config['mode'] == 'vstack':
+        vectors = vstack_baseline(config['backend'], texts)
+    else:
+        with EmbeddingEngine(config['backend'], workers=config['workers'], threads=config['threads'],
+                             token_budget=config['token_budget'], progress=False) as engine:
+            vectors = engine.embed(texts)
+    elapsed = time.perf_counter() - start
+    assert vectors.shape[0] == len(texts)
+    print(json.dumps({'abstracts': len(texts), 'seconds': elapsed, 'peak_rss_kb': peak_rss_kb(), 'rss_growth_kb': peak_rss_kb() - baseline,
+                      'worker_peak_rss_kb': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss}))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backend', default='hashing', choices=sorted(BACKENDS))
+    parser.add_argument('--db', help='embed the first --n abstracts from this papers.db instead of synthetic ones')
+    parser.add_argument('--n', type=int, default=20000)
+    parser.add_argument('--splits', nargs='+', default=None, help='workers x threads pool configs, e.g. 4x2 2x4 (default: a few for this machine)')
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_one(json.loads(args.worker), args.db, args.n)
+        sys.exit(0)
+
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count()
+    splits = args.splits or sorted({f'{max(cpus // t, 1)}x{t}' for t in (1, 2, 4) if t <= cpus})
+    configs = [
+        ('fixed 1024, list + vstack', {'mode': 'vstack'}),
+        ('fixed 1024, memmap', {'mode': 'engine', 'workers': 0, 'threads': cpus, 'token_budget': None}),
+        ('bucketed, in-process', {'mode': 'engine', 'workers': 0, 'threads': cpus, 'token_budget': 16384}),
+    ] + [(f'bucketed, {split} pool', {'mode': 'engine', 'workers': int(split.split('x')[0]), 'threads': int(split.split('x')[1]),
+                                      'token_budget': 16384}) for split in splits]
+
+    print(f"{args.n} abstracts, {args.backend} backend, {cpus} cpus")
+    print(f"{'config':>28} {'abstracts/s':>12} {'peak RSS MB':>12} {'RSS growth MB':>14} {'worker peak MB':>15}")
+    for name, config in configs:
+        config['backend'] = args.backend
+        cmd = [sys.executable, __file__, '--worker', json.dumps(config), '--n', str(args.n)] + (['--db', args.db] if args.db else [])
+        r = json.loads(subprocess.run(cmd, capture_output=True, text=True, check=True).stdout.strip().splitlines()[-1])
+        print(f"{name:>28} {r['abstracts'] / r['seconds']:>12.0f} {r['peak_rss_kb'] / 1024:>12.1f} {r['rss_growth_kb'] / 1024:>14.1f} "
+              f"{r['worker_peak_rss_kb'] / 1024:>15.1f}")
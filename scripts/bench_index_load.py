@@ -0,0 +1,94 @@
+"""
+Cold-start time and per-process memory of the pickled index vs. native index + mmapped embeddings.
+
+Builds a random index of --n normalized vectors, saves it both ways, then starts --procs
+processes at once per format (like waitress/gunicorn workers) and has each load it and look up
+--lookups random paper vectors. Reported per process: load time, RSS, how much of it is private
+(anonymous) vs file-backed, and PSS, which splits shared pages between the processes using them.
+
+    python scripts/bench_index_load.py --n 200000 --procs 4
+"""
+import argparse, json, os, pickle, subprocess, sys, tempfile, time
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from embed_index import EmbeddingStore, load_index, new_index, save_index
+
+
+def memory_kb() -> dict:
+    out = {}
+    with open('/proc/self/status') as f:
+        for line in f:
+            key = line.split(':')[0]
+            if key in ('VmRSS', 'RssAnon', 'RssFile'):
+                out[key] = int(line.split()[1])
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            out['Pss'] = next(int(line.split()[1]) for line in f if line.startswith('Pss:'))
+    except (OSError, StopIteration):
+        pass
+    return out
+
+
+def worker(mode: str, tmp: str, lookups: int, go: str):
+    # wait until every worker has started so they load concurrently
+    while not os.path.exists(go):
+        time.sleep(0.001)
+    start = time.perf_counter()
+    if mode == 'pickle':
+        with open(os.path.join(tmp, 'index.pkl'), 'rb') as f:
+            index = pickle.load(f)
+        get = lambda ids: index.get_items(ids)
+    else:
+        vectors = np.load(os.path.join(tmp, 'embeddings.npy'), mmap_mode='r')
+        index = load_index(os.path.join(tmp, 'index.bin'), vectors.shape[1])
+        get = lambda ids: np.asarray(vectors[ids], dtype=np.float32)
+    load = time.perf_counter() - start
+    ids = np.random.default_rng(os.getpid()).integers(0, index.get_current_count(), lookups)
+    start = time.perf_counter()
+    for i in ids:
+        index.knn_query(get([int(i)]), k=10)
+    query = time.perf_counter() - start
+    print(json.dumps({'load_s': load, 'query_ms': 1000 * query / lookups, **memory_kb()}))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--n', type=int, default=100000)
+    parser.add_argument('--dim', type=int, default=768)
+    parser.add_argument('--procs', type=int, default=4)
+    parser.add_argument('--lookups', type=int, default=200)
+    parser.add_argument('--worker', nargs=3, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(args.worker[0], args.worker[1], args.lookups, args.worker[2])
+        sys.exit(0)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"building index of {args.n} x {args.dim}")
+        data = np.random.default_rng(0).standard_normal((args.n, args.dim), dtype=np.float32)
+        data /= np.linalg.norm(data, axis=1, keepdims=True)
+        index = new_index(args.dim, args.n)
+        index.add_items(data, np.arange(args.n))
+        with open(os.path.join(tmp, 'index.pkl'), 'wb') as f:
+            pickle.dump(index, f)
+        save_index(index, os.path.join(tmp, 'index.bin'))
+        store = EmbeddingStore(os.path.join(tmp, 'embeddings.npy'))
+        store.create(args.dim, args.n, rows=[(list(range(args.n)), data)])
+        del index, data, store
+
+        print(f"{'format':>8} {'load s':>7} {'query ms':>9} {'RSS MB':>7} {'anon MB':>8} {'file MB':>8} {'PSS MB':>7}   (mean of {args.procs} concurrent processes)")
+        for mode in ('pickle', 'native'):
+            go = os.path.join(tmp, f'go-{mode}')
+            procs = [subprocess.Popen([sys.executable, __file__, '--lookups', str(args.lookups), '--worker', mode, tmp, go],
+                                      stdout=subprocess.PIPE, text=True) for _ in range(args.procs)]
+            time.sleep(1)  # let interpreters and imports finish before the clock starts
+            open(go, 'w').close()
+            results = [json.loads(p.communicate()[0]) for p in procs]
+            mean = lambda key: sum(r.get(key, 0) for r in results) / len(results)
+            print(f"{mode:>8} {mean('load_s'):>7.2f} {mean('query_ms'):>9.2f} {mean('VmRSS') / 1024:>7.0f} "
+                  f"{mean('RssAnon') / 1024:>8.0f} {mean('RssFile') / 1024:>8.0f} {mean('Pss') / 1024:>7.0f}")
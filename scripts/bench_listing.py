@@ -0,0 +1,108 @@
+"""
+Latency of deep listing pages: OFFSET paging vs the (published, id) keyset cursor.
+
+Builds a synthetic papers.db (--papers rows, migrated so idx_papers_published and
+corpus_meta exist) in a temp dir and requests page 1 and page --page of `/` through the
+Flask test client, both the old way (?page=N, which falls back to OFFSET) and by cursor
+(the cursor for page N is read from the db up front, as if the user had clicked through).
+Counts are cached by corpus version, so only the first request of each listing pays for one;
+the rendered-page cache is turned off.
+
+    python scripts/bench_listing.py --papers 1000000 --page 5000
+"""
+import argparse, os, random, sqlite3, sys, tempfile, time
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from fake_arxiv import CATEGORIES, WORDS
+from migrate import migrate
+
+PER_PAGE = 10  # app.index
+
+
+def build_db(db_file: str, n: int):
+    db = sqlite3.connect(db_file)
+    for script in ('schema.sql', 'fts5.sql'):
+        with open(os.path.join(REPO_ROOT, 'scripts', script)) as f:
+            db.executescript(f.read())
+    db.close()
+    migrate(db_file)
+
+    rng = random.Random(0)
+    start = time.mktime((2015, 1, 1, 0, 0, 0, 0, 0, 0))
+
+    def rows():
+        for i in range(1, n + 1):
+            published = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(start + rng.randrange(10 * 365 * 86400)))
+            yield (i, f'paper {i}', f'synthetic/{i}', published, published,
+                   ' '.join(rng.choice(WORDS) for _ in range(20)), 'someone', rng.choice(CATEGORIES))
+
+    db = sqlite3.connect(db_file)
+    with db:
+        db.executemany('''
+            INSERT INTO papers (id, title, arxiv_id, published, updated, summary, author, category, pdf_link, abstract_link, arxiv_link)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, '', '', '')
+        ''', rows())
+    db.execute('ANALYZE')
+    db.close()
+
+
+def cursor_for(db_file: str, page: int, category=None) -> str:
+    # the last row of the page before `page`, i.e. what the app would have put in the Next link
+    db = sqlite3.connect(db_file)
+    where, params = ('WHERE category LIKE ?', ['%' + category + '%']) if category else ('', [])
+    published, paper_id = db.execute(f'SELECT published, id FROM papers {where} ORDER BY published DESC, id DESC LIMIT 1 OFFSET ?',
+                                     params + [(page - 1) * PER_PAGE - 1]).fetchone()
+    db.close()
+    return f'{published}_{paper_id}'
+
+
+def timed(client, repeat: int, **query) -> np.ndarray:
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        response = client.get('/', query_string=query)
+        latencies.append(time.perf_counter() - start)
+        assert response.status_code == 200, response.status_code
+    return np.array(latencies) * 1000
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--papers', type=int, default=1_000_000)
+    parser.add_argument('--page', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    os.environ['ARXIVR_ENCODER'] = 'hashing'
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = os.path.join(tmp, 'papers.db')
+        print(f"building {args.papers} paper db")
+        start = time.perf_counter()
+        build_db(db_file, args.papers)
+        print(f"built in {time.perf_counter() - start:.0f}s")
+        os.chdir(tmp)  # the app reads papers.db from the working directory (no index here; listing doesn't need one)
+        import app as arxivr
+        from page_cache import PageCache
+        arxivr.page_cache = PageCache(max_entries=0)  # time the queries, not rendered-page cache hits
+        client = arxivr.app.test_client()
+
+        print(f"{'listing':>28} {'p50 ms':>8} {'p99 ms':>8}")
+        for label, category in (('all papers', None), ('category cs.LG', 'cs.LG')):
+            extra = {'category': category} if category else {}
+            cases = [
+                ('page 1', {}),
+                (f'page {args.page}, offset', {'page': args.page}),
+                (f'page {args.page}, cursor', {'page': args.page, 'cursor': cursor_for(db_file, args.page, category)}),
+            ]
+            for name, query in cases:
+                ms = timed(client, args.repeat, **query, **extra)
+                print(f"{label + ': ' + name:>28} {np.percentile(ms, 50):>8.2f} {np.percentile(ms, 99):>8.2f}")
+
+        arxivr.count_cache.clear()
+        arxivr.count_cache_version = None
+        ms = timed(client, 1)
+        print(f"{'first request (counts)':>28} {ms[0]:>8.2f}")
@@ -0,0 +1,103 @@
+"""
+Recall@10 vs brute force, RAM and QPS: the hnswlib index against the quantized tiers.
+
+Uses embeddings.npy (+ paper_embeddings in --db) if --embeddings is given, otherwise a
+synthetic clustered set of unit vectors. Queries are held-out perturbations of corpus vectors;
+ground truth is an exact float32 scan. RAM is what each tier keeps resident: the saved
+index.bin size for hnswlib (vectors + graph), codes + codebooks for the quantized tiers (their
+re-rank reads come from the memory-mapped float vectors, i.e. the page cache, and are shared).
+
+    python scripts/bench_quantized.py --n 200000
+    python scripts/bench_quantized.py --embeddings embeddings.npy --db papers.db
+"""
+import argparse, os, sqlite3, sys, tempfile, time
+
+import numpy as np
+
+from build_quantized import build
+from embed_index import EF, M, new_index, save_index
+
+K = 10
+
+
+def synthetic(n: int, dim: int, clusters: int = 1000, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim), dtype=np.float32)
+    vectors = np.empty((n, dim), dtype=np.float32)
+    for i in range(0, n, 65536):
+        rows = min(65536, n - i)
+        vectors[i:i + rows] = centers[rng.integers(clusters, size=rows)] + 0.6 * rng.standard_normal((rows, dim), dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def brute_force(vectors: np.ndarray, ids: np.ndarray, queries: np.ndarray, k: int = K) -> np.ndarray:
+    best = np.zeros((len(queries), 0), dtype=np.int64), np.zeros((len(queries), 0), dtype=np.float32)
+    for i in range(0, len(ids), 65536):
+        chunk = ids[i:i + 65536]
+        scores = queries @ np.asarray(vectors[chunk], dtype=np.float32).T
+        all_ids = np.hstack([best[0], np.broadcast_to(chunk, scores.shape)])
+        all_scores = np.hstack([best[1], scores])
+        top = np.argsort(-all_scores, axis=1)[:, :k]
+        best = np.take_along_axis(all_ids, top, 1), np.take_along_axis(all_scores, top, 1)
+    return best[0]
+
+
+def measure(index, queries: np.ndarray, truth: np.ndarray):
+    found = []
+    start = time.perf_counter()
+    for q in queries:
+        labels, _ = index.knn_query(q, k=K)
+        found.append(labels[0].astype(np.int64))
+    elapsed = time.perf_counter() - start
+    recall = np.mean([len(set(f) & set(t)) / K for f, t in zip(found, truth)])
+    return recall, len(queries) / elapsed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--n', type=int, default=100000)
+    parser.add_argument('--dim', type=int, default=768)
+    parser.add_argument('--embeddings', help='benchmark on a real embeddings.npy instead of synthetic vectors')
+    parser.add_argument('--db', default='papers.db', help='with --embeddings, which rows are papers')
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--pq-m', type=int, nargs='+', default=[48, 96, 192])
+    parser.add_argument('--rerank', type=int, nargs='+', default=[0, 100, 400], help='0 = rank by the codes alone')
+    args = parser.parse_args()
+
+    if args.embeddings:
+        vectors = np.load(args.embeddings, mmap_mode='r')
+        ids = np.array([row[0] for row in sqlite3.connect(args.db).execute('SELECT paper_id FROM paper_embeddings ORDER BY paper_id')])
+    else:
+        vectors = synthetic(args.n, args.dim)
+        ids = np.arange(args.n)
+    rng = np.random.default_rng(1)
+    queries = np.asarray(vectors[np.sort(rng.choice(ids, args.queries, replace=False))], dtype=np.float32)
+    queries += 0.05 * rng.standard_normal(queries.shape, dtype=np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    print(f"{len(ids)} vectors, dim {vectors.shape[1]}, {len(queries)} queries; computing ground truth")
+    truth = brute_force(vectors, ids, queries)
+
+    print(f"{'tier':>26} {'recall@10':>10} {'RAM MB':>8} {'QPS':>8}")
+    float_mb = len(ids) * vectors.shape[1] * 4 / 2**20
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        hnsw = new_index(vectors.shape[1], len(ids))
+        for i in range(0, len(ids), 65536):
+            hnsw.add_items(np.asarray(vectors[ids[i:i + 65536]], dtype=np.float32), ids[i:i + 65536])
+        save_index(hnsw, os.path.join(tmp, 'index.bin'))
+        hnsw_mb = os.path.getsize(os.path.join(tmp, 'index.bin')) / 2**20
+        print(f"(hnsw built in {time.perf_counter() - start:.0f}s; raw float32 vectors are {float_mb:.0f}MB)")
+        for ef in (EF, 4 * EF):
+            hnsw.set_ef(ef)
+            recall, qps = measure(hnsw, queries, truth)
+            print(f"{f'hnsw M={M} ef={ef}':>26} {recall:>10.3f} {hnsw_mb:>8.1f} {qps:>8.0f}")
+
+    for kind, m in [('int8', None)] + [('pq', m) for m in args.pq_m]:
+        if m and vectors.shape[1] % m:
+            continue
+        index = build(vectors, ids, kind, m or 0)
+        name = kind if kind == 'int8' else f'pq m={m}'
+        for rerank in args.rerank:
+            index.vectors, index.rerank = (vectors, rerank) if rerank else (None, K)
+            recall, qps = measure(index, queries, truth)
+            print(f"{name + (f' rerank={rerank}' if rerank else ''):>26} {recall:>10.3f} {index.nbytes / 2**20:>8.1f} {qps:>8.0f}")
@@ -0,0 +1,113 @@
+"""
+Concurrent load test for /api/search/semantic.
+
+Builds a synthetic corpus (papers.db + index.bin + embeddings.npy) in a temp dir, embedded with
+the offline HashingBackend so queries land near relevant papers, then hammers the endpoint from
+--threads client threads through the Flask test client. Each encoder configuration (no batching,
+micro-batching, micro-batching + LRU cache) is reported with p50/p99 latency and QPS.
+
+    python scripts/bench_semantic.py --papers 50000 --threads 32 --requests 100
+"""
+import argparse, os, random, sqlite3, sys, tempfile, threading, time
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from embed_index import EmbeddingStore, new_index, save_index
+from fake_arxiv import WORDS
+from migrate import migrate
+
+
+def build_corpus(tmp: str, n: int, backend):
+    db_file = os.path.join(tmp, 'papers.db')
+    db = sqlite3.connect(db_file)
+    for script in ('schema.sql', 'fts5.sql'):
+        with open(os.path.join(REPO_ROOT, 'scripts', script)) as f:
+            db.executescript(f.read())
+    db.close()
+    migrate(db_file)
+
+    rng = random.Random(0)
+    summaries = [' '.join(rng.choice(WORDS) for _ in range(40)) for _ in range(n)]
+    db = sqlite3.connect(db_file)
+    with db:
+        db.executemany('''
+            INSERT INTO papers (id, title, arxiv_id, published, updated, summary, author, category, pdf_link, abstract_link, arxiv_link)
+            VALUES (?, ?, ?, '2024-01-01T00:00:00Z', '2024-01-01T00:00:00Z', ?, 'someone', 'cs.LG', '', '', '')
+        ''', [(i, f'paper {i}', f'synthetic/{i}', s) for i, s in enumerate(summaries, start=1)])
+    db.close()
+
+    vectors = np.vstack([backend.encode(summaries[i:i + 4096]) for i in range(0, n, 4096)])
+    ids = list(range(1, n + 1))
+    index = new_index(vectors.shape[1], n)
+    index.add_items(vectors, ids)
+    save_index(index, os.path.join(tmp, 'index.bin'))
+    store = EmbeddingStore(os.path.join(tmp, 'embeddings.npy'))
+    store.create(vectors.shape[1], n + 1, rows=[(ids, vectors)])
+
+
+def run_load(client_factory, queries, threads: int, requests_per_thread: int):
+    latencies, errors = [], []
+    lock = threading.Lock()
+    barrier = threading.Barrier(threads + 1)
+
+    def client_thread(seed):
+        client = client_factory()
+        rng = random.Random(seed)
+        mine = []
+        barrier.wait()
+        for _ in range(requests_per_thread):
+            # zipf-ish: a few popular queries and a long tail
+            q = queries[min(int(rng.paretovariate(1.2)) - 1, len(queries) - 1)]
+            start = time.perf_counter()
+            response = client.get('/api/search/semantic', query_string={'q': q, 'k': 10})
+            mine.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                errors.append(response.status_code)
+        with lock:
+            latencies.extend(mine)
+
+    workers = [threading.Thread(target=client_thread, args=(i,)) for i in range(threads)]
+    for w in workers:
+        w.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for w in workers:
+        w.join()
+    return np.array(latencies), time.perf_counter() - start, errors
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--papers', type=int, default=20000)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=50, help='requests per thread')
+    parser.add_argument('--queries', type=int, default=2000, help='distinct queries to draw from')
+    args = parser.parse_args()
+
+    os.environ['ARXIVR_ENCODER'] = 'hashing'
+    from encoder import HashingBackend, QueryEncoder
+
+    with tempfile.TemporaryDirectory() as tmp:
+        backend = HashingBackend()
+        backend.load()
+        print(f"building {args.papers} paper corpus")
+        build_corpus(tmp, args.papers, backend)
+        os.chdir(tmp)  # the app reads papers.db / index.bin / embeddings.npy from the working directory
+        import app as arxivr
+        while arxivr.vector_index is None:
+            time.sleep(0.1)
+
+        rng = random.Random(1)
+        queries = [' '.join(rng.choice(WORDS) for _ in range(rng.randint(2, 6))) for _ in range(args.queries)]
+        configs = [('no batching, no cache', 1, 0), ('micro-batching', 32, 0), ('micro-batching + cache', 32, 4096)]
+        print(f"{'encoder':>24} {'p50 ms':>7} {'p99 ms':>7} {'QPS':>7} {'batches':>8} {'avg batch':>9} {'cache hits':>10} {'errors':>6}")
+        for name, max_batch, cache_size in configs:
+            arxivr.query_encoder = encoder = QueryEncoder(HashingBackend(), max_batch=max_batch, cache_size=cache_size)
+            encoder.ready.wait()
+            latencies, elapsed, errors = run_load(arxivr.app.test_client, queries, args.threads, args.requests)
+            print(f"{name:>24} {np.percentile(latencies, 50) * 1000:>7.2f} {np.percentile(latencies, 99) * 1000:>7.2f} "
+                  f"{len(latencies) / elapsed:>7.0f} {encoder.batches:>8} {encoder.encoded / max(encoder.batches, 1):>9.1f} "
+                  f"{encoder.cache_hits:>10} {len(errors):>6}")
@@ -0,0 +1,120 @@
+"""
+Sharded vector search on one Linux box: recall and latency against a single in-process index,
+then with one worker stopped (SIGSTOP: accepts connections but never answers) and one killed.
+
+Builds --shards id-range shards of a synthetic clustered set in a temp dir, starts a worker
+process per shard (shard_worker.py) and queries them through ShardedIndex, serially for
+p50/p99 latency and from --clients threads for QPS. Queries are held-out perturbations of
+corpus vectors; ground truth is an exact scan. With a shard down, answers should come back
+within --timeout (then immediately, while the shard is skipped) with about 1/--shards of the
+recall missing, and full recall should return once the shard is back.
+
+    python scripts/bench_shards.py --n 200000 --shards 4 --clients 8
+"""
+import argparse, os, signal, sys, tempfile, time
+from concurrent.futures import ThreadPoolExecutor
+
+import hnswlib
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from bench_quantized import K, brute_force, synthetic
+from build_shards import build_shard, build_shards, by_id
+from embed_index import EF
+from shard_worker import start_workers
+from shards import load_sharded
+
+
+def run_queries(search, queries: np.ndarray, truth: np.ndarray, clients: int) -> dict:
+    latencies, found, partial = [], [], 0
+    for q in queries:
+        start = time.perf_counter()
+        labels, missing = search(q)
+        latencies.append(time.perf_counter() - start)
+        found.append(labels)
+        partial += bool(missing)
+    recall = np.mean([len(set(f.tolist()) & set(t.tolist())) / K for f, t in zip(found, truth)])
+    with ThreadPoolExecutor(clients) as pool:
+        start = time.perf_counter()
+        list(pool.map(search, queries))
+        qps = len(queries) / (time.perf_counter() - start)
+    ms = 1000 * np.array(latencies)
+    return {'recall': recall, 'p50_ms': np.percentile(ms, 50), 'p99_ms': np.percentile(ms, 99), 'max_ms': ms.max(),
+            'qps': qps, 'partial': partial / len(queries)}
+
+
+def report(name: str, row: dict):
+    print(f"{name:>28} {row['recall']:>9.3f} {row['p50_ms']:>8.2f} {row['p99_ms']:>8.2f} {row['max_ms']:>8.1f} {row['qps']:>8.0f} {row['partial']:>8.0%}")
+
+
+def wait_ready(index, timeout: float = 120):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        index.refresh_counts()
+        _, _, missing = index.search(np.zeros((1, index.dim), dtype=np.float32) + 1, 1)
+        if not missing:
+            return
+        for shard in index.shards:
+            shard.down_until = 0.0
+        time.sleep(0.5)
+    raise RuntimeError(f"shard workers not up after {timeout}s")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--n', type=int, default=100000)
+    parser.add_argument('--dim', type=int, default=768)
+    parser.add_argument('--shards', type=int, default=4)
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--clients', type=int, default=8, help='concurrent query threads for the QPS column')
+    parser.add_argument('--timeout', type=float, default=0.5)
+    parser.add_argument('--retry-after', type=float, default=2.0)
+    parser.add_argument('--port', type=int, default=7300, help='first worker port')
+    args = parser.parse_args()
+
+    vectors = synthetic(args.n, args.dim)
+    ids = np.arange(args.n)
+    rng = np.random.default_rng(1)
+    queries = vectors[np.sort(rng.choice(ids, args.queries, replace=False))].copy()
+    queries += 0.05 * rng.standard_normal(queries.shape, dtype=np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    truth = brute_force(vectors, ids, queries)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        build_shard(vectors, ids, os.path.join(tmp, 'full.bin'))
+        single = hnswlib.Index(space='cosine', dim=args.dim)
+        single.load_index(os.path.join(tmp, 'full.bin'))
+        single.set_ef(EF)
+        config_file = os.path.join(tmp, 'shards.json')
+        build_shards(vectors, by_id(ids, args.shards), os.path.join(tmp, 'shards'), config_file, base_port=args.port)
+
+        workers = start_workers(config_file)
+        try:
+            index = load_sharded(config_file, timeout=args.timeout)
+            index.retry_after = args.retry_after
+            wait_ready(index)
+
+            def sharded(q):
+                labels, _, missing = index.search(q, K)
+                return labels[0], missing
+
+            print(f"{args.n} vectors, dim {args.dim}, {args.shards} shards, {args.queries} queries, timeout {args.timeout}s")
+            print(f"{'':>28} {'recall@10':>9} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} {'QPS':>8} {'partial':>8}")
+            report('single index', run_queries(lambda q: (single.knn_query(q, k=K)[0][0], []), queries, truth, args.clients))
+            report('sharded', run_queries(sharded, queries, truth, args.clients))
+
+            os.kill(workers[0].pid, signal.SIGSTOP)
+            report(f'{workers[0].name} stopped', run_queries(sharded, queries, truth, args.clients))
+            os.kill(workers[0].pid, signal.SIGCONT)
+            time.sleep(args.retry_after)
+            report(f'{workers[0].name} resumed', run_queries(sharded, queries, truth, args.clients))
+
+            workers[-1].kill()
+            workers[-1].join()
+            report(f'{workers[-1].name} killed', run_queries(sharded, queries, truth, args.clients))
+            index.close()
+        finally:
+            for worker in workers:
+                worker.kill()
@@ -0,0 +1,226 @@
+"""
+Reproducible end-to-end benchmarks at 10k / 100k / 1M papers, for comparing commits.
+
+For each scale a synthetic corpus is generated once (synth_corpus.py) under --corpus-dir and
+reused by later runs; corpora are keyed by scale, --seed and --end, and their vectors are 768-d
+like the hashing encoder's queries. Every run then:
+
+  * builds index.bin with the current embed_index parameters (build time, recall@10 against
+    an exact scan, single-query QPS at the app's ef),
+  * sweeps hnswlib M x ef on the first --sweep-papers vectors (build time per M, recall/QPS
+    per ef),
+  * requests the listing, FTS search, category filter, paper page (kNN fallback, since
+    paper_neighbors is left empty), /about and /api/stats through the Flask test client in a
+    fresh process, with the page cache off and the app's count/stats caches cleared before
+    every request, so what's timed is the query work rather than a cache hit.
+
+Everything runs offline (the app uses the hashing encoder). Results go to --out as JSON; pass
+--compare with an earlier file to print new/old ratios.
+
+    python scripts/bench_suite.py --scales 10k 100k --out bench_results.json
+    python scripts/bench_suite.py --scales 10k 100k --out new.json --compare bench_results.json
+"""
+import argparse, json, multiprocessing, os, platform, random, subprocess, sys, time
+
+import hnswlib
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from bench_quantized import K, brute_force, measure
+from embed_index import EF, EF_CONSTRUCTION, M, new_index, save_index
+from synth_corpus import CATEGORIES, END, generate, load_manifest, vocabulary
+
+SCALES = {'10k': 10000, '100k': 100000, '1m': 1000000}
+QUERIES = 200
+ADD_CHUNK = 65536
+
+
+def git_commit() -> dict:
+    def git(*cmd):
+        return subprocess.run(['git', *cmd], cwd=REPO_ROOT, capture_output=True, text=True).stdout.strip()
+    return {'commit': git('rev-parse', 'HEAD'), 'dirty': bool(git('status', '--porcelain', '--untracked-files=no'))}
+
+
+def corpus(corpus_dir: str, scale: str, seed: int, end: str, regenerate: bool) -> dict:
+    out_dir = os.path.join(corpus_dir, f'{scale}-s{seed}-e{end}')
+    manifest = None if regenerate else load_manifest(out_dir)
+    if manifest is None:
+        print(f"generating {scale} corpus in {out_dir}")
+        manifest = generate(out_dir, SCALES[scale], seed=seed, end=end)
+    return dict(manifest, dir=out_dir)
+
+
+def held_out_queries(vectors, n: int, count: int = QUERIES, seed: int = 1) -> np.ndarray:
+    # perturbed copies of corpus vectors, so each has a cluster of true neighbors
+    rng = np.random.default_rng(seed)
+    queries = np.asarray(vectors[np.sort(rng.choice(np.arange(1, n + 1), count, replace=False))], dtype=np.float32)
+    queries += 0.05 * rng.standard_normal(queries.shape, dtype=np.float32)
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+
+def build_index(vectors, n: int, m: int = None, ef_construction: int = EF_CONSTRUCTION):
+    if m is None:
+        index = new_index(vectors.shape[1], n)  # exactly what embed_texts.py builds
+    else:
+        index = hnswlib.Index(space='cosine', dim=vectors.shape[1])
+        index.init_index(max_elements=n, ef_construction=ef_construction, M=m)
+    start = time.perf_counter()
+    for first in range(1, n + 1, ADD_CHUNK):
+        last = min(first + ADD_CHUNK, n + 1)
+        index.add_items(np.asarray(vectors[first:last], dtype=np.float32), np.arange(first, last))
+    return index, time.perf_counter() - start
+
+
+def bench_index(corpus_dir: str, n: int) -> dict:
+    """Build the app's index.bin with the current parameters; recall and QPS at the app's ef."""
+    vectors = np.load(os.path.join(corpus_dir, 'embeddings.npy'), mmap_mode='r')
+    index, build_s = build_index(vectors, n)
+    save_index(index, os.path.join(corpus_dir, 'index.bin'))
+    queries = held_out_queries(vectors, n)
+    truth = brute_force(vectors, np.arange(1, n + 1), queries)
+    index.set_ef(EF)
+    recall, qps = measure(index, queries, truth)
+    return {'M': M, 'ef_construction': EF_CONSTRUCTION, 'ef': EF, 'build_s': build_s,
+            'index_mb': os.path.getsize(os.path.join(corpus_dir, 'index.bin')) / 2 ** 20, f'recall@{K}': recall, 'qps': qps}
+
+
+def bench_sweep(corpus_dir: str, n: int, ms, efs, ef_construction: int) -> list:
+    vectors = np.load(os.path.join(corpus_dir, 'embeddings.npy'), mmap_mode='r')
+    queries = held_out_queries(vectors, n)
+    truth = brute_force(vectors, np.arange(1, n + 1), queries)
+    results = []
+    for m in ms:
+        index, build_s = build_index(vectors, n, m, ef_construction)
+        for ef in efs:
+            index.set_ef(max(ef, K))
+            recall, qps = measure(index, queries, truth)
+            results.append({'M': m, 'ef_construction': ef_construction, 'ef': ef, 'build_s': build_s, f'recall@{K}': recall, 'qps': qps})
+            print(f"  sweep M={m:<3} ef={ef:<4} build {build_s:7.1f}s  recall@{K} {recall:.3f}  {qps:8.0f} QPS")
+    return results
+
+
+def app_requests(n: int, repeat: int, seed: int = 0) -> dict:
+    """Path -> list of URLs to request; parameters vary so one lucky row can't dominate."""
+    rng = random.Random(seed)
+    words = vocabulary()
+    common, mid, rare = words[:30], words[100:1000], words[5000:]
+    pages = max(1, n // 10)
+    return {
+        'listing': ['/'] * repeat,
+        'listing_deep': [f'/?page={rng.randint(1, min(pages, 1000))}' for _ in range(repeat)],
+        'fts_common': [f'/?search={rng.choice(common)}' for _ in range(repeat)],
+        'fts_mid': [f'/?search={rng.choice(mid)}' for _ in range(repeat)],
+        'fts_rare': [f'/?search={rng.choice(rare)}' for _ in range(repeat)],
+        'fts_relevance': [f'/?search={rng.choice(mid)}+{rng.choice(mid)}&sort=relevance' for _ in range(repeat)],
+        'category': [f'/?category={rng.choice(CATEGORIES)}' for _ in range(repeat)],
+        'category_deep': [f'/?category={rng.choice(CATEGORIES)}&page={rng.randint(1, max(1, min(100, n // 1000)))}' for _ in range(repeat)],
+        'paper_knn': [f'/papers/{rng.randint(1, n)}' for _ in range(repeat)],
+        'about': ['/about'] * repeat,
+        'api_stats': ['/api/stats'] * repeat,
+    }
+
+
+def app_worker(corpus_dir: str, n: int, repeat: int, load_timeout: float) -> dict:
+    """Runs in its own (spawned) process: the app opens papers.db and index.bin from the cwd at import."""
+    os.chdir(corpus_dir)
+    os.environ['ARXIVR_ENCODER'] = 'hashing'
+    sys.path.insert(0, REPO_ROOT)
+    import app as arxivr
+    from page_cache import PageCache
+    from stats import StatsCache
+    arxivr.page_cache = PageCache(max_entries=0)
+
+    deadline = time.monotonic() + load_timeout
+    while not arxivr.semantic_search_ready() and time.monotonic() < deadline:
+        time.sleep(0.1)
+    if not arxivr.semantic_search_ready():
+        raise RuntimeError(f"vector index / encoder not ready after {load_timeout}s")
+
+    client = arxivr.app.test_client()
+    results = {}
+    for path, urls in app_requests(n, repeat).items():
+        latencies = []
+        for url in urls:
+            with arxivr.count_cache_lock:
+                arxivr.count_cache.clear()
+            arxivr.corpus_stats_cache = StatsCache()
+            start = time.perf_counter()
+            response = client.get(url)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                raise RuntimeError(f"{url} returned {response.status_code}")
+        ms = 1000 * np.array(latencies)
+        results[path] = {'first_ms': float(ms[0]), 'p50_ms': float(np.percentile(ms, 50)), 'p99_ms': float(np.percentile(ms, 99)),
+                         'mean_ms': float(ms.mean()), 'qps': float(len(ms) / ms.sum() * 1000)}
+        print(f"  {path:>14} p50 {results[path]['p50_ms']:8.2f} ms  p99 {results[path]['p99_ms']:8.2f} ms  first {ms[0]:8.2f} ms")
+    return results
+
+
+def flatten(results: dict, prefix: str = '') -> dict:
+    out = {}
+    for key, value in results.items():
+        name = f'{prefix}{key}'
+        if isinstance(value, dict):
+            out.update(flatten(value, name + '.'))
+        elif isinstance(value, list):
+            for row in value:
+                out.update(flatten({k: v for k, v in row.items() if k not in ('M', 'ef', 'ef_construction')},
+                                   f"{name}.M{row['M']}.ef{row['ef']}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            out[name] = value
+    return out
+
+
+def compare(new: dict, old: dict):
+    # lower is better for *_ms / *_s, higher for qps and recall; print the raw ratio either way
+    old_flat, new_flat = flatten(old['scales']), flatten(new['scales'])
+    print(f"\nnew / old ({old.get('commit', '?')[:10]} -> {new.get('commit', '?')[:10]})")
+    for key in sorted(set(old_flat) & set(new_flat)):
+        if key.endswith(('_ms', '_s', 'qps', f'recall@{K}')) and old_flat[key]:
+            print(f"  {key:<50} {old_flat[key]:12.3f} {new_flat[key]:12.3f} {new_flat[key] / old_flat[key]:7.2f}x")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scales', nargs='+', default=list(SCALES), choices=list(SCALES))
+    parser.add_argument('--corpus-dir', default='bench_corpus', help='generated corpora are kept here and reused')
+    parser.add_argument('--regenerate', action='store_true', help='regenerate corpora even if they exist')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--end', default=END, help='YYYY-MM-DD of the newest synthetic paper')
+    parser.add_argument('--repeat', type=int, default=50, help='requests per app path')
+    parser.add_argument('--sweep-papers', type=int, default=100000, help='vectors used for the M x ef sweep (capped at the scale)')
+    parser.add_argument('--sweep-m', type=int, nargs='+', default=[8, 16, 32])
+    parser.add_argument('--sweep-ef', type=int, nargs='+', default=[10, 25, 50, 100, 200])
+    parser.add_argument('--sweep-ef-construction', type=int, default=EF_CONSTRUCTION)
+    parser.add_argument('--skip', nargs='*', default=[], choices=['index', 'sweep', 'app'])
+    parser.add_argument('--load-timeout', type=float, default=600, help='seconds to wait for the app to load the index')
+    parser.add_argument('--out', default='bench_results.json')
+    parser.add_argument('--compare', help='earlier results file to compare against')
+    args = parser.parse_args()
+
+    results = {**git_commit(), 'date': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()), 'python': platform.python_version(),
+               'platform': platform.platform(), 'cpus': os.cpu_count(), 'args': vars(args), 'scales': {}}
+    for scale in args.scales:
+        info = corpus(args.corpus_dir, scale, args.seed, args.end, args.regenerate)
+        n = info['papers']
+        print(f"{scale}: {n} papers in {info['dir']}")
+        scale_results = results['scales'][scale] = {'corpus': {k: info[k] for k in ('papers', 'dim', 'seed', 'end')}}
+        if 'index' not in args.skip or not os.path.exists(os.path.join(info['dir'], 'index.bin')):
+            scale_results['index'] = bench_index(info['dir'], n)
+            print(f"  index: build {scale_results['index']['build_s']:.1f}s, recall@{K} {scale_results['index'][f'recall@{K}']:.3f}, "
+                  f"{scale_results['index']['qps']:.0f} QPS")
+        if 'sweep' not in args.skip:
+            scale_results['sweep'] = bench_sweep(info['dir'], min(n, args.sweep_papers), args.sweep_m, args.sweep_ef,
+                                                 args.sweep_ef_construction)
+        if 'app' not in args.skip:
+            with multiprocessing.get_context('spawn').Pool(1) as pool:
+                scale_results['app'] = pool.apply(app_worker, (os.path.abspath(info['dir']), n, args.repeat, args.load_timeout))
+
+    with open(args.out, 'w') as f:
+        json.dump(results, f, indent=1)
+    print(f"wrote {args.out}")
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
@@ -0,0 +1,60 @@
+"""
+Build quantized.npz (see quantized.py) from embeddings.npy, for serving with
+ARXIVR_VECTOR_TIER=quantized. Run it after embed_texts.py; papers embedded since the last build
+aren't searchable in the quantized tier until it's rebuilt.
+
+    python scripts/build_quantized.py --kind pq --m 96
+    python scripts/build_quantized.py --kind int8
+"""
+import argparse, os, sqlite3, sys, time
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from embed_index import COPY_ROWS, EMBEDDINGS_FILE, _replace_atomically
+from quantized import PQ_M, QUANTIZED_FILE, QUANTIZERS, QuantizedIndex
+
+SAMPLE = 50000  # vectors the quantizer is trained on
+
+
+def train(vectors: np.ndarray, ids: np.ndarray, kind: str, m: int = PQ_M, sample: int = SAMPLE, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    rows = np.sort(rng.choice(ids, size=min(sample, len(ids)), replace=False))
+    data = np.asarray(vectors[rows], dtype=np.float32)
+    return (QUANTIZERS['pq'](m) if kind == 'pq' else QUANTIZERS[kind]()).fit(data)
+
+
+def build(vectors: np.ndarray, ids: np.ndarray, kind: str, m: int = PQ_M, sample: int = SAMPLE) -> QuantizedIndex:
+    quantizer = train(vectors, ids, kind, m, sample)
+    codes = np.concatenate([quantizer.encode(np.asarray(vectors[ids[i:i + COPY_ROWS]], dtype=np.float32))
+                            for i in range(0, len(ids), COPY_ROWS)])
+    return QuantizedIndex(quantizer, ids, codes)
+
+
+def save_quantized(index: QuantizedIndex, path: str = QUANTIZED_FILE):
+    def write(tmp):
+        with open(tmp, 'wb') as f:  # a file object, so savez doesn't append .npz to the temp name
+            np.savez(f, kind=index.quantizer.kind, ids=index.ids, codes=index.codes, **index.quantizer.state())
+    _replace_atomically(path, write)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default='papers.db')
+    parser.add_argument('--embeddings', default=EMBEDDINGS_FILE)
+    parser.add_argument('--out', default=QUANTIZED_FILE)
+    parser.add_argument('--kind', default='pq', choices=sorted(QUANTIZERS))
+    parser.add_argument('--m', type=int, default=PQ_M, help='pq subvectors = bytes per paper (must divide the embedding dim)')
+    parser.add_argument('--sample', type=int, default=SAMPLE)
+    args = parser.parse_args()
+
+    db = sqlite3.connect(args.db)
+    ids = np.array([row[0] for row in db.execute('SELECT paper_id FROM paper_embeddings ORDER BY paper_id')], dtype=np.int64)
+    vectors = np.load(args.embeddings, mmap_mode='r')
+    start = time.perf_counter()
+    index = build(vectors, ids, args.kind, args.m, args.sample)
+    save_quantized(index, args.out)
+    print(f"quantized {len(ids)} vectors ({args.kind}) into {index.nbytes / 2**20:.1f}MB "
+          f"(float32: {len(ids) * vectors.shape[1] * 4 / 2**20:.1f}MB) in {time.perf_counter() - start:.1f}s")
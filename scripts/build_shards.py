@@ -0,0 +1,97 @@
+"""
+Split the vector index into shards (see shards.py) and write shards.json describing them.
+
+--by category puts each embedded paper in the shard of its primary category (one shard per
+--categories entry, plus 'other'); --by id cuts the embedded ids into --shards contiguous ranges
+of equal size. Every paper lands in exactly one shard. Shard i listens on --host:--base-port+i;
+edit the addresses in shards.json to spread workers over several machines. Run it after
+embed_texts.py, start the workers with shard_worker.py and serve with ARXIVR_VECTOR_TIER=sharded.
+
+    python scripts/build_shards.py --by category
+    python scripts/build_shards.py --by id --shards 4 --out-dir shards
+"""
+import argparse, json, os, secrets, sqlite3, sys, time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from embed_index import COPY_ROWS, EF, EMBEDDINGS_FILE, _replace_atomically, new_index, save_index
+from shards import RETRY_AFTER, SHARDS_FILE, TIMEOUT
+
+CATEGORIES = ['cs.CL', 'cs.AI', 'cs.MA', 'cs.CV', 'cs.LG', 'cs.RO', 'cs.SY', 'cs.SI', 'cs.HC', 'cs.IR']  # app.CATEGORIES
+BASE_PORT = 7100
+
+
+def by_category(db: sqlite3.Connection, categories: List[str]) -> Dict[str, np.ndarray]:
+    groups = OrderedDict((category, []) for category in [*categories, 'other'])
+    for paper_id, primary in db.execute('''
+            SELECT e.paper_id, p.primary_category FROM paper_embeddings e JOIN papers p ON p.id = e.paper_id ORDER BY e.paper_id'''):
+        groups[primary if primary in groups else 'other'].append(paper_id)
+    return OrderedDict((name, np.array(ids, dtype=np.int64)) for name, ids in groups.items() if ids)
+
+
+def by_id(ids: np.ndarray, shards: int) -> Dict[str, np.ndarray]:
+    return OrderedDict((f'ids-{part[0]}-{part[-1]}', part) for part in np.array_split(np.sort(ids), shards) if len(part))
+
+
+def build_shard(vectors: np.ndarray, ids: np.ndarray, path: str):
+    index = new_index(vectors.shape[1], len(ids))
+    for i in range(0, len(ids), COPY_ROWS):
+        chunk = ids[i:i + COPY_ROWS]
+        index.add_items(np.asarray(vectors[chunk], dtype=np.float32), chunk)
+    save_index(index, path)
+
+
+def build_shards(vectors: np.ndarray, groups: Dict[str, np.ndarray], out_dir: str, config_file: str = SHARDS_FILE,
+                 host: str = '127.0.0.1', base_port: int = BASE_PORT, authkey: Optional[str] = None) -> dict:
+    os.makedirs(out_dir, exist_ok=True)
+    shards = []
+    for i, (name, ids) in enumerate(groups.items()):
+        path = os.path.join(out_dir, f'{name}.bin')
+        start = time.perf_counter()
+        build_shard(vectors, ids, path)
+        print(f"shard {name}: {len(ids)} vectors in {time.perf_counter() - start:.1f}s")
+        # index paths are relative to the config file, so the pair can be copied to another machine
+        shards.append({'name': name, 'index': os.path.relpath(path, os.path.dirname(os.path.abspath(config_file))),
+                       'address': [host, base_port + i], 'papers': len(ids)})
+    config = {'dim': vectors.shape[1], 'ef': EF, 'timeout': TIMEOUT, 'retry_after': RETRY_AFTER,
+              'authkey': authkey or secrets.token_hex(16), 'shards': shards}
+
+    def write(tmp):
+        with open(tmp, 'w') as f:
+            json.dump(config, f, indent=1)
+    _replace_atomically(config_file, write)
+    return config
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default='papers.db')
+    parser.add_argument('--embeddings', default=EMBEDDINGS_FILE)
+    parser.add_argument('--by', default='category', choices=['category', 'id'])
+    parser.add_argument('--categories', default=','.join(CATEGORIES), help='with --by category; the rest go to an "other" shard')
+    parser.add_argument('--shards', type=int, default=4, help='with --by id')
+    parser.add_argument('--out-dir', default='shards')
+    parser.add_argument('--config', default=SHARDS_FILE)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--base-port', type=int, default=BASE_PORT)
+    args = parser.parse_args()
+
+    db = sqlite3.connect(args.db)
+    vectors = np.load(args.embeddings, mmap_mode='r')
+    if args.by == 'category':
+        groups = by_category(db, args.categories.split(','))
+    else:
+        ids = np.array([row[0] for row in db.execute('SELECT paper_id FROM paper_embeddings')], dtype=np.int64)
+        groups = by_id(ids, args.shards)
+    # keep the authkey of an existing config, so copies of it on other machines still match
+    authkey = None
+    if os.path.exists(args.config):
+        with open(args.config) as f:
+            authkey = json.load(f).get('authkey')
+    config = build_shards(vectors, groups, args.out_dir, args.config, args.host, args.base_port, authkey)
+    print(f"wrote {len(config['shards'])} shards to {args.config}")
@@ -0,0 +1,168 @@
+"""
+Bulk abstract embedding for embed_texts.py / update_index.
+
+Abstracts are sorted by token length and cut into batches by a token budget (batch size x
+longest text in the batch), so a batch of short abstracts isn't padded out to the length of a
+long one and every batch costs about the same. Vectors are written straight into a
+preallocated .npy memmap as batches finish, rather than collected in a list and stacked.
+
+On a GPU the model runs in this process. On CPU, batches are spread over a pool of worker
+processes, each loading its own copy of the model with `torch.set_num_threads(threads)` and
+(where the OS allows) pinned to its own set of cores, so workers don't oversubscribe the CPU
+fighting over the same intra-op thread pool.
+"""
+import logging, multiprocessing, os, queue, tempfile
+from typing import Iterator, List, Optional
+
+import numpy as np
+from tqdm import tqdm
+
+from encoder import BACKENDS
+
+TOKEN_BUDGET = 16384  # padded tokens per batch
+MAX_BATCH = 1024
+THREADS_PER_WORKER = 4
+LENGTH_CHUNK = 10000  # texts tokenized at a time when measuring lengths
+
+
+def token_budget_batches(lengths: List[int], token_budget: int = TOKEN_BUDGET, max_batch: int = MAX_BATCH) -> Iterator[np.ndarray]:
+    """Indices into `lengths`, shortest first, grouped so len(batch) * max length in batch <= token_budget."""
+    batch = []
+    for i in np.argsort(lengths, kind='stable'):
+        # ascending, so the text being added is the longest in the batch
+        if batch and (len(batch) == max_batch or (len(batch) + 1) * lengths[i] > token_budget):
+            yield np.array(batch)
+            batch = []
+        batch.append(i)
+    if batch:
+        yield np.array(batch)
+
+
+def fixed_batches(n: int, batch_size: int = MAX_BATCH) -> Iterator[np.ndarray]:
+    """Corpus order, `batch_size` at a time (how embed_texts.py used to batch)."""
+    for i in range(0, n, batch_size):
+        yield np.arange(i, min(i + batch_size, n))
+
+
+def pin_threads(threads: int, cores: Optional[List[int]] = None):
+    try:
+        import torch
+        torch.set_num_threads(threads)
+        torch.set_num_interop_threads(1)
+    except (ImportError, RuntimeError):
+        pass  # no torch (hashing backend), or interop threads were already started
+    if cores and hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cores)
+
+
+_worker = {}
+
+
+def _init_worker(backend: str, backend_kwargs: dict, threads: int, slots):
+    try:
+        cores = slots.get_nowait()
+    except queue.Empty:
+        cores = None  # a replacement for a worker that died: its slot went with it, run unpinned
+    pin_threads(threads, cores)
+    _worker['backend'] = BACKENDS[backend](**backend_kwargs)
+    _worker['backend'].load()
+    _worker['outputs'] = {}
+
+
+def _worker_dim(_=None) -> int:
+    return _worker['backend'].encode(['dimension probe']).shape[1]
+
+
+def _embed_batch(task) -> int:
+    out_path, indices, texts = task
+    outputs = _worker['outputs']
+    if out_path not in outputs:
+        outputs.clear()
+        outputs[out_path] = np.load(out_path, mmap_mode='r+')
+    out = outputs[out_path]
+    out[indices] = _worker['backend'].encode(texts)
+    return len(indices)
+
+
+class EmbeddingEngine:
+    """Embed abstracts with a backend from encoder.py (`siglip` for the real index).
+
+    `workers=0` runs the model in this process (use it on GPU); otherwise `workers` processes
+    with `threads` torch threads each. `token_budget=None` disables length bucketing and uses
+    fixed `max_batch`-sized batches in corpus order.
+    """
+
+    def __init__(self, backend: str = 'siglip', backend_kwargs: Optional[dict] = None, workers: int = 0,
+                 threads: int = THREADS_PER_WORKER, token_budget: Optional[int] = TOKEN_BUDGET,
+                 max_batch: int = MAX_BATCH, out_dir: Optional[str] = None, dtype=np.float32, progress: bool = True):
+        self.backend, self.backend_kwargs = backend, backend_kwargs or {}
+        self.workers, self.threads = workers, threads
+        self.token_budget, self.max_batch = token_budget, max_batch
+        self.out_dir, self.dtype, self.progress = out_dir, dtype, progress
+        self.model = self.pool = None
+
+    def batches(self, texts: List[str]) -> List[np.ndarray]:
+        if self.token_budget is None:
+            return list(fixed_batches(len(texts), self.max_batch))
+        sizer = self.model or BACKENDS[self.backend](**self.backend_kwargs)  # only needs a tokenizer
+        lengths = []
+        for i in range(0, len(texts), LENGTH_CHUNK):
+            lengths.extend(sizer.token_lengths(texts[i:i + LENGTH_CHUNK]))
+        return list(token_budget_batches(lengths, self.token_budget, self.max_batch))
+
+    def _start(self):
+        if self.workers == 0:
+            if self.model is None:
+                self.model = BACKENDS[self.backend](**self.backend_kwargs)
+                self.model.load()
+            return self.model.encode(['dimension probe']).shape[1]
+        if self.pool is None:
+            # spawn, not fork: forking a process that has already initialized torch's thread pools can deadlock
+            ctx = multiprocessing.get_context('spawn')
+            slots = ctx.Queue()
+            cpus = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else []
+            for w in range(self.workers):
+                cores = cpus[w * self.threads:(w + 1) * self.threads]
+                slots.put(cores if len(cores) == self.threads else None)
+            self.pool = ctx.Pool(self.workers, initializer=_init_worker,
+                                 initargs=(self.backend, self.backend_kwargs, self.threads, slots))
+        return self.pool.apply(_worker_dim)
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """(len(texts), dim) normalized vectors in input order, as a read-only memmap of a temp file."""
+        batches = self.batches(texts)
+        dim = self._start()
+        fd, out_path = tempfile.mkstemp(dir=self.out_dir, prefix='.embeddings-', suffix='.npy')
+        os.close(fd)
+        try:
+            np.lib.format.open_memmap(out_path, mode='w+', dtype=self.dtype, shape=(len(texts), dim)).flush()
+            bar = tqdm(total=len(texts), desc='Embedding', unit='abstract', disable=not self.progress)
+            if self.pool is None:
+                out = np.load(out_path, mmap_mode='r+')
+                for indices in batches:
+                    out[indices] = self.model.encode([texts[i] for i in indices])
+                    bar.update(len(indices))
+                out.flush()
+            else:
+                tasks = ((out_path, indices, [texts[i] for i in indices]) for indices in batches)
+                for done in self.pool.imap_unordered(_embed_batch, tasks):
+                    bar.update(done)
+            bar.close()
+            result = np.load(out_path, mmap_mode='r')
+        finally:
+            # the mapping outlives the name, so nothing is left behind however the caller exits
+            os.unlink(out_path)
+        logging.info(f"embedded {len(texts)} abstracts in {len(batches)} batches")
+        return result
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
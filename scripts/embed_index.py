@@ -0,0 +1,235 @@
+"""
+Incremental maintenance of the hnswlib index built by embed_texts.py.
+
+The `paper_embeddings` table records which papers are in the index, with which model and
+which version of the abstract (`papers.updated`). An update embeds only papers that are new,
+changed, or were embedded with a different model, grows the existing index with
+`resize_index` + `add_items` (re-adding a label overwrites its vector), and `mark_deleted`s
+papers that no longer exist. The index file is replaced atomically before the bookkeeping is
+committed, so a crash in between only means some papers get re-embedded next run.
+
+Two files are written:
+  index.bin       hnswlib's native format (save_index/load_index), no pickle round trip
+  embeddings.npy  the normalized vectors, one row per paper id (row == papers.id, zeros for
+                  ids without a vector), which the app opens with mmap so lookups come from
+                  the page cache and are shared by every worker process; also replaced
+                  atomically, never modified under a reader (see EmbeddingStore)
+"""
+import logging, os, pickle, sqlite3, tempfile, time
+from typing import Callable, Iterable, List, Optional, Tuple
+
+import hnswlib
+import numpy as np
+
+from ingest import bump_version
+
+INDEX_FILE = 'index.bin'
+EMBEDDINGS_FILE = 'embeddings.npy'
+PICKLE_INDEX_FILE = 'index.pkl'  # pre-native format, see convert_pickle
+MODEL_ID = 'google/siglip-base-patch16-224'
+
+# hnswlib parameters: cosine space, ef_construction=200, M=16, ef=50 at query time
+EF_CONSTRUCTION, M, EF = 200, 16, 50
+# grow capacity in steps so daily updates don't resize (and reallocate) every time
+GROWTH = 1.25
+COPY_ROWS = 65536
+
+
+def _replace_atomically(path: str, write: Callable[[str], None]):
+    # write next to the target and rename over it, so readers never see a half-written file
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix='.' + os.path.basename(path) + '-')
+    os.close(fd)
+    try:
+        write(tmp)
+        with open(tmp, 'rb') as f:
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+
+class EmbeddingStore:
+    """float32 (or float16) .npy of shape (capacity, dim) where row i holds the vector of paper i.
+
+    The file is never changed in place: every write copies it with the new rows into a temp file
+    and renames that over it, so a process that has it mapped (the app) keeps reading the old
+    vectors, whole, and one that opens it afterwards sees all of the new ones. That costs a full
+    copy per write (and twice the file's size on disk while it runs), so callers batch their rows.
+    """
+
+    def __init__(self, path: str = EMBEDDINGS_FILE):
+        self.path = path
+        self.vectors = np.load(path, mmap_mode='r') if os.path.exists(path) else None
+
+    @property
+    def dim(self) -> Optional[int]:
+        return None if self.vectors is None else self.vectors.shape[1]
+
+    def _rewrite(self, dim: int, capacity: int, dtype, updates: Iterable[Tuple[List[int], np.ndarray]], keep: bool = True):
+        old = self.vectors if keep else None
+        def write(tmp):
+            new = np.lib.format.open_memmap(tmp, mode='w+', dtype=dtype, shape=(capacity, dim))
+            if old is not None:
+                for i in range(0, len(old), COPY_ROWS):
+                    rows = old[i:i + COPY_ROWS]
+                    new[i:i + len(rows)] = rows
+            for ids, vectors in updates:
+                new[ids] = np.asarray(vectors).astype(dtype, copy=False)
+            new.flush()
+        _replace_atomically(self.path, write)
+        self.vectors = np.load(self.path, mmap_mode='r')
+
+    def create(self, dim: int, capacity: int, dtype=np.float32, rows: Iterable[Tuple[List[int], np.ndarray]] = ()):
+        """Replace the file with a zeroed one holding just `rows`, (ids, vectors) chunks."""
+        self._rewrite(dim, capacity, dtype, rows, keep=False)
+
+    def write(self, ids: List[int], vectors: Optional[np.ndarray], cleared: List[int] = ()):
+        """Set the rows of `ids` to `vectors` and zero the rows of `cleared`, growing the file if needed."""
+        cleared = [i for i in cleared if i < len(self.vectors)]
+        if not ids and not cleared:
+            return
+        capacity = len(self.vectors)
+        if ids and max(ids) + 1 > capacity:
+            # rows are appended past the end far more often than ids are rewritten, so leave headroom
+            capacity = max(max(ids) + 1, int(capacity * GROWTH))
+        updates = [(cleared, 0)] if cleared else []
+        if ids:
+            updates.append((ids, vectors))
+        self._rewrite(self.dim, capacity, self.vectors.dtype, updates)
+
+
+def load_index(path: str = INDEX_FILE, dim: Optional[int] = None) -> Optional[hnswlib.Index]:
+    if dim is None or not os.path.exists(path):
+        return None
+    index = hnswlib.Index(space='cosine', dim=dim)
+    index.load_index(path)
+    index.set_ef(EF)  # not part of the saved file
+    return index
+
+
+def save_index(index: hnswlib.Index, path: str = INDEX_FILE):
+    _replace_atomically(path, index.save_index)
+
+
+def new_index(dim: int, max_elements: int) -> hnswlib.Index:
+    index = hnswlib.Index(space='cosine', dim=dim)
+    index.init_index(max_elements=max(max_elements, 1), ef_construction=EF_CONSTRUCTION, M=M)
+    index.set_ef(EF)
+    return index
+
+
+def pending_changes(db: sqlite3.Connection, model_id: str) -> Tuple[List[Tuple[int, str, str]], List[int]]:
+    """Papers that need (re-)embedding as (id, summary, updated), and ids of papers that were removed."""
+    to_embed = db.execute('''
+        SELECT p.id, p.summary, p.updated FROM papers p
+        LEFT JOIN paper_embeddings e ON e.paper_id = p.id
+        WHERE e.paper_id IS NULL OR e.updated <> p.updated OR e.model <> ?
+    ''', (model_id,)).fetchall()
+    removed = [row[0] for row in db.execute('''
+        SELECT e.paper_id FROM paper_embeddings e
+        LEFT JOIN papers p ON p.id = e.paper_id
+        WHERE p.id IS NULL
+    ''')]
+    return to_embed, removed
+
+
+def record(db: sqlite3.Connection, model_id: str, embedded: List[Tuple[int, str, str]], removed: List[int]):
+    with db:
+        db.executemany('INSERT OR REPLACE INTO paper_embeddings (paper_id, model, updated) VALUES (?, ?, ?)',
+                       [(paper_id, model_id, updated) for paper_id, _, updated in embedded])
+        db.executemany('DELETE FROM paper_embeddings WHERE paper_id = ?', [(paper_id,) for paper_id in removed])
+        bump_version(db, 'embeddings_version')  # live kNN results in the app may have changed
+
+
+def add_vectors(index: hnswlib.Index, vectors: np.ndarray, ids: List[int]) -> hnswlib.Index:
+    needed = index.get_current_count() + len(ids)
+    if needed > index.get_max_elements():
+        index.resize_index(max(needed, int(index.get_max_elements() * GROWTH)))
+    index.add_items(vectors, ids)
+    return index
+
+
+def update_index(db_file: str, embed: Callable[[List[str]], np.ndarray], model_id: str = MODEL_ID,
+                 index_file: str = INDEX_FILE, embeddings_file: str = EMBEDDINGS_FILE,
+                 full: bool = False, dtype=np.float32) -> dict:
+    """Bring `index_file` and `embeddings_file` up to date with the papers table; `embed` maps abstracts to normalized vectors.
+
+    Returns the number of papers embedded/removed and the time spent in each step.
+    """
+    timings = {}
+    db = sqlite3.connect(db_file)
+
+    start = time.monotonic()
+    store = EmbeddingStore(embeddings_file)
+    index = None if full else load_index(index_file, store.dim)
+    if index is None:
+        db.execute('DELETE FROM paper_embeddings')  # uncommitted until `record`, so a failed full run changes nothing
+    timings['load'] = time.monotonic() - start
+
+    start = time.monotonic()
+    to_embed, removed = pending_changes(db, model_id)
+    timings['diff'] = time.monotonic() - start
+    logging.info(f"{len(to_embed)} papers to embed, {len(removed)} to remove")
+    if not to_embed and not removed and index is not None:
+        db.close()
+        return {'embedded': 0, 'removed': 0, **timings}
+
+    start = time.monotonic()
+    vectors = embed([summary for _, summary, _ in to_embed]) if to_embed else None
+    timings['embed'] = time.monotonic() - start
+
+    start = time.monotonic()
+    ids = [paper_id for paper_id, _, _ in to_embed]
+    rebuild = index is None
+    if rebuild:
+        index = new_index(vectors.shape[1] if vectors is not None else 768, len(to_embed))
+        removed = []
+    elif vectors is not None and vectors.shape[1] != index.dim:
+        raise ValueError(f"index has dim {index.dim} but {model_id} embeds to {vectors.shape[1]}; rebuild with --full")
+    if vectors is not None:
+        add_vectors(index, vectors, ids)
+    for paper_id in removed:
+        try:
+            index.mark_deleted(paper_id)
+        except RuntimeError:
+            pass  # already deleted, or never made it into the index
+    timings['index'] = time.monotonic() - start
+
+    start = time.monotonic()
+    if rebuild:
+        store.create(index.dim, int((max(ids, default=0) + 1) * GROWTH), dtype=dtype, rows=[(ids, vectors)] if ids else [])
+    else:
+        store.write(ids, vectors, cleared=removed)
+    save_index(index, index_file)
+    record(db, model_id, to_embed, removed)
+    timings['save'] = time.monotonic() - start
+    db.close()
+    return {'embedded': len(to_embed), 'removed': len(removed), **timings}
+
+
+def convert_pickle(db_file: str, pickle_file: str = PICKLE_INDEX_FILE, model_id: str = MODEL_ID,
+                   index_file: str = INDEX_FILE, embeddings_file: str = EMBEDDINGS_FILE, dtype=np.float32) -> int:
+    """Turn a pickled index from before the native format into index.bin + embeddings.npy without re-embedding.
+
+    Every label in it is recorded in paper_embeddings as embedded with `model_id` at the paper's
+    current version, so the next incremental run only picks up what's actually new.
+    """
+    with open(pickle_file, 'rb') as f:
+        index = pickle.load(f)
+    ids = [int(i) for i in index.get_ids_list()]
+    # the cosine space stores normalized vectors, so these are already unit length
+    rows = ((ids[i:i + COPY_ROWS], np.asarray(index.get_items(ids[i:i + COPY_ROWS]), dtype=np.float32))
+            for i in range(0, len(ids), COPY_ROWS))
+    EmbeddingStore(embeddings_file).create(index.dim, int((max(ids, default=0) + 1) * GROWTH), dtype=dtype, rows=rows)
+    save_index(index, index_file)
+
+    db = sqlite3.connect(db_file)
+    with db:
+        db.executemany('''
+            INSERT OR IGNORE INTO paper_embeddings (paper_id, model, updated)
+            SELECT id, ?, updated FROM papers WHERE id = ?
+        ''', [(model_id, paper_id) for paper_id in ids])
+    db.close()
+    return len(ids)
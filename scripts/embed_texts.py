@@ -1,86 +1,49 @@
 import torch
-from transformers import AutoProcessor, AutoModel
-from typing import List
 import numpy as np
-import hnswlib
-import pickle
-import sqlite3
-from tqdm import tqdm
-import time
+import argparse
+import os
+import sys
 
-def get_embeddings(abstracts: List[str], device: str = 'cpu') -> np.ndarray:
-    """
-    Generate normalized embeddings for a list of text abstracts using SigLIP
-    
-    Args:
-        abstracts: List of text paragraphs to embed
-        
-    Returns:
-        Numpy array of shape (num_abstracts, embedding_dim) with L2-normalized embeddings
-    """
-    embeddings = []
-    
-    batch_size = 1024  # You can adjust this based on your GPU memory
-    for i in tqdm(range(0, len(abstracts), batch_size), desc="Processing batches"):
-        batch_abstracts = abstracts[i:i + batch_size]
-        
-        # Process text (tokenization, padding, truncation)
-        inputs = processor(
-            text=batch_abstracts,
-            return_tensors="pt",
-            padding=True,
-            truncation=True
-        ).to(device)
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
 
-        with torch.no_grad():
-            text_embeds = model.get_text_features(**inputs)
-            
-            # Normalize embeddings for cosine similarity
-            text_embeds = text_embeds / text_embeds.norm(p=2, dim=-1, keepdim=True)
-            embeddings.append(text_embeds.cpu().numpy())  # Append directly to embeddings
-    return np.vstack(embeddings)
-
-
-def create_index(data: np.ndarray, ids: List[int]):
-    num_elements, dim = data.shape
-
-    # Declaring index
-    p = hnswlib.Index(space = 'cosine', dim = dim) # possible options are l2, cosine or ip
-
-    # Initializing index - the maximum number of elements should be known beforehand
-    p.init_index(max_elements = num_elements, ef_construction = 200, M = 16)
-
-    # Element insertion (can be called several times):
-    print(f"Adding {len(ids)} items to index")
-    p.add_items(data, ids)
-
-    # Controlling the recall by setting ef:
-    p.set_ef(50) # ef should always be > k
-
-    # Index objects support pickling
-    with open('index.pkl', 'wb') as f:
-        pickle.dump(p, f)
+from embed_engine import MAX_BATCH, THREADS_PER_WORKER, TOKEN_BUDGET, EmbeddingEngine
+from embed_index import EMBEDDINGS_FILE, INDEX_FILE, MODEL_ID, PICKLE_INDEX_FILE, convert_pickle, update_index
+import metrics
 
 # Example usage
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--db', default='papers.db')
+    parser.add_argument('--full', action='store_true', help='re-embed every paper and rebuild the index from scratch')
+    parser.add_argument('--from-pickle', action='store_true', help=f'convert an existing {PICKLE_INDEX_FILE} to the native format first (no re-embedding)')
+    parser.add_argument('--float16', action='store_true', help='store embeddings.npy as float16 (half the disk/page cache, only used on full rebuilds)')
+    parser.add_argument('--token-budget', type=int, default=TOKEN_BUDGET, help='padded tokens per batch (raise it on a GPU)')
+    parser.add_argument('--max-batch', type=int, default=MAX_BATCH)
+    parser.add_argument('--threads', type=int, default=THREADS_PER_WORKER, help='torch threads per CPU worker')
+    parser.add_argument('--workers', type=int, default=None, help='CPU worker processes (default: cores / threads; ignored on GPU)')
+    parser.add_argument('--metrics-json', default='embed_metrics.json', help='where to write the run\'s metrics summary')
+    args = parser.parse_args()
+
     device = 'cuda' if torch.cuda.is_available() else 'cpu'
     print(f"CUDA available: {torch.cuda.is_available()}, device: {device}")
-    
-    # Load model and processor
-    model_id = "google/siglip-base-patch16-224"  # You can choose different sizes
-    processor = AutoProcessor.from_pretrained(model_id)
-    model = AutoModel.from_pretrained(model_id).to(device)  # Move model to GPU
-
-    conn = sqlite3.connect('papers.db')
-    cursor = conn.cursor()
-    cursor.execute("SELECT id, summary FROM papers")
-    abstracts = cursor.fetchall()
-
-    # time embding generation
-    start_time = time.monotonic()
-    embeddings = get_embeddings([summary for _, summary in abstracts], device)
-    end_time = time.monotonic()
-    print(f"Embedding generation time: {end_time - start_time} seconds")
-
-    create_index(embeddings, [id for id, _ in abstracts])
 
+    model_id = MODEL_ID  # You can choose different sizes; changing it re-embeds everything on the next run
+    workers = 0 if device == 'cuda' else args.workers or max(1, (os.cpu_count() or 1) // args.threads)
+    engine = EmbeddingEngine('siglip', {'model_id': model_id, 'device': device}, workers=workers, threads=args.threads,
+                             token_budget=args.token_budget, max_batch=args.max_batch, out_dir=os.path.dirname(os.path.abspath(EMBEDDINGS_FILE)))
+
+    # only embed papers that are new or changed since the last run, unless --full
+    if args.from_pickle:
+        print(f"Converted {convert_pickle(args.db, model_id=model_id)} vectors from {PICKLE_INDEX_FILE}")
+    with engine:
+        stats = update_index(args.db, engine.embed, model_id=model_id, full=args.full,
+                             dtype=np.float16 if args.float16 else np.float32)
+    print(f"Embedded {stats['embedded']} papers, removed {stats['removed']}; "
+          + ", ".join(f"{step} {stats[step]:.1f}s" for step in ('load', 'diff', 'embed', 'index', 'save') if step in stats))
+    metrics.EMBEDDED.inc(stats['embedded'], result='embedded')
+    metrics.EMBEDDED.inc(stats['removed'], result='removed')
+    for step in ('load', 'diff', 'embed', 'index', 'save'):
+        if step in stats:
+            metrics.EMBED_STEP_SECONDS.observe(stats[step], step=step)
+    metrics.write_summary(args.metrics_json, script='embed_texts', model=model_id, workers=workers, full=args.full)
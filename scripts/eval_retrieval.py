@@ -0,0 +1,114 @@
+"""
+Offline evaluation of the retrieval methods in retrieval.py (bm25, vector, rrf, weighted).
+
+Uses a fixed known-item query set: each query is a paper's title and the paper itself is the
+relevant result. The set is sampled once (seeded) and saved to --queries, so later runs and
+other commits are scored on exactly the same queries. Reports recall@k, nDCG@k, MRR and
+per-query latency (query encoding is timed separately since it's shared by every method but bm25).
+
+--category restricts every query to its paper's primary category and scores each method twice:
+'post' fuses the unfiltered pools and filters the fused list (how the app used to filter),
+'pushed' filters inside the pools (hybrid_search's `category`).
+
+    python scripts/eval_retrieval.py --db papers.db --queries eval_queries.json --n 500
+    python scripts/eval_retrieval.py --db papers.db --category
+"""
+import argparse, json, os, random, sqlite3, sys, time
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from embed_index import EMBEDDINGS_FILE, INDEX_FILE, load_index
+from encoder import BACKENDS
+from retrieval import POOL, filter_category, hybrid_search
+
+METHODS = ('bm25', 'vector', 'rrf', 'weighted')
+
+
+def load_queries(path: str, db: sqlite3.Connection, n: int, seed: int = 0) -> list:
+    if os.path.exists(path):
+        with open(path) as f:
+            queries = json.load(f)
+        for q in queries:  # sets written before queries carried their category
+            if 'category' not in q:
+                q['category'] = db.execute('SELECT primary_category FROM papers WHERE id = ?', (q['relevant'][0],)).fetchone()[0]
+        return queries
+    ids = [row[0] for row in db.execute('SELECT id FROM papers ORDER BY id')]
+    sample = sorted(random.Random(seed).sample(ids, min(n, len(ids))))
+    queries = [{'query': ' '.join(title.split()), 'relevant': [paper_id], 'category': category} for paper_id, title, category in
+               (db.execute('SELECT id, title, primary_category FROM papers WHERE id = ?', (i,)).fetchone() for i in sample)]
+    with open(path, 'w') as f:
+        json.dump(queries, f, indent=1)
+    print(f"wrote {len(queries)} queries to {path}")
+    return queries
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default='papers.db')
+    parser.add_argument('--index', default=INDEX_FILE)
+    parser.add_argument('--embeddings', default=EMBEDDINGS_FILE)
+    parser.add_argument('--queries', default='eval_queries.json', help='query set; created from the db if missing')
+    parser.add_argument('--n', type=int, default=500, help='queries to sample when creating the set')
+    parser.add_argument('--encoder', default='siglip', choices=sorted(BACKENDS))
+    parser.add_argument('--pool', type=int, default=POOL)
+    parser.add_argument('--alpha', type=float, default=0.5)
+    parser.add_argument('--k', type=int, nargs='+', default=[1, 10, 50])
+    parser.add_argument('--category', action='store_true', help="filter each query to its paper's primary category")
+    parser.add_argument('--json', help='also write the results here')
+    args = parser.parse_args()
+
+    db = sqlite3.connect(args.db)
+    queries = load_queries(args.queries, db, args.n)
+    index = load_index(args.index, np.load(args.embeddings, mmap_mode='r').shape[1])
+
+    backend = BACKENDS[args.encoder]()
+    backend.load()
+    start = time.perf_counter()
+    vectors = np.vstack([backend.encode([q['query'] for q in queries[i:i + 64]]) for i in range(0, len(queries), 64)])
+    encode_ms = 1000 * (time.perf_counter() - start) / len(queries)
+
+    def post_filtered(q, vec, method):
+        ranked = [paper_id for paper_id, _ in hybrid_search(db, index, q['query'], vec, method, args.alpha, args.pool)]
+        return filter_category(db, ranked, q['category'])
+
+    def pushed(q, vec, method):
+        return [paper_id for paper_id, _ in hybrid_search(db, index, q['query'], vec, method, args.alpha, args.pool,
+                                                          q['category'] if args.category else None)]
+
+    runs = [(method, pushed) for method in METHODS]
+    if args.category:
+        runs = [(f'{method} {name}', search) for method in METHODS for name, search in (('post', post_filtered), ('pushed', pushed))]
+
+    results = {'queries': len(queries), 'pool': args.pool, 'alpha': args.alpha, 'category': args.category,
+               'encode_ms_per_query': encode_ms, 'methods': {}}
+    print(f"{len(queries)} queries, pool {args.pool}, encoding {encode_ms:.1f} ms/query")
+    print(f"{'method':>15} " + ' '.join(f"{'R@' + str(k):>6}" for k in args.k) + ' ' + ' '.join(f"{'nDCG@' + str(k):>7}" for k in args.k)
+          + f" {'MRR':>6} {'p50 ms':>7} {'p99 ms':>7}")
+    for name, search in runs:
+        method = name.split()[0]
+        hits, gains, reciprocal, latencies = {k: 0 for k in args.k}, {k: 0.0 for k in args.k}, 0.0, []
+        for q, vec in zip(queries, vectors):
+            start = time.perf_counter()
+            ranked = search(q, vec, method)
+            latencies.append(time.perf_counter() - start)
+            positions = sorted(ranked.index(r) for r in q['relevant'] if r in ranked)
+            best = positions[0] if positions else None
+            # ideal DCG: every relevant paper at the top
+            ideal = {k: sum(1 / np.log2(i + 2) for i in range(min(k, len(q['relevant'])))) for k in args.k}
+            for k in args.k:
+                hits[k] += best is not None and best < k
+                gains[k] += sum(1 / np.log2(p + 2) for p in positions if p < k) / ideal[k]
+            reciprocal += 1 / (best + 1) if best is not None else 0
+        row = {f'recall@{k}': hits[k] / len(queries) for k in args.k}
+        row.update({f'ndcg@{k}': gains[k] / len(queries) for k in args.k})
+        row.update(mrr=reciprocal / len(queries), p50_ms=1000 * np.percentile(latencies, 50), p99_ms=1000 * np.percentile(latencies, 99))
+        results['methods'][name] = row
+        print(f"{name:>15} " + ' '.join(f"{row[f'recall@{k}']:>6.3f}" for k in args.k) + ' ' + ' '.join(f"{row[f'ndcg@{k}']:>7.3f}" for k in args.k)
+              + f" {row['mrr']:>6.3f} {row['p50_ms']:>7.2f} {row['p99_ms']:>7.2f}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=1)
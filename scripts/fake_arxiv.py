@@ -0,0 +1,146 @@
+"""
+Local stand-in for the arXiv export API, serving deterministic synthetic Atom feeds.
+
+Papers exist at fixed intervals (`papers_per_day`) starting from 2020-01-01, each with a
+category picked from CATEGORIES, so the same query always returns the same page. Handy for
+exercising harvest.py end to end (including crashes/resume) without hitting arxiv.org:
+
+    python scripts/fake_arxiv.py --port 8081 --papers-per-day 200
+    python scripts/harvest.py --base-url "http://127.0.0.1:8081/api/query?search_query=" ...
+"""
+import argparse, hashlib, random, re, threading, time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional
+from urllib.parse import unquote
+from xml.sax.saxutils import escape
+
+CATEGORIES = ['cs.CL', 'cs.AI', 'cs.MA', 'cs.CV', 'cs.LG', 'cs.RO', 'cs.SY', 'cs.SI', 'cs.HC', 'cs.IR']
+EPOCH = datetime(2020, 1, 1)
+WORDS = ('model learning neural graph agent language vision robot policy transformer attention '
+         'retrieval benchmark dataset training inference reasoning control network embedding '
+         'diffusion reward latent sparse federated causal multimodal planning optimization').split()
+
+FEED_HEADER = ('<?xml version="1.0" encoding="UTF-8"?>\n'
+               '<feed xmlns="http://www.w3.org/2005/Atom" '
+               'xmlns:opensearch="http://a9.com/-/spec/opensearch/1.1/" '
+               'xmlns:arxiv="http://arxiv.org/schemas/atom">\n'
+               '  <title type="html">ArXiv Query</title>\n'
+               '  <opensearch:totalResults>{total}</opensearch:totalResults>\n'
+               '  <opensearch:startIndex>{start}</opensearch:startIndex>\n'
+               '  <opensearch:itemsPerPage>{per_page}</opensearch:itemsPerPage>\n')
+
+
+def paper_category(seq: int) -> str:
+    return CATEGORIES[int(hashlib.md5(str(seq).encode()).hexdigest(), 16) % len(CATEGORIES)]
+
+
+def build_entry(seq: int, published: datetime, summary_words: int = 150) -> str:
+    rng = random.Random(seq)
+    category = paper_category(seq)
+    others = rng.sample([c for c in CATEGORIES if c != category], rng.randint(0, 2))
+    stamp = published.strftime('%Y-%m-%dT%H:%M:%SZ')
+    arxiv_id = f"{published:%y%m}.{seq % 100000:05d}"
+    title = ' '.join(rng.choice(WORDS) for _ in range(8)).capitalize()
+    summary = ' '.join(rng.choice(WORDS) for _ in range(summary_words))
+    authors = ''.join(f"    <author><name>Author {rng.randint(0, 99999)}</name></author>\n" for _ in range(rng.randint(1, 6)))
+    categories = ''.join(f'    <category term="{c}" scheme="http://arxiv.org/schemas/atom"/>\n' for c in [category] + others)
+    return (f"  <entry>\n"
+            f"    <id>http://arxiv.org/abs/{arxiv_id}v1</id>\n"
+            f"    <updated>{stamp}</updated>\n"
+            f"    <published>{stamp}</published>\n"
+            f"    <title>{escape(title)}</title>\n"
+            f"    <summary>{escape(summary)}</summary>\n"
+            f"{authors}"
+            f'    <arxiv:primary_category term="{category}" scheme="http://arxiv.org/schemas/atom"/>\n'
+            f"{categories}"
+            f'    <link href="http://arxiv.org/abs/{arxiv_id}v1" rel="alternate" type="text/html"/>\n'
+            f'    <link title="pdf" href="http://arxiv.org/pdf/{arxiv_id}v1" rel="related" type="application/pdf"/>\n'
+            f"  </entry>\n")
+
+
+def build_feed(entries: List[str], total: int, start: int = 0) -> str:
+    return FEED_HEADER.format(total=total, start=start, per_page=len(entries)) + ''.join(entries) + '</feed>\n'
+
+
+def window_papers(start: datetime, end: datetime, categories: List[str], papers_per_day: int) -> List[int]:
+    step = 86400 / papers_per_day
+    first = max(0, int((start - EPOCH).total_seconds() // step))
+    last = int((end - EPOCH).total_seconds() // step)
+    seqs = [s for s in range(first, last + 1) if start <= EPOCH + timedelta(seconds=s * step) <= end]
+    return [s for s in seqs if paper_category(s) in categories]
+
+
+class FakeArxivHandler(BaseHTTPRequestHandler):
+    papers_per_day = 100
+    fail_rate = 0.0
+    latency = 0.0
+
+    def do_GET(self):
+        if self.latency:
+            time.sleep(self.latency)
+        if random.random() < self.fail_rate:
+            # arXiv fails in both of these ways: 503s and 200s with an empty feed
+            if random.random() < 0.5:
+                self.send_error(503)
+            else:
+                self._send(build_feed([], total=0))
+            return
+
+        # the harvester builds the query by hand ('+' for spaces, unescaped brackets), so parse it the same way
+        query = unquote(self.path.split('?', 1)[-1])
+        params = dict(p.split('=', 1) for p in query.split('&') if '=' in p)
+        dates = re.search(r'submittedDate:\[(\d{14})\+TO\+(\d{14})\]', params.get('search_query', ''))
+        if not dates:
+            self.send_error(400, 'missing submittedDate range')
+            return
+        categories = re.findall(r'cat:([\w.\-]+)', params['search_query']) or CATEGORIES
+        start, end = (datetime.strptime(d, '%Y%m%d%H%M%S') for d in dates.groups())
+        offset, max_results = int(params.get('start', 0)), int(params.get('max_results', 10))
+
+        seqs = window_papers(start, end, categories, self.papers_per_day)
+        step = 86400 / self.papers_per_day
+        page = seqs[offset:offset + max_results]
+        entries = [build_entry(s, EPOCH + timedelta(seconds=int(s * step))) for s in page]
+        self._send(build_feed(entries, total=len(seqs), start=offset))
+
+    def _send(self, body: str):
+        data = body.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/atom+xml; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port: int = 0, papers_per_day: int = 100, fail_rate: float = 0.0, latency: float = 0.0,
+          background: bool = True) -> Optional[ThreadingHTTPServer]:
+    """Start the fake API; port 0 picks a free port (see `server.server_address`)."""
+    handler = type('Handler', (FakeArxivHandler,), {
+        'papers_per_day': papers_per_day, 'fail_rate': fail_rate, 'latency': latency,
+    })
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    if not background:
+        server.serve_forever()
+        return None
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def base_url(server: ThreadingHTTPServer) -> str:
+    host, port = server.server_address[:2]
+    return f"http://{host}:{port}/api/query?search_query="
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--papers-per-day', type=int, default=100)
+    parser.add_argument('--fail-rate', type=float, default=0.0, help='fraction of requests that fail (503 or empty feed)')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds to sleep before answering')
+    args = parser.parse_args()
+    print(f"serving fake arXiv API on http://127.0.0.1:{args.port}/api/query")
+    serve(args.port, args.papers_per_day, args.fail_rate, args.latency, background=False)
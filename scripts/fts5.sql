@@ -6,14 +6,16 @@ CREATE TRIGGER papers_ai AFTER INSERT ON papers BEGIN
   VALUES (new.id, new.summary);
 END;
 
-CREATE TRIGGER papers_au AFTER UPDATE ON papers BEGIN
-  UPDATE papers_summary_fts
-  SET summary = new.summary
-  WHERE rowid = new.id;
+CREATE TRIGGER papers_au AFTER UPDATE OF summary ON papers BEGIN
+  INSERT INTO papers_summary_fts(papers_summary_fts, rowid, summary)
+  VALUES ('delete', old.id, old.summary);
+  INSERT INTO papers_summary_fts(rowid, summary)
+  VALUES (new.id, new.summary);
 END;
 
 CREATE TRIGGER papers_ad AFTER DELETE ON papers BEGIN
-  DELETE FROM papers_summary_fts WHERE rowid = old.id;
+  INSERT INTO papers_summary_fts(papers_summary_fts, rowid, summary)
+  VALUES ('delete', old.id, old.summary);
 END;
 
 INSERT INTO papers_summary_fts(papers_summary_fts)
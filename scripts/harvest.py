@@ -0,0 +1,242 @@
+"""
+Concurrent, resumable arXiv harvester.
+
+The date range is split into fixed windows which are fetched in parallel through one pooled
+requests.Session. All workers share a token bucket so the combined request rate stays under
+arXiv's limit (1 request / 3s by default). Each page is streamed into the writer as it's
+parsed, and progress is checkpointed per page in the `harvest_windows` table of the target
+database, never committed ahead of the papers it fetched, so rerunning the same command after
+a crash skips finished windows and resumes partially fetched ones from their last committed
+page. Windows ending within the last
+`recent_days` are fetched again on every run, done or not: arXiv announces papers days after
+their submittedDate, so a recent window can still grow.
+
+    python scripts/harvest.py --start 2021-01-01 --end 2025-01-01 --db papers.db
+"""
+import argparse, logging, os, sys, threading, time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from typing import List, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+if __name__ == '__main__':  # importers put the repo root on sys.path themselves
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from atom_stream import stream_response
+from ingest import PaperWriter
+from init_db import ARXIV_EXPORT_URL, format_arxiv_query
+import metrics
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(threadName)s %(levelname)s %(message)s')
+
+RECENT_DAYS = 3  # arXiv's announcement lag: windows ending this recently are never final
+STREAM_BATCH = 100  # papers handed to the writer at a time while a page is still being parsed
+
+CATEGORIES = ['cs.CL', 'cs.AI', 'cs.MA', 'cs.CV', 'cs.LG', 'cs.RO', 'cs.SY', 'cs.SI', 'cs.HC', 'cs.IR']
+
+CHECKPOINT_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS harvest_windows (
+    categories TEXT NOT NULL,
+    window_start TEXT NOT NULL,
+    window_end TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending', -- pending | done | failed
+    next_start INTEGER NOT NULL DEFAULT 0,  -- offset of the next page to fetch
+    total_results INTEGER,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (categories, window_start, window_end)
+);
+'''
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, bursts of up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        # reserve a token under the lock (letting the balance go negative) and sleep outside it,
+        # so waiting threads are served in the order they asked
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+            self.last = now
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if wait > 0:
+            time.sleep(wait)
+
+
+def date_windows(start: datetime, end: datetime, window_days: int) -> List[Tuple[str, str]]:
+    # arXiv's submittedDate range is inclusive on both ends, so each window stops a second short of the next
+    windows = []
+    while start < end:
+        stop = min(start + timedelta(days=window_days), end)
+        windows.append((start.strftime('%Y%m%d%H%M%S'), (stop - timedelta(seconds=1)).strftime('%Y%m%d%H%M%S')))
+        start = stop
+    return windows
+
+
+def make_session(pool_size: int) -> requests.Session:
+    session = requests.Session()
+    retry = Retry(total=5, backoff_factor=2, status_forcelist=[429, 500, 502, 503, 504], allowed_methods=['GET'])
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+class Harvester:
+    def __init__(self, db_file: str, categories: List[str], base_url: str = ARXIV_EXPORT_URL,
+                 workers: int = 4, rate: float = 1 / 3, page_size: int = 500, page_retries: int = 3,
+                 timeout: float = 120, batch_size: int = 5000, recent_days: float = RECENT_DAYS):
+        self.categories = categories
+        self.category_key = ','.join(categories)
+        self.base_url = base_url
+        self.workers = workers
+        self.page_size = page_size
+        self.page_retries = page_retries
+        self.timeout = timeout
+        self.recent_days = recent_days
+        self.bucket = TokenBucket(rate)
+        self.session = make_session(workers)
+        # papers and checkpoints from all workers go through one writer, which commits them together
+        self.writer = PaperWriter(db_file, batch_size=batch_size)
+        self.db, self.db_lock = self.writer.db, self.writer.lock
+        self.db.executescript(CHECKPOINT_SCHEMA)
+
+    def pending_windows(self, windows: List[Tuple[str, str]]) -> List[Tuple[str, str, int]]:
+        """Register `windows` in the checkpoint table and return the unfinished ones with their resume offset."""
+        with self.db_lock, self.db:
+            self.db.executemany('INSERT OR IGNORE INTO harvest_windows (categories, window_start, window_end) VALUES (?, ?, ?)',
+                                [(self.category_key, s, e) for s, e in windows])
+            state = {(s, e): (status, next_start) for s, e, status, next_start in self.db.execute(
+                'SELECT window_start, window_end, status, next_start FROM harvest_windows WHERE categories = ?',
+                (self.category_key,))}
+        recent = (datetime.now() - timedelta(days=self.recent_days)).strftime('%Y%m%d%H%M%S')
+        # a recent window is re-fetched from the top: late announcements can land anywhere in it
+        return [(s, e, 0 if e >= recent else state[s, e][1]) for s, e in windows
+                if e >= recent or state[s, e][0] != 'done']
+
+    def fetch_page(self, query: str) -> Tuple[int, int]:
+        """Stream one page into the writer as it's parsed; returns (totalResults or -1, papers read).
+
+        The page's checkpoint is added after its papers (see save_page), so it's never committed
+        ahead of them. Papers from a page that breaks off halfway are simply upserted again when
+        it's retried.
+        """
+        self.bucket.acquire()
+        count, batch = 0, []
+        with self.session.get(self.base_url + query, timeout=self.timeout, stream=True) as response:
+            response.raise_for_status()
+            feed = stream_response(response)
+            for paper in feed:
+                batch.append(paper)
+                if len(batch) >= STREAM_BATCH:
+                    self.writer.add(batch)
+                    count, batch = count + len(batch), []
+            self.writer.add(batch)
+            count += len(batch)
+        metrics.PAGES_FETCHED.inc()
+        return (feed.total_results if feed.total_results is not None else -1), count
+
+    def save_page(self, window: Tuple[str, str], next_start: int, total: int, status: str = 'pending'):
+        checkpoint = ('''
+            UPDATE harvest_windows SET next_start = ?, total_results = ?, status = ?, updated_at = CURRENT_TIMESTAMP
+            WHERE categories = ? AND window_start = ? AND window_end = ?
+        ''', (next_start, total, status, self.category_key, *window))
+        self.writer.add([], extra=[checkpoint])
+
+    def harvest_window(self, window_start: str, window_end: str, start: int = 0) -> int:
+        window = (window_start, window_end)
+        total, fetched = None, 0
+        while total is None or start < total:
+            query = format_arxiv_query(self.categories, window_start, window_end, start=start, max_results=self.page_size)
+            page_total, read, empty = None, 0, 0
+            for attempt in range(1, self.page_retries + 1):
+                try:
+                    page_total, read = self.fetch_page(query)
+                except (requests.RequestException, ET.ParseError) as e:
+                    metrics.PAGE_RETRIES.inc()
+                    logging.warning(f"{window_start}-{window_end} start={start}: {e} (attempt {attempt}/{self.page_retries})")
+                    continue
+                if read:
+                    break
+                metrics.PAGE_RETRIES.inc()
+                empty += page_total == 0
+                # arXiv sometimes answers 200 with an empty feed, so an empty page is retried like an error
+                logging.warning(f"{window_start}-{window_end} start={start}: empty page (attempt {attempt}/{self.page_retries})")
+
+            if not read:
+                if empty == self.page_retries and start == 0:
+                    # every attempt reported no results at all, so the window is genuinely empty
+                    self.save_page(window, 0, 0, status='done')
+                    return fetched
+                logging.error(f"Failed to retrieve papers for query: {query}")
+                metrics.FAILED_QUERIES.inc()
+                with open('failed_queries.txt', 'a') as failed_file:
+                    failed_file.write(f"Failed query: {query}\n")
+                self.save_page(window, start, total if total is not None else -1, status='failed')
+                return fetched
+
+            total = page_total
+            start += self.page_size
+            fetched += read
+            self.save_page(window, start, total, status='done' if start >= total else 'pending')
+            logging.info(f"{window_start}-{window_end}: {min(start, total)}/{total}")
+        return fetched
+
+    def run(self, start: datetime, end: datetime, window_days: int = 7) -> int:
+        windows = self.pending_windows(date_windows(start, end, window_days))
+        logging.info(f"{len(windows)} windows left to harvest for {self.category_key}")
+        fetched = 0
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='harvest') as pool:
+            futures = {pool.submit(self.harvest_window, s, e, n): (s, e) for s, e, n in windows}
+            for future in as_completed(futures):
+                try:
+                    fetched += future.result()
+                except Exception as e:
+                    logging.error(f"window {futures[future]} crashed: {e}")
+        self.writer.flush()
+        failed = self.db.execute("SELECT COUNT(*) FROM harvest_windows WHERE categories = ? AND status = 'failed'",
+                                 (self.category_key,)).fetchone()[0]
+        logging.info(f"fetched {fetched} papers ({self.writer.inserted} new, {self.writer.updated} updated); {failed} windows failed and will be retried on the next run")
+        return fetched
+
+    def close(self):
+        self.session.close()
+        self.writer.close()
+
+
+if __name__ == '__main__':
+    today = datetime.now().date()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default='papers.db')
+    parser.add_argument('--start', default=(today - timedelta(days=3)).strftime('%Y-%m-%d'), help='YYYY-MM-DD, inclusive')
+    parser.add_argument('--end', default=(today + timedelta(days=1)).strftime('%Y-%m-%d'), help='YYYY-MM-DD, exclusive')
+    parser.add_argument('--categories', default=','.join(CATEGORIES))
+    parser.add_argument('--window-days', type=int, default=7)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--rate', type=float, default=1 / 3, help='requests per second across all workers')
+    parser.add_argument('--page-size', type=int, default=500)
+    parser.add_argument('--base-url', default=ARXIV_EXPORT_URL)
+    parser.add_argument('--batch-size', type=int, default=5000, help='papers per write transaction')
+    parser.add_argument('--recent-days', type=float, default=RECENT_DAYS, help='windows ending within this many days are re-fetched every run')
+    parser.add_argument('--metrics-json', default='harvest_metrics.json', help='where to write the run\'s metrics summary')
+    args = parser.parse_args()
+
+    harvester = Harvester(args.db, args.categories.split(','), base_url=args.base_url, workers=args.workers,
+                          rate=args.rate, page_size=args.page_size, batch_size=args.batch_size, recent_days=args.recent_days)
+    try:
+        harvester.run(datetime.strptime(args.start, '%Y-%m-%d'), datetime.strptime(args.end, '%Y-%m-%d'), args.window_days)
+    finally:
+        harvester.close()
+        metrics.write_summary(args.metrics_json, script='harvest', start=args.start, end=args.end, categories=args.categories)
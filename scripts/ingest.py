@@ -0,0 +1,132 @@
+"""
+Batched, idempotent writer for scraped papers.
+
+Papers are buffered across pages and written in large transactions with
+`INSERT ... ON CONFLICT(arxiv_id) DO UPDATE`, touching existing rows only when their
+`updated` timestamp moved. Triggers (see fts5.sql / migrations) keep papers_summary_fts
+and paper_categories in sync inside the same transaction. Rows missing required fields are
+logged and skipped instead of failing the whole batch.
+"""
+import logging, sqlite3, threading
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+import metrics
+
+PAPER_COLUMNS = ('title', 'arxiv_id', 'published', 'updated', 'summary',
+                 'author', 'category', 'pdf_link', 'abstract_link', 'arxiv_link', 'primary_category')
+
+UPSERT_SQL = f'''
+    INSERT INTO papers ({', '.join(PAPER_COLUMNS)})
+    VALUES ({', '.join('?' for _ in PAPER_COLUMNS)})
+    ON CONFLICT(arxiv_id) DO UPDATE SET
+        {', '.join(f'{c} = excluded.{c}' for c in PAPER_COLUMNS if c != 'arxiv_id')}
+    WHERE excluded.updated > papers.updated
+'''
+
+INGEST_PRAGMAS = (
+    'PRAGMA journal_mode = WAL',      # readers (the app) keep working while we write
+    'PRAGMA synchronous = NORMAL',    # safe with WAL; only the last transactions can be lost on power failure
+    'PRAGMA cache_size = -262144',    # 256MB page cache
+    'PRAGMA temp_store = MEMORY',
+    'PRAGMA busy_timeout = 30000',
+)
+
+# stay well under SQLITE_MAX_VARIABLE_NUMBER for `IN (...)` lookups
+LOOKUP_CHUNK = 500
+
+
+def bump_version(db: sqlite3.Connection, key: str):
+    """Tell readers (the app's caches) that the corpus changed; call inside the writing transaction."""
+    db.execute('''
+        INSERT INTO corpus_meta (key, value) VALUES (?, 1)
+        ON CONFLICT(key) DO UPDATE SET value = value + 1, updated_at = CURRENT_TIMESTAMP
+    ''', (key,))
+
+
+def connect(db_file: str, check_same_thread: bool = True) -> sqlite3.Connection:
+    db = sqlite3.connect(db_file, check_same_thread=check_same_thread, factory=metrics.connection_factory())
+    for pragma in INGEST_PRAGMAS:
+        db.execute(pragma)
+    return db
+
+
+class PaperWriter:
+    """Buffer paper tuples (as produced by `extract_paper_data`) and upsert them in batches.
+
+    `extra` statements passed to `add` (e.g. a checkpoint update) are run in the same
+    transaction as the papers they came with, so they're only committed once those papers are.
+    Safe to share between threads.
+    """
+
+    def __init__(self, db_file: str, batch_size: int = 5000):
+        self.db = connect(db_file, check_same_thread=False)
+        self.batch_size = batch_size
+        self.lock = threading.RLock()
+        self.buffer: List[tuple] = []
+        self.pending: List[Tuple[str, Sequence]] = []
+        self.inserted = self.updated = self.skipped = 0
+        # counted once; kept up to date from what we write instead of rescanning after every page
+        self.total = self.db.execute('SELECT COUNT(*) FROM papers').fetchone()[0]
+
+    def add(self, papers: Iterable[tuple], extra: Optional[List[Tuple[str, Sequence]]] = None):
+        with self.lock:
+            self.buffer.extend(papers)
+            self.pending.extend(extra or [])
+            if len(self.buffer) >= self.batch_size:
+                self.flush()
+
+    def flush(self):
+        with self.lock:
+            if not self.buffer and not self.pending:
+                return
+            rows = self._validate(self.buffer)
+            with self.db:
+                new, changed = self._classify(rows)
+                self.db.executemany(UPSERT_SQL, new + changed)
+                if new or changed:
+                    bump_version(self.db, 'papers_version')
+                for sql, params in self.pending:
+                    self.db.execute(sql, params)
+            self.inserted += len(new)
+            self.updated += len(changed)
+            self.total += len(new)
+            metrics.ROWS_UPSERTED.inc(len(new), result='inserted')
+            metrics.ROWS_UPSERTED.inc(len(changed), result='updated')
+            metrics.ROWS_UPSERTED.inc(len(rows) - len(new) - len(changed), result='unchanged')
+            self.buffer, self.pending = [], []
+            logging.info(f"upserted {len(new)} new and {len(changed)} updated papers; papers db has {self.total} papers")
+
+    def _validate(self, rows: List[tuple]) -> List[tuple]:
+        # one bad row shouldn't sink the batch: drop rows with missing required fields, and keep only
+        # the latest version of a paper that shows up twice in the buffer
+        latest = {}
+        for row in rows:
+            if len(row) != len(PAPER_COLUMNS) or any(v is None for v in row):
+                self.skipped += 1
+                metrics.ROWS_UPSERTED.inc(result='skipped')
+                logging.error(f"Skipping paper with missing fields: {row[1] if len(row) > 1 else row}")
+                continue
+            if row[1] not in latest or row[3] > latest[row[1]][3]:
+                latest[row[1]] = row
+        return list(latest.values())
+
+    def _classify(self, rows: List[tuple]) -> Tuple[List[tuple], List[tuple]]:
+        # look up what's already stored (indexed on arxiv_id) so unchanged rows aren't written at all
+        stored = {}
+        for i in range(0, len(rows), LOOKUP_CHUNK):
+            ids = [row[1] for row in rows[i:i + LOOKUP_CHUNK]]
+            stored.update(self.db.execute(
+                f"SELECT arxiv_id, updated FROM papers WHERE arxiv_id IN ({','.join('?' * len(ids))})", ids))
+        new = [row for row in rows if row[1] not in stored]
+        changed = [row for row in rows if row[1] in stored and row[3] > stored[row[1]]]
+        return new, changed
+
+    def close(self):
+        self.flush()
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
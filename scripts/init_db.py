@@ -1,8 +1,14 @@
-import sqlite3, sys, logging, requests, time
+import os, sqlite3, sys, logging, requests, time
 import xml.etree.ElementTree as ET
 from datetime import datetime, timedelta
 from typing import List
 
+if __name__ == '__main__':  # importers put the repo root on sys.path themselves
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ingest import PaperWriter
+import metrics
+
 logging.basicConfig(level=logging.INFO)
 
 ARXIV_EXPORT_URL = "https://export.arxiv.org/api/query?search_query="
@@ -34,12 +40,14 @@ def extract_paper_data(entry):
     summary = entry.find('{http://www.w3.org/2005/Atom}summary').text
     authors = ", ".join([author.find('{http://www.w3.org/2005/Atom}name').text for author in entry.findall('{http://www.w3.org/2005/Atom}author')])
     categories = ", ".join([category.get('term') for category in entry.findall('{http://www.w3.org/2005/Atom}category')])
+    primary = entry.find('{http://arxiv.org/schemas/atom}primary_category')
+    primary_category = primary.get('term') if primary is not None else categories.split(", ")[0]
     pdf_url = arxiv_id.replace('abs', 'pdf') if arxiv_id else None
     abstract_url = arxiv_id
     arxiv_url = arxiv_id
 
     return (title, arxiv_id, published, updated, summary, 
-            authors, categories, pdf_url, abstract_url, arxiv_url)
+            authors, categories, pdf_url, abstract_url, arxiv_url, primary_category)
 
 def scrape_arxiv(category: List[str], start_date: str, end_date: str, db_file: str, max_results: int = 100):
     query = format_arxiv_query(
@@ -56,8 +64,7 @@ def scrape_arxiv(category: List[str], start_date: str, end_date: str, db_file: s
     total_results = int(total_results_element.text) if total_results_element is not None else -1
     logging.info(f"total_results: {total_results}")
 
-    db = sqlite3.connect(db_file)
-    cursor = db.cursor()
+    writer = PaperWriter(db_file)
 
     try:
         while start < total_results:
@@ -75,6 +82,7 @@ def scrape_arxiv(category: List[str], start_date: str, end_date: str, db_file: s
             while retries < 3:  # Retry logic for the query
                 response = requests.get(ARXIV_EXPORT_URL + query)
                 root = ET.fromstring(response.text)
+                metrics.PAGES_FETCHED.inc()
 
                 papers_to_insert = []  # Reset the list for each attempt
                 for entry in root.findall('{http://www.w3.org/2005/Atom}entry'):
@@ -84,29 +92,19 @@ def scrape_arxiv(category: List[str], start_date: str, end_date: str, db_file: s
                     break  # Exit the retry loop if papers are found
 
                 retries += 1
+                metrics.PAGE_RETRIES.inc()
                 logging.warning(f"No papers found, retrying the query... (Attempt {retries}/3)")
                 time.sleep(5)  # Wait before retrying
 
             if not papers_to_insert:
                 logging.error(f"Failed to retrieve papers for query: {query}")
+                metrics.FAILED_QUERIES.inc()
                 with open('failed_queries.txt', 'a') as failed_file:
                     failed_file.write(f"Failed query: {query}\n")
                 start += max_results
                 continue  # Go to the next page of the query
 
-            # Insert all papers in one go
-            try:
-                cursor.executemany('''
-                    INSERT INTO papers (
-                        title, arxiv_id, published, updated, summary, 
-                        author, category, pdf_link, abstract_link, arxiv_link
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', papers_to_insert)
-            except Exception as e:
-                logging.error(f"Failed to insert paper data for arxiv_id")
-
-            db.commit()
-            logging.info(f"papers db has {cursor.execute('SELECT COUNT(*) FROM papers').fetchone()[0]} papers")
+            writer.add(papers_to_insert)  # upserted in batches across pages
             
             start += max_results
             if start < total_results:
@@ -122,12 +120,11 @@ def scrape_arxiv(category: List[str], start_date: str, end_date: str, db_file: s
             resume_file.write(f"max_results={max_results}\n")
             resume_file.write(f"total_results={total_results}\n")
     
-    db.close()
+    writer.close()
 
 
-def retry_queries(queries: List[str]):
-    db = sqlite3.connect(db_file)
-    cursor = db.cursor()
+def retry_queries(queries: List[str], db_file: str = 'papers.db'):
+    writer = PaperWriter(db_file)
 
     for query in queries:
         retries = 0
@@ -137,6 +134,7 @@ def retry_queries(queries: List[str]):
             response = requests.get(ARXIV_EXPORT_URL + query)
             
             root = ET.fromstring(response.text)
+            metrics.PAGES_FETCHED.inc()
             for entry in root.findall('{http://www.w3.org/2005/Atom}entry'):
                 paper_data = extract_paper_data(entry)
                 if paper_data:
@@ -146,30 +144,20 @@ def retry_queries(queries: List[str]):
                 break  # Exit the retry loop if papers are found
 
             retries += 1
+            metrics.PAGE_RETRIES.inc()
             logging.warning(f"No papers found, retrying the query... (Attempt {retries}/3)")
             time.sleep(5)  # Wait before retrying
 
         if not papers_to_insert:
             logging.error(f"Failed to retrieve papers for query: {query}")
+            metrics.FAILED_QUERIES.inc()
             with open('failed_queries.txt', 'a') as failed_file:
                 failed_file.write(f"Failed query: {query}\n")
             continue  # Go to the next query
 
-        # Insert all papers in one go
-        try:
-            cursor.executemany('''
-                INSERT INTO papers (
-                    title, arxiv_id, published, updated, summary, 
-                    author, category, pdf_link, abstract_link, arxiv_link
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', papers_to_insert)
-        except Exception as e:
-            logging.error(f"Failed to insert paper data")
-
-        db.commit()
-        logging.info(f"papers db has {cursor.execute('SELECT COUNT(*) FROM papers').fetchone()[0]} papers")
+        writer.add(papers_to_insert)
 
-    db.close()
+    writer.close()
 
 if __name__ == '__main__':
     # TODO wrap this in a nice CLI interface for reuse/reproducibility
@@ -181,18 +169,18 @@ if __name__ == '__main__':
     # end_year = 2026
     cats = ['cs.CL', 'cs.AI', 'cs.MA', 'cs.CV', 'cs.LG', 'cs.RO', 'cs.SY', 'cs.SI', 'cs.HC', 'cs.IR'] 
 
+    # scrape_arxiv fetches one page at a time; the harvester fetches day windows in parallel
+    # and picks up where it left off if a previous run crashed (see harvest.py)
+    from harvest import Harvester
     today = datetime.now().date()
-    start_date = format_date((today - timedelta(days=3)).strftime("%Y-%m-%d"))
-    end_date = format_date((today).strftime("%Y-%m-%d"))
-    
-    logging.info(f"scraping {start_date} to {end_date}")
-    scrape_arxiv(
-        category=cats,
-        start_date=start_date, 
-        end_date=end_date,
-        db_file=db_file,
-        max_results=500
-    )
+    logging.info(f"scraping {today - timedelta(days=3)} to {today}")
+    harvester = Harvester(db_file, cats, page_size=500)
+    try:
+        harvester.run(datetime.combine(today - timedelta(days=3), datetime.min.time()),
+                      datetime.combine(today + timedelta(days=1), datetime.min.time()), window_days=1)
+    finally:
+        harvester.close()
+        metrics.write_summary('scrape_metrics.json', script='init_db', start=str(today - timedelta(days=3)), end=str(today))
     # retry failed queries
     # with open('failed_queries.txt', 'r') as f:
     #     queries = f.readlines()
@@ -203,5 +191,5 @@ if __name__ == '__main__':
     #         date_range = query.split('submittedDate:')[1].split('&')[0]
     #         formatted_query = f"{query.split('Failed query: ')[1]}&date_range={date_range}"
     #         formatted_queries.append(formatted_query)
-    # retry_queries(formatted_queries)
+    # retry_queries(formatted_queries, db_file)
 
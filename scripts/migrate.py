@@ -0,0 +1,44 @@
+"""
+Apply the numbered SQL files in scripts/migrations/ to a database, in order.
+
+The number of the last applied migration is kept in `PRAGMA user_version`, so running this
+again only applies new files. Each migration runs in its own transaction.
+
+    python scripts/migrate.py papers.db
+"""
+import logging, os, sqlite3, sys
+
+logging.basicConfig(level=logging.INFO)
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+
+
+def migrations():
+    for name in sorted(os.listdir(MIGRATIONS_DIR)):
+        if name.endswith('.sql'):
+            yield int(name.split('_', 1)[0]), name
+
+
+def migrate(db_file: str) -> int:
+    db = sqlite3.connect(db_file)
+    version = db.execute('PRAGMA user_version').fetchone()[0]
+    for number, name in migrations():
+        if number <= version:
+            continue
+        with open(os.path.join(MIGRATIONS_DIR, name)) as f:
+            sql = f.read()
+        logging.info(f"applying {name}")
+        try:
+            db.executescript(f"BEGIN;\n{sql}\nPRAGMA user_version = {number};\nCOMMIT;")
+        except sqlite3.Error:
+            if db.in_transaction:
+                db.execute('ROLLBACK')
+            raise
+        version = number
+    db.close()
+    return version
+
+
+if __name__ == '__main__':
+    db_file = sys.argv[1] if len(sys.argv) > 1 else 'papers.db'
+    logging.info(f"{db_file} is at schema version {migrate(db_file)}")
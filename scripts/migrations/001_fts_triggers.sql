@@ -0,0 +1,20 @@
+-- papers_summary_fts is an external-content table, so its old contents have to be removed with
+-- the special 'delete' command (passing the old values) rather than UPDATE/DELETE on the fts table,
+-- which would read the already-changed row from papers and leave stale tokens in the index.
+DROP TRIGGER IF EXISTS papers_au;
+DROP TRIGGER IF EXISTS papers_ad;
+
+CREATE TRIGGER papers_au AFTER UPDATE OF summary ON papers BEGIN
+  INSERT INTO papers_summary_fts(papers_summary_fts, rowid, summary)
+  VALUES ('delete', old.id, old.summary);
+  INSERT INTO papers_summary_fts(rowid, summary)
+  VALUES (new.id, new.summary);
+END;
+
+CREATE TRIGGER papers_ad AFTER DELETE ON papers BEGIN
+  INSERT INTO papers_summary_fts(papers_summary_fts, rowid, summary)
+  VALUES ('delete', old.id, old.summary);
+END;
+
+-- the old triggers may already have corrupted the index
+INSERT INTO papers_summary_fts(papers_summary_fts) VALUES ('rebuild');
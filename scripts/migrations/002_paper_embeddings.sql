@@ -0,0 +1,9 @@
+-- which papers are in the vector index, with which model, and which version of the abstract
+-- (papers.updated at embedding time). No foreign key: rows whose paper is gone are how the
+-- embedding job finds vectors to mark deleted.
+CREATE TABLE IF NOT EXISTS paper_embeddings (
+  paper_id INTEGER PRIMARY KEY,
+  model TEXT NOT NULL,
+  updated DATETIME NOT NULL,
+  embedded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
@@ -0,0 +1,13 @@
+-- top-k most similar papers per paper, precomputed by scripts/neighbors.py so the paper page
+-- is a single indexed lookup that keeps the kNN order and distances
+CREATE TABLE IF NOT EXISTS paper_neighbors (
+  paper_id INTEGER NOT NULL,
+  rank INTEGER NOT NULL,
+  neighbor_id INTEGER NOT NULL,
+  distance REAL NOT NULL,  -- hnswlib cosine distance, 1 - cosine similarity
+  computed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (paper_id, rank)
+) WITHOUT ROWID;
+
+-- finds the lists that point at a removed paper
+CREATE INDEX IF NOT EXISTS idx_paper_neighbors_neighbor ON paper_neighbors(neighbor_id);
@@ -0,0 +1,13 @@
+-- the listing pages with a (published, id) cursor; this index serves the seek and the
+-- ORDER BY published DESC, id DESC walk (scanned backwards), and supersedes idx_papers_published
+DROP INDEX IF EXISTS idx_papers_published;
+CREATE INDEX IF NOT EXISTS idx_papers_published_id ON papers(published, id);
+
+-- counters bumped by the pipeline whenever the corpus changes, so the app can tell when its
+-- cached counts (and anything else derived from the papers table) are stale
+CREATE TABLE IF NOT EXISTS corpus_meta (
+  key TEXT PRIMARY KEY,
+  value INTEGER NOT NULL DEFAULT 0,
+  updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+INSERT OR IGNORE INTO corpus_meta (key, value) VALUES ('papers_version', 0);
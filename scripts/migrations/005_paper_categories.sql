@@ -0,0 +1,40 @@
+-- papers.category is the comma-joined list of arxiv categories, which can only be filtered with
+-- LIKE '%cat%' (a full scan that also matches substrings). paper_categories has one row per
+-- (paper, category); published is copied in so a category listing, newest first, is a single
+-- walk down the primary key, and a category count is a range count on it.
+ALTER TABLE papers ADD COLUMN primary_category TEXT;
+
+CREATE TABLE IF NOT EXISTS paper_categories (
+  category TEXT NOT NULL,
+  published DATETIME NOT NULL,
+  paper_id INTEGER NOT NULL REFERENCES papers(id) ON DELETE CASCADE,
+  PRIMARY KEY (category, published, paper_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_paper_categories_paper ON paper_categories(paper_id);
+
+-- triggers can't use WITH, so the list is split by turning it into a json array
+CREATE TRIGGER IF NOT EXISTS papers_categories_ai AFTER INSERT ON papers BEGIN
+  INSERT OR IGNORE INTO paper_categories (category, published, paper_id)
+  SELECT value, new.published, new.id FROM json_each('["' || replace(replace(new.category, ' ', ''), ',', '","') || '"]')
+  WHERE value != '';
+END;
+
+CREATE TRIGGER IF NOT EXISTS papers_categories_au AFTER UPDATE OF category, published ON papers BEGIN
+  DELETE FROM paper_categories WHERE paper_id = old.id;
+  INSERT OR IGNORE INTO paper_categories (category, published, paper_id)
+  SELECT value, new.published, new.id FROM json_each('["' || replace(replace(new.category, ' ', ''), ',', '","') || '"]')
+  WHERE value != '';
+END;
+
+CREATE TRIGGER IF NOT EXISTS papers_categories_ad AFTER DELETE ON papers BEGIN
+  DELETE FROM paper_categories WHERE paper_id = old.id;
+END;
+
+-- backfill
+UPDATE papers SET primary_category = trim(substr(category, 1, instr(category || ',', ',') - 1))
+WHERE primary_category IS NULL;
+
+INSERT OR IGNORE INTO paper_categories (category, published, paper_id)
+SELECT j.value, p.published, p.id
+FROM papers p, json_each('["' || replace(replace(p.category, ' ', ''), ',', '","') || '"]') j
+WHERE j.value != '';
@@ -0,0 +1,26 @@
+-- papers per published day, kept up to date by triggers in the same transaction as the write,
+-- so corpus stats (see stats.py) add up a few hundred rows instead of scanning papers
+CREATE TABLE IF NOT EXISTS paper_daily_counts (
+  day TEXT PRIMARY KEY,  -- YYYY-MM-DD, the date part of papers.published (UTC)
+  papers INTEGER NOT NULL
+) WITHOUT ROWID;
+
+CREATE TRIGGER IF NOT EXISTS papers_daily_ai AFTER INSERT ON papers BEGIN
+  INSERT INTO paper_daily_counts (day, papers) VALUES (substr(new.published, 1, 10), 1)
+  ON CONFLICT(day) DO UPDATE SET papers = papers + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS papers_daily_au AFTER UPDATE OF published ON papers
+WHEN substr(old.published, 1, 10) != substr(new.published, 1, 10) BEGIN
+  UPDATE paper_daily_counts SET papers = papers - 1 WHERE day = substr(old.published, 1, 10);
+  INSERT INTO paper_daily_counts (day, papers) VALUES (substr(new.published, 1, 10), 1)
+  ON CONFLICT(day) DO UPDATE SET papers = papers + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS papers_daily_ad AFTER DELETE ON papers BEGIN
+  UPDATE paper_daily_counts SET papers = papers - 1 WHERE day = substr(old.published, 1, 10);
+END;
+
+DELETE FROM paper_daily_counts;
+INSERT INTO paper_daily_counts (day, papers)
+SELECT substr(published, 1, 10), COUNT(*) FROM papers GROUP BY 1;
@@ -0,0 +1,31 @@
+-- per-user "for you" feed, precomputed by scripts/recommend.py: recent papers ranked by
+-- similarity to a profile built from the user's saved papers
+CREATE TABLE IF NOT EXISTS user_recommendations (
+  user_id INTEGER NOT NULL,
+  rank INTEGER NOT NULL,
+  paper_id INTEGER NOT NULL,
+  score REAL NOT NULL,  -- cosine similarity to the closest profile vector
+  computed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (user_id, rank)
+) WITHOUT ROWID;
+
+-- users whose saved papers changed since their feed was computed; `version` lets the job clear
+-- only the marks it has seen, so a save made while it runs isn't lost
+CREATE TABLE IF NOT EXISTS user_feed_dirty (
+  user_id INTEGER PRIMARY KEY,
+  version INTEGER NOT NULL DEFAULT 1
+);
+
+CREATE TRIGGER IF NOT EXISTS user_saved_papers_feed_ai AFTER INSERT ON user_saved_papers BEGIN
+  INSERT INTO user_feed_dirty (user_id) VALUES (new.user_id)
+  ON CONFLICT(user_id) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS user_saved_papers_feed_ad AFTER DELETE ON user_saved_papers BEGIN
+  INSERT INTO user_feed_dirty (user_id) VALUES (old.user_id)
+  ON CONFLICT(user_id) DO UPDATE SET version = version + 1;
+END;
+
+-- everyone who has saved something gets a first feed
+INSERT OR IGNORE INTO user_feed_dirty (user_id) SELECT DISTINCT user_id FROM user_saved_papers;
+INSERT OR IGNORE INTO corpus_meta (key, value) VALUES ('feed_scored_through', 0);
@@ -0,0 +1,33 @@
+-- standing natural-language queries; scripts/alerts.py matches newly embedded papers against
+-- all of them after each ingest and queues hits in query_alerts
+CREATE TABLE IF NOT EXISTS saved_queries (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+  text TEXT NOT NULL,
+  embedding BLOB NOT NULL,  -- normalized float32 vector, in the same space as embeddings.npy
+  model TEXT NOT NULL,
+  threshold REAL NOT NULL,  -- minimum cosine similarity
+  categories TEXT NOT NULL DEFAULT '',  -- comma-joined; empty matches any category
+  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_saved_queries_user ON saved_queries(user_id);
+
+-- outbox of matches; (query_id, paper_id) is unique so re-running a batch never alerts twice,
+-- and users poll by id
+CREATE TABLE IF NOT EXISTS query_alerts (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  query_id INTEGER NOT NULL REFERENCES saved_queries(id) ON DELETE CASCADE,
+  user_id INTEGER NOT NULL,
+  paper_id INTEGER NOT NULL,
+  score REAL NOT NULL,
+  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  UNIQUE (query_id, paper_id)
+);
+CREATE INDEX IF NOT EXISTS idx_query_alerts_user ON query_alerts(user_id, id);
+
+CREATE TRIGGER IF NOT EXISTS saved_queries_ad AFTER DELETE ON saved_queries BEGIN
+  DELETE FROM query_alerts WHERE query_id = old.id;
+END;
+
+-- start from the papers embedded so far, so the first run doesn't alert on the whole corpus
+INSERT OR IGNORE INTO corpus_meta (key, value) SELECT 'alerts_scored_through', COALESCE(MAX(paper_id), 0) FROM paper_embeddings;
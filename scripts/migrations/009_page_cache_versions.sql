@@ -0,0 +1,13 @@
+-- the app caches rendered pages keyed on corpus_meta's *_version counters; a user's saved-papers
+-- pages also depend on what they've saved, so that gets its own counter
+ALTER TABLE users ADD COLUMN saved_version INTEGER NOT NULL DEFAULT 0;
+
+CREATE TRIGGER IF NOT EXISTS user_saved_papers_version_ai AFTER INSERT ON user_saved_papers BEGIN
+  UPDATE users SET saved_version = saved_version + 1 WHERE id = new.user_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS user_saved_papers_version_ad AFTER DELETE ON user_saved_papers BEGIN
+  UPDATE users SET saved_version = saved_version + 1 WHERE id = old.user_id;
+END;
+
+INSERT OR IGNORE INTO corpus_meta (key, value) VALUES ('embeddings_version', 0), ('neighbors_version', 0), ('feeds_version', 0);
@@ -0,0 +1,131 @@
+"""
+Batch job that precomputes the "similar papers" of every paper into `paper_neighbors`.
+
+Queries the index in large batches with `num_threads=-1` (all cores). By default only lists
+that can have changed since the last run are recomputed:
+  - papers with no list yet, or whose embedding is newer than their list (new/edited papers)
+  - papers whose list points at a paper that has since been removed or re-embedded
+  - papers that one of the new/edited papers is now closer to than their current k-th
+    neighbour (found from the new papers' own neighbours, since similarity is symmetric)
+
+Run after embed_texts.py:
+
+    python scripts/neighbors.py --db papers.db [--full]
+"""
+import argparse, logging, os, sqlite3, sys, time
+from typing import Iterable, List, Set
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from embed_index import EMBEDDINGS_FILE, INDEX_FILE, load_index
+from ingest import bump_version
+
+logging.basicConfig(level=logging.INFO)
+
+K = 10
+BATCH = 8192
+LOOKUP_CHUNK = 500
+
+
+def chunks(ids: List[int], size: int) -> Iterable[List[int]]:
+    for i in range(0, len(ids), size):
+        yield ids[i:i + size]
+
+
+def stale_papers(db: sqlite3.Connection) -> Set[int]:
+    # timestamps have one-second resolution: a list computed in the same second as an embedding
+    # may predate it, so ties count as stale (at worst a list is recomputed once more)
+    missing = db.execute('''
+        SELECT e.paper_id FROM paper_embeddings e
+        LEFT JOIN paper_neighbors n ON n.paper_id = e.paper_id AND n.rank = 0
+        WHERE n.paper_id IS NULL OR n.computed_at <= e.embedded_at
+    ''')
+    # a neighbor that's gone, or whose vector changed after the list was computed
+    dangling = db.execute('''
+        SELECT DISTINCT n.paper_id FROM paper_neighbors n
+        LEFT JOIN paper_embeddings e ON e.paper_id = n.neighbor_id
+        WHERE e.paper_id IS NULL OR e.embedded_at >= n.computed_at
+    ''')
+    return {row[0] for row in missing} | {row[0] for row in dangling}
+
+
+def kth_distances(db: sqlite3.Connection, ids: List[int], k: int) -> dict:
+    out = {}
+    for chunk in chunks(ids, LOOKUP_CHUNK):
+        out.update(db.execute(f"SELECT paper_id, distance FROM paper_neighbors WHERE rank = ? AND paper_id IN ({','.join('?' * len(chunk))})",
+                              [k - 1, *chunk]))
+    return out
+
+
+class NeighborJob:
+    def __init__(self, db_file: str, index_file: str = INDEX_FILE, embeddings_file: str = EMBEDDINGS_FILE,
+                 k: int = K, batch: int = BATCH):
+        self.db = sqlite3.connect(db_file)
+        self.vectors = np.load(embeddings_file, mmap_mode='r')
+        self.index = load_index(index_file, self.vectors.shape[1])
+        self.k = min(k, self.index.get_current_count() - 1)
+        self.batch = batch
+        self.queried = 0
+
+    def query(self, ids: List[int]):
+        vectors = np.asarray(self.vectors[ids], dtype=np.float32)
+        labels, dists = self.index.knn_query(vectors, k=self.k + 1, num_threads=-1)
+        rows = []
+        for paper_id, paper_labels, paper_dists in zip(ids, labels, dists):
+            # drop the paper itself (usually first, but not guaranteed with duplicates/approximate search)
+            pairs = [(int(l), float(d)) for l, d in zip(paper_labels, paper_dists) if l != paper_id][:self.k]
+            rows.extend((paper_id, rank, l, d) for rank, (l, d) in enumerate(pairs))
+        self.queried += len(ids)
+        return labels, dists, rows
+
+    def write(self, ids: List[int], rows: list):
+        with self.db:
+            self.db.executemany('DELETE FROM paper_neighbors WHERE paper_id = ?', [(i,) for i in ids])
+            self.db.executemany('INSERT INTO paper_neighbors (paper_id, rank, neighbor_id, distance) VALUES (?, ?, ?, ?)', rows)
+
+    def refresh(self, ids: List[int], find_affected: bool = False) -> Set[int]:
+        """Recompute the lists of `ids`; optionally return other papers whose lists these papers now belong in."""
+        affected = set()
+        for chunk in chunks(sorted(ids), self.batch):
+            labels, dists, rows = self.query(chunk)
+            self.write(chunk, rows)
+            if find_affected:
+                closest = {}
+                for l, d in zip(labels.ravel().tolist(), dists.ravel().tolist()):
+                    closest[l] = min(d, closest.get(l, 2.0))
+                kth = kth_distances(self.db, list(closest), self.k)
+                # lists shorter than k (tiny corpora) take any new neighbor
+                affected.update(l for l, d in closest.items() if l not in kth or d < kth[l])
+        return affected - set(ids)
+
+    def run(self, full: bool = False) -> dict:
+        start = time.monotonic()
+        if full:
+            ids = [row[0] for row in self.db.execute('SELECT paper_id FROM paper_embeddings')]
+            self.refresh(ids)
+            affected = set()
+        else:
+            ids = sorted(stale_papers(self.db))
+            logging.info(f"{len(ids)} new, edited, dangling or outdated neighbor lists")
+            affected = self.refresh(ids, find_affected=True)
+            logging.info(f"{len(affected)} existing lists gained a closer neighbor")
+            self.refresh(sorted(affected))
+        with self.db:
+            self.db.execute('DELETE FROM paper_neighbors WHERE paper_id NOT IN (SELECT paper_id FROM paper_embeddings)')
+            bump_version(self.db, 'neighbors_version')
+        return {'refreshed': len(ids), 'affected': len(affected), 'queried': self.queried, 'seconds': time.monotonic() - start}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default='papers.db')
+    parser.add_argument('--k', type=int, default=K)
+    parser.add_argument('--batch', type=int, default=BATCH)
+    parser.add_argument('--full', action='store_true', help='recompute every list')
+    args = parser.parse_args()
+
+    stats = NeighborJob(args.db, k=args.k, batch=args.batch).run(full=args.full)
+    logging.info(f"refreshed {stats['refreshed']} + {stats['affected']} lists ({stats['queried']} kNN queries) in {stats['seconds']:.1f}s")
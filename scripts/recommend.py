@@ -0,0 +1,203 @@
+"""
+Batch job that precomputes each user's "for you" feed into `user_recommendations`.
+
+A user's profile is the normalized centroid of their saved papers' embeddings, or (--profile
+multi) up to PROFILE_VECTORS k-means centroids of them, so someone who saves papers on two
+unrelated topics gets matches for both. All profiles are scored against the candidate papers
+(embedded papers published in the last RECENT_DAYS) with one matrix product per block of
+users x block of papers; a multi-vector user's score for a paper is the best of their vectors.
+No per-user kNN query is made.
+
+Incremental by default:
+  - users who saved or unsaved something since their last feed (user_feed_dirty, marked by
+    triggers) are rescored against every candidate
+  - everyone else only scores the papers embedded since the last run (ids past the
+    `feed_scored_through` mark, or re-embedded after it was set), merged with their stored
+    feed minus papers that aged out
+
+Run after embed_texts.py:
+
+    python scripts/recommend.py --db papers.db [--full] [--profile multi]
+"""
+import argparse, datetime, logging, os, sqlite3, sys, time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from embed_index import EMBEDDINGS_FILE
+from ingest import bump_version
+from neighbors import chunks
+from quantized import kmeans
+
+logging.basicConfig(level=logging.INFO)
+
+K = 50
+RECENT_DAYS = 30
+PROFILE_VECTORS = 3
+USER_BATCH = 1024  # profiles per matrix product
+PAPER_BATCH = 8192  # candidate papers per matrix product
+
+
+def build_profiles(vectors: np.ndarray, saved: Dict[int, List[int]], mode: str = 'centroid',
+                   per_user: int = PROFILE_VECTORS) -> Tuple[List[int], np.ndarray, np.ndarray]:
+    """(users, profile matrix, index of each profile's user); a user's profiles are contiguous rows."""
+    users, profiles, owners = [], [], []
+    for user_id, paper_ids in saved.items():
+        rows = np.asarray(vectors[sorted(paper_ids)], dtype=np.float32)
+        rows = rows[rows.any(axis=1)]  # saved papers that aren't embedded yet
+        if not len(rows):
+            continue
+        if mode == 'multi' and len(rows) > per_user:
+            centers = kmeans(rows, per_user, iterations=10, seed=user_id)
+        elif mode == 'multi':
+            centers = rows
+        else:
+            centers = rows.mean(axis=0, keepdims=True)
+        profiles.append(centers / np.maximum(np.linalg.norm(centers, axis=1, keepdims=True), 1e-12))
+        owners.extend([len(users)] * len(centers))
+        users.append(user_id)
+    if not users:
+        return [], np.zeros((0, vectors.shape[1]), dtype=np.float32), np.zeros(0, dtype=np.int64)
+    return users, np.vstack(profiles), np.array(owners)
+
+
+def top_k(profiles: np.ndarray, owners: np.ndarray, n_users: int, vectors: np.ndarray, candidates: np.ndarray,
+          exclude: List[set], k: int = K) -> Tuple[np.ndarray, np.ndarray]:
+    """Best `k` (paper ids, scores) per user, over `candidates` (paper ids, rows of `vectors`).
+
+    Scores are -inf where a user has fewer than k scorable candidates.
+    """
+    best_ids = np.full((n_users, 0), -1, dtype=np.int64)
+    best_scores = np.full((n_users, 0), -np.inf, dtype=np.float32)
+    starts = np.flatnonzero(np.r_[True, owners[1:] != owners[:-1]]) if len(owners) else np.zeros(0, dtype=np.int64)
+    for block in chunks(candidates, PAPER_BATCH):
+        block = np.asarray(block)
+        paper_vectors = np.asarray(vectors[block], dtype=np.float32)
+        # every profile against every paper in one product; reduceat takes each user's best vector
+        scores = np.maximum.reduceat(profiles @ paper_vectors.T, starts, axis=0)
+        column = {int(p): c for c, p in enumerate(block)}
+        for user, seen in enumerate(exclude):
+            hidden = [column[p] for p in seen if p in column]
+            scores[user, hidden] = -np.inf
+        ids = np.hstack([best_ids, np.broadcast_to(block, scores.shape)])
+        scores = np.hstack([best_scores, scores])
+        if scores.shape[1] > k:
+            keep = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            ids, scores = np.take_along_axis(ids, keep, 1), np.take_along_axis(scores, keep, 1)
+        best_ids, best_scores = ids, scores
+    order = np.argsort(-best_scores, axis=1)
+    return np.take_along_axis(best_ids, order, 1), np.take_along_axis(best_scores, order, 1)
+
+
+class FeedJob:
+    def __init__(self, db_file: str, embeddings_file: str = EMBEDDINGS_FILE, k: int = K, recent_days: int = RECENT_DAYS,
+                 profile: str = 'centroid', now: Optional[datetime.datetime] = None):
+        self.db = sqlite3.connect(db_file)
+        self.vectors = np.load(embeddings_file, mmap_mode='r')
+        self.k, self.profile = k, profile
+        now = now or datetime.datetime.now(datetime.timezone.utc)
+        self.since = (now - datetime.timedelta(days=recent_days)).strftime('%Y-%m-%dT%H:%M:%SZ')
+        self.scored = 0
+
+    def candidates(self, after: int = 0, embedded_since: Optional[str] = None) -> np.ndarray:
+        """Recent embedded papers with ids past `after`, plus (with `embedded_since`) any re-embedded since then."""
+        return np.array([row[0] for row in self.db.execute('''
+            SELECT e.paper_id FROM paper_embeddings e JOIN papers p ON p.id = e.paper_id
+            WHERE p.published >= ? AND (e.paper_id > ? OR e.embedded_at >= ?) AND e.paper_id < ? ORDER BY e.paper_id
+        ''', (self.since, after, embedded_since, len(self.vectors)))], dtype=np.int64)
+
+    def saved(self, users: Optional[List[int]] = None) -> Dict[int, List[int]]:
+        saved = {}
+        rows = self.db.execute('SELECT user_id, paper_id FROM user_saved_papers ORDER BY user_id')
+        wanted = None if users is None else set(users)
+        for user_id, paper_id in rows:
+            # papers saved after the embeddings file was last grown have no row in it yet
+            if (wanted is None or user_id in wanted) and paper_id < len(self.vectors):
+                saved.setdefault(user_id, []).append(paper_id)
+        return saved
+
+    def stored(self, users: List[int]) -> Dict[int, List[Tuple[int, float]]]:
+        # feeds as they are, minus papers that have aged out of the window
+        out = {}
+        for chunk in chunks(users, 500):
+            for user_id, paper_id, score in self.db.execute(f'''
+                SELECT r.user_id, r.paper_id, r.score FROM user_recommendations r JOIN papers p ON p.id = r.paper_id
+                WHERE p.published >= ? AND r.user_id IN ({','.join('?' * len(chunk))}) ORDER BY r.user_id, r.rank
+            ''', [self.since, *chunk]):
+                out.setdefault(user_id, []).append((paper_id, score))
+        return out
+
+    def score(self, saved: Dict[int, List[int]], candidates: np.ndarray, previous: Optional[dict] = None) -> Dict[int, list]:
+        feeds = {}
+        users = list(saved)
+        rescored = set(candidates.tolist())
+        for user_chunk in chunks(users, USER_BATCH):
+            chunk_saved = {u: saved[u] for u in user_chunk}
+            scored_users, profiles, owners = build_profiles(self.vectors, chunk_saved, self.profile)
+            if not scored_users:
+                continue
+            ids, scores = top_k(profiles, owners, len(scored_users), self.vectors, candidates,
+                                [set(chunk_saved[u]) for u in scored_users], self.k)
+            self.scored += len(profiles) * len(candidates)
+            for row, user_id in enumerate(scored_users):
+                feed = [(int(p), float(s)) for p, s in zip(ids[row], scores[row]) if np.isfinite(s)]
+                if previous is not None:
+                    # a rescored paper's old score goes, whether or not it made the new top k
+                    merged = {p: s for p, s in previous.get(user_id, []) if p not in rescored}
+                    merged.update(feed)
+                    feed = sorted(merged.items(), key=lambda item: item[1], reverse=True)[:self.k]
+                feeds[user_id] = feed
+        return feeds
+
+    def write(self, feeds: Dict[int, list], cleared: List[Tuple[int, int]] = ()):
+        with self.db:
+            self.db.executemany('DELETE FROM user_recommendations WHERE user_id = ?', [(u,) for u in feeds])
+            self.db.executemany('INSERT INTO user_recommendations (user_id, rank, paper_id, score) VALUES (?, ?, ?, ?)',
+                                [(u, rank, p, s) for u, feed in feeds.items() for rank, (p, s) in enumerate(feed)])
+            self.db.executemany('DELETE FROM user_feed_dirty WHERE user_id = ? AND version = ?', cleared)
+            bump_version(self.db, 'feeds_version')
+
+    def run(self, full: bool = False) -> dict:
+        start = time.monotonic()
+        mark, last_run = self.db.execute("SELECT value, updated_at FROM corpus_meta WHERE key = 'feed_scored_through'").fetchone()
+        started = self.db.execute('SELECT CURRENT_TIMESTAMP').fetchone()[0]
+        candidates = self.candidates()
+        scored_through = int(candidates.max()) if len(candidates) else mark
+        dirty = self.db.execute('SELECT user_id, version FROM user_feed_dirty').fetchall()
+        with_feeds = {row[0] for row in self.db.execute('SELECT DISTINCT user_id FROM user_recommendations')}
+
+        to_rebuild = None if full else [user_id for user_id, _ in dirty]
+        rebuilt = self.score(self.saved(to_rebuild), candidates)
+        # users left with nothing saved (or nothing embedded) lose their feed
+        rebuilt.update({u: [] for u in (with_feeds if full else to_rebuild) if u not in rebuilt})
+        self.write(rebuilt, dirty)
+        logging.info(f"rebuilt {len(rebuilt)} feeds")
+
+        updated = {}
+        new = self.candidates(after=mark, embedded_since=last_run)
+        if not full and len(new):
+            others = [u for u in self.saved() if u not in rebuilt]
+            updated = self.score(self.saved(others), new, previous=self.stored(others))
+            self.write(updated)
+            logging.info(f"merged {len(new)} new or re-embedded papers into {len(updated)} feeds")
+        with self.db:
+            # stamped with the start of the run, so papers re-embedded while it ran are picked up next time
+            self.db.execute("UPDATE corpus_meta SET value = ?, updated_at = ? WHERE key = 'feed_scored_through'",
+                            (scored_through, started))
+        return {'rebuilt': len(rebuilt), 'updated': len(updated), 'scored': self.scored, 'seconds': time.monotonic() - start}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default='papers.db')
+    parser.add_argument('--k', type=int, default=K)
+    parser.add_argument('--days', type=int, default=RECENT_DAYS, help='how far back candidate papers go')
+    parser.add_argument('--profile', default='centroid', choices=['centroid', 'multi'])
+    parser.add_argument('--full', action='store_true', help='rebuild every feed')
+    args = parser.parse_args()
+
+    stats = FeedJob(args.db, k=args.k, recent_days=args.days, profile=args.profile).run(full=args.full)
+    logging.info(f"rebuilt {stats['rebuilt']} and updated {stats['updated']} feeds "
+                 f"({stats['scored'] / 1e6:.1f}M profile x paper scores) in {stats['seconds']:.1f}s")
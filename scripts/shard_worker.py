@@ -0,0 +1,66 @@
+"""
+Serve vector index shards listed in shards.json (see shards.py and build_shards.py).
+
+With no --shard, every shard in the config gets its own worker process on this machine, which
+is all a single-box setup needs. Across several machines, run it on each one with the shards
+that live there (and --listen 0.0.0.0 or the machine's address). It exits as soon as one of its
+workers dies, so run it under something that restarts it; meanwhile the app answers from the
+remaining shards.
+
+    python scripts/shard_worker.py
+    python scripts/shard_worker.py --shard cs.CV --shard cs.LG --listen 0.0.0.0
+"""
+import argparse, json, logging, multiprocessing, os, signal, sys
+from multiprocessing.connection import wait
+from typing import List, Optional
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from shards import EF, SHARDS_FILE, authkey_for, serve
+
+
+def run_worker(*args):
+    logging.basicConfig(level=logging.INFO, format=f'%(asctime)s [{multiprocessing.current_process().name}] %(message)s')
+    serve(*args)
+
+
+def start_workers(config_file: str = SHARDS_FILE, names: Optional[List[str]] = None, listen: Optional[str] = None) -> List[multiprocessing.Process]:
+    with open(config_file) as f:
+        config = json.load(f)
+    base = os.path.dirname(os.path.abspath(config_file))
+    unknown = set(names or []) - {shard['name'] for shard in config['shards']}
+    if unknown:
+        raise ValueError(f"no such shards in {config_file}: {', '.join(sorted(unknown))}")
+    processes = []
+    for shard in config['shards']:
+        if names and shard['name'] not in names:
+            continue
+        address = (listen or shard['address'][0], shard['address'][1])
+        process = multiprocessing.get_context('spawn').Process(
+            target=run_worker, name=f"shard-{shard['name']}", daemon=True,
+            args=(os.path.join(base, shard['index']), config['dim'], address, authkey_for(config), config.get('ef', EF)))
+        process.start()
+        processes.append(process)
+    return processes
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--config', default=SHARDS_FILE)
+    parser.add_argument('--shard', action='append', help='serve only this shard (repeatable); default all')
+    parser.add_argument('--listen', help='address to bind instead of the one in the config')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    processes = start_workers(args.config, args.shard, args.listen)
+    try:
+        dead = wait([p.sentinel for p in processes])
+        for p in processes:
+            if p.sentinel in dead:
+                logging.error(f"{p.name} exited with {p.exitcode}")
+        sys.exit(1)
+    finally:
+        for p in processes:
+            p.terminate()
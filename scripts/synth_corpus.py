@@ -0,0 +1,144 @@
+"""
+Deterministic synthetic corpus for benchmarks: papers.db (schema + FTS + migrations) and
+embeddings.npy, in the layout the app and the pipeline scripts expect.
+
+Abstracts are drawn from a Zipfian vocabulary so FTS terms range from near-universal to rare,
+categories follow a skewed cs.* mix with cross-lists, publication dates are spread over the
+--years up to --end, and embeddings are unit vectors around per-topic centers. --end defaults
+to a fixed date, so the same --papers/--seed/--dim/--end give the same papers and vectors and
+results from different commits are comparable (the /about windows, which count back from now,
+are empty unless --end is recent). No index is built here; that's part of what bench_suite.py
+measures.
+
+    python scripts/synth_corpus.py --out bench_corpus/100k --papers 100000
+"""
+import argparse, json, os, sqlite3, sys, time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from embed_index import EmbeddingStore
+from fake_arxiv import WORDS
+from migrate import migrate
+
+MANIFEST = 'corpus.json'
+END = '2025-01-01'  # newest publication date unless --end says otherwise; fixed so reruns match
+CATEGORIES = ['cs.LG', 'cs.CV', 'cs.CL', 'cs.AI', 'cs.RO', 'cs.IR', 'cs.SY', 'cs.HC', 'cs.SI', 'cs.MA']
+WEIGHTS = [30, 20, 15, 12, 6, 5, 4, 4, 2, 2]
+VOCAB = 20000
+SUMMARY_WORDS, TITLE_WORDS = 80, 8
+TOPICS = 1000
+CHUNK = 50000
+
+
+def vocabulary(size: int = VOCAB, seed: int = 0) -> list:
+    """`WORDS` first (the most frequent), then made-up words; order is frequency rank."""
+    rng = np.random.default_rng(seed)
+    syllables = [c + v for c in 'bdfgklmnprstvz' for v in 'aeiou']
+    words = dict.fromkeys(WORDS)
+    while len(words) < size:
+        words[''.join(rng.choice(syllables, size=rng.integers(2, 5)))] = None
+    return list(words)
+
+
+def zipf_weights(size: int, s: float = 1.07) -> np.ndarray:
+    weights = 1.0 / np.arange(1, size + 1) ** s
+    return weights / weights.sum()
+
+
+def paper_rows(n: int, seed: int, years: float, end: datetime):
+    rng = np.random.default_rng(seed)
+    words = np.array(vocabulary(seed=seed))
+    p = zipf_weights(len(words))
+    category_p = np.array(WEIGHTS, dtype=np.float64) / sum(WEIGHTS)
+    span = int(years * 365 * 86400)
+    for first in range(1, n + 1, CHUNK):
+        rows = min(CHUNK, n + 1 - first)
+        summaries = words[rng.choice(len(words), size=(rows, SUMMARY_WORDS), p=p)]
+        titles = words[rng.choice(len(words), size=(rows, TITLE_WORDS), p=p)]
+        ages = rng.integers(0, span, size=rows)
+        revised = rng.random(rows) < 0.2
+        primaries = rng.choice(len(CATEGORIES), size=rows, p=category_p)
+        extras = rng.integers(0, 3, size=rows)
+        for i in range(rows):
+            paper_id = first + i
+            published = end - timedelta(seconds=int(ages[i]))
+            updated = published + timedelta(days=int(rng.integers(1, 60))) if revised[i] else published
+            cats = dict.fromkeys([CATEGORIES[primaries[i]], *rng.choice(CATEGORIES, size=extras[i], p=category_p)])
+            yield (paper_id, ' '.join(titles[i]).capitalize(), f'http://arxiv.org/abs/synthetic.{paper_id:07d}v1',
+                   published.strftime('%Y-%m-%dT%H:%M:%SZ'), min(updated, end).strftime('%Y-%m-%dT%H:%M:%SZ'),
+                   ' '.join(summaries[i]), f'Author {paper_id % 997}, Author {paper_id % 991}', ', '.join(cats))
+
+
+def write_embeddings(path: str, n: int, dim: int, seed: int):
+    """Row `id` is paper `id`'s unit vector (row 0 stays zero, as in the real file)."""
+    rng = np.random.default_rng(seed + 1)
+    centers = rng.standard_normal((TOPICS, dim), dtype=np.float32)
+
+    def chunks():
+        for first in range(1, n + 1, CHUNK):
+            rows = min(CHUNK, n + 1 - first)
+            vectors = centers[rng.integers(TOPICS, size=rows)] + 0.6 * rng.standard_normal((rows, dim), dtype=np.float32)
+            vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+            yield list(range(first, first + rows)), vectors
+    EmbeddingStore(path).create(dim, n + 1, rows=chunks())
+
+
+def generate(out_dir: str, n: int, dim: int = 768, seed: int = 0, years: float = 5, end: str = END) -> dict:
+    """Write papers.db and embeddings.npy into `out_dir` (replacing them) and return the manifest."""
+    os.makedirs(out_dir, exist_ok=True)
+    end_time = datetime.strptime(end, '%Y-%m-%d')
+    db_file = os.path.join(out_dir, 'papers.db')
+    for name in (MANIFEST, 'papers.db', 'papers.db-wal', 'papers.db-shm', 'index.bin'):
+        if os.path.exists(os.path.join(out_dir, name)):
+            os.remove(os.path.join(out_dir, name))
+
+    start = time.perf_counter()
+    db = sqlite3.connect(db_file)
+    for script in ('schema.sql', 'fts5.sql'):
+        with open(os.path.join(REPO_ROOT, 'scripts', script)) as f:
+            db.executescript(f.read())
+    with db:
+        db.executemany('''
+            INSERT INTO papers (id, title, arxiv_id, published, updated, summary, author, category, pdf_link, abstract_link, arxiv_link)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, '', '', '')
+        ''', paper_rows(n, seed, years, end_time))
+    db.close()
+    migrate(db_file)  # backfills paper_categories, primary_category and the daily counts
+    db = sqlite3.connect(db_file)
+    db.execute('ANALYZE')
+    db.close()
+    db_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    write_embeddings(os.path.join(out_dir, 'embeddings.npy'), n, dim, seed)
+    manifest = {'papers': n, 'dim': dim, 'seed': seed, 'years': years, 'end': end_time.strftime('%Y-%m-%dT%H:%M:%SZ'),
+                'db_seconds': db_seconds, 'embeddings_seconds': time.perf_counter() - start}
+    # written last: a corpus without a manifest is incomplete
+    with open(os.path.join(out_dir, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=1)
+    return manifest
+
+
+def load_manifest(out_dir: str):
+    path = os.path.join(out_dir, MANIFEST)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--out', required=True)
+    parser.add_argument('--papers', type=int, default=100000)
+    parser.add_argument('--dim', type=int, default=768)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--years', type=float, default=5, help='publication dates are spread over this many years')
+    parser.add_argument('--end', default=END, help='YYYY-MM-DD of the newest paper')
+    args = parser.parse_args()
+    manifest = generate(args.out, args.papers, args.dim, args.seed, args.years, args.end)
+    print(json.dumps(manifest, indent=1))
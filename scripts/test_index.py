@@ -1,4 +1,4 @@
-import pickle
+import numpy as np
 import torch
 from transformers import AutoProcessor, AutoModel
 import sqlite3
@@ -6,8 +6,9 @@ import sqlite3
 processor = AutoProcessor.from_pretrained("google/siglip-base-patch16-224")
 model = AutoModel.from_pretrained("google/siglip-base-patch16-224")
 
-with open('index.pkl', 'rb') as f:
-    index = pickle.load(f)
+from embed_index import EMBEDDINGS_FILE, INDEX_FILE, load_index
+
+index = load_index(INDEX_FILE, np.load(EMBEDDINGS_FILE, mmap_mode='r').shape[1])
 
 prompt = "neuroscience"
 
@@ -0,0 +1,222 @@
+"""
+Scatter-gather vector search over index shards served by separate processes.
+
+The corpus is split (by primary category or id range, see scripts/build_shards.py) into
+hnswlib indexes. Each one is loaded by a small worker process (scripts/shard_worker.py) that
+answers kNN requests over `multiprocessing.connection`: pickled numpy arrays on an
+authenticated socket. Workers can run on this box or on others; shards.json says where each
+one listens.
+
+`ShardedIndex` stands in for the single hnswlib index in the app. `knn_query` sends the
+query to every shard in parallel, waits at most `timeout` seconds and merges the per-shard
+top-k (each already sorted by distance) with a heap. A shard that's slow, down or erroring is
+left out of that answer (partial results, logged and counted in metrics) and skipped for
+`retry_after` seconds, so while it's gone it doesn't add its timeout to every query.
+"""
+import heapq, itertools, json, logging, os, socket, struct, threading, time
+from concurrent.futures import ThreadPoolExecutor, wait
+from multiprocessing.connection import Connection, Listener, answer_challenge, deliver_challenge
+from typing import List, Optional, Sequence, Tuple
+
+import hnswlib
+import numpy as np
+
+import metrics
+from retrieval import knn_query
+
+SHARDS_FILE = 'shards.json'  # written by scripts/build_shards.py
+TIMEOUT = 0.5  # seconds a query waits for the slowest shard
+RETRY_AFTER = 5.0  # seconds a failed shard is skipped before it's tried again
+MAX_IDLE = 8  # open connections kept per shard (one per concurrent query in flight)
+EF = 50
+
+logger = logging.getLogger('arxivr.shards')
+
+
+class ShardError(Exception):
+    pass
+
+
+def authkey_for(config: dict) -> bytes:
+    return os.environ.get('ARXIVR_SHARD_AUTHKEY', config.get('authkey', '')).encode()
+
+
+def serve(index_file: str, dim: int, address: Tuple[str, int], authkey: bytes, ef: int = EF):
+    """Load one shard's index and answer requests until killed (one thread per connection)."""
+    index = hnswlib.Index(space='cosine', dim=dim)
+    index.load_index(index_file)
+    index.set_ef(ef)
+    count = index.get_current_count()
+    # the default backlog of 1 makes concurrent connects from the coordinator stall
+    with Listener(tuple(address), authkey=authkey, backlog=64) as listener:
+        logger.info(f"serving {count} vectors from {index_file} on {listener.address}")
+        while True:
+            try:
+                conn = listener.accept()
+            except Exception as e:  # failed handshake, client went away
+                logger.warning(f"rejected connection: {e!r}")
+                continue
+            threading.Thread(target=_handle, args=(conn, index, count), daemon=True).start()
+
+
+def _handle(conn: Connection, index: hnswlib.Index, count: int):
+    with conn:
+        while True:
+            try:
+                op, *args = conn.recv()
+            except (EOFError, OSError):
+                return
+            try:
+                if op == 'knn':
+                    vectors, k = args
+                    reply = ('ok', knn_query(index, vectors, min(k, count)))
+                elif op == 'count':
+                    reply = ('ok', count)
+                else:
+                    reply = ('error', f"unknown op {op!r}")
+            except Exception as e:
+                reply = ('error', repr(e))
+            try:
+                conn.send(reply)
+            except OSError:
+                return  # the coordinator gave up on this request and closed the connection
+
+
+class Shard:
+    """Client side of one worker: a few reusable connections and when it last failed."""
+
+    def __init__(self, name: str, address: Sequence, authkey: bytes, papers: int = 0):
+        self.name, self.address, self.authkey, self.papers = name, (address[0], int(address[1])), authkey, papers
+        self.idle: List[Connection] = []
+        self.lock = threading.Lock()
+        self.down_until = 0.0
+
+    def _connect(self, timeout: float) -> Connection:
+        # like multiprocessing.connection.Client, but the connect and the auth handshake are bounded:
+        # a stopped worker still accepts TCP connections (the kernel does), it just never answers
+        sock = socket.create_connection(self.address, timeout=timeout)
+        sock.settimeout(None)
+        limit = struct.pack('ll', int(timeout), int(timeout % 1 * 1e6))
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVTIMEO, limit)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDTIMEO, limit)
+        conn = Connection(sock.detach())
+        try:
+            answer_challenge(conn, self.authkey)
+            deliver_challenge(conn, self.authkey)
+        except BaseException:
+            conn.close()
+            raise
+        return conn
+
+    def call(self, request: tuple, timeout: float):
+        deadline = time.monotonic() + timeout
+        with self.lock:
+            conn = self.idle.pop() if self.idle else None
+        if conn is None:
+            conn = self._connect(timeout)
+        try:
+            conn.send(request)
+            if not conn.poll(max(deadline - time.monotonic(), 0)):
+                raise TimeoutError(f"no answer within {timeout}s")
+            status, payload = conn.recv()
+        except BaseException:
+            conn.close()  # a late answer would otherwise be read as the next request's
+            raise
+        with self.lock:
+            if len(self.idle) < MAX_IDLE:
+                self.idle.append(conn)
+                conn = None
+        if conn is not None:
+            conn.close()
+        if status != 'ok':
+            raise ShardError(payload)
+        return payload
+
+    def close(self):
+        with self.lock:
+            for conn in self.idle:
+                conn.close()
+            self.idle = []
+
+
+class ShardedIndex:
+    """hnswlib-shaped (`knn_query`, `get_current_count`, `dim`) front for a set of shard workers."""
+
+    def __init__(self, shards: List[Shard], dim: int, timeout: float = TIMEOUT, retry_after: float = RETRY_AFTER):
+        self.shards, self.dim, self.timeout, self.retry_after = shards, dim, timeout, retry_after
+        self.pool = ThreadPoolExecutor(max_workers=len(shards) * MAX_IDLE, thread_name_prefix='shard')
+
+    def _failed(self, shard: Shard, reason: str, error):
+        shard.down_until = time.monotonic() + self.retry_after
+        metrics.SHARD_FAILURES.inc(shard=shard.name, reason=reason)
+        logger.warning(f"shard {shard.name} {reason}: {error!r}; skipping it for {self.retry_after}s")
+
+    def _query(self, shard: Shard, vectors: np.ndarray, k: int):
+        with metrics.SHARD_SECONDS.time(shard=shard.name):
+            return shard.call(('knn', vectors, k), self.timeout)
+
+    def search(self, vectors: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray, List[str]]:
+        """Top-`k` labels and distances per query row from the shards that answered in time, and the names of those that didn't."""
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        now = time.monotonic()
+        live = [shard for shard in self.shards if shard.down_until <= now]
+        missing = [shard.name for shard in self.shards if shard.down_until > now]
+        futures = {self.pool.submit(self._query, shard, vectors, k): shard for shard in live}
+        done, _ = wait(futures, timeout=self.timeout)
+        answers = []
+        for future, shard in futures.items():
+            if future not in done:
+                self._failed(shard, 'timeout', TimeoutError(f"no answer within {self.timeout}s"))
+                missing.append(shard.name)
+            elif future.exception() is not None:
+                error = future.exception()
+                self._failed(shard, 'timeout' if isinstance(error, (TimeoutError, BlockingIOError)) else 'error', error)
+                missing.append(shard.name)
+            else:
+                answers.append(future.result())
+        if missing:
+            metrics.PARTIAL_RESULTS.inc()
+
+        width = min(k, sum(labels.shape[1] for labels, _ in answers))
+        out_labels = np.zeros((len(vectors), width), dtype=np.uint64)
+        out_dists = np.zeros((len(vectors), width), dtype=np.float32)
+        for row in range(len(vectors)):
+            # each shard's row is sorted by distance already, so a k-way merge is enough
+            merged = heapq.merge(*(zip(dists[row].tolist(), labels[row].tolist()) for labels, dists in answers))
+            for col, (dist, label) in enumerate(itertools.islice(merged, width)):
+                out_labels[row, col], out_dists[row, col] = label, dist
+        return out_labels, out_dists, missing
+
+    def knn_query(self, vectors: np.ndarray, k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        labels, dists, _ = self.search(vectors, k)
+        return labels, dists
+
+    def get_current_count(self) -> int:
+        # what the shards were built with (refreshed from the workers at load), so a missing
+        # shard doesn't shrink the k callers ask for
+        return sum(shard.papers for shard in self.shards)
+
+    def refresh_counts(self):
+        for shard in self.shards:
+            try:
+                shard.papers = shard.call(('count',), self.timeout)
+            except Exception as e:
+                logger.warning(f"couldn't get the size of shard {shard.name}: {e!r}")
+
+    def close(self):
+        self.pool.shutdown(wait=False)
+        for shard in self.shards:
+            shard.close()
+
+
+def load_sharded(path: str = SHARDS_FILE, timeout: Optional[float] = None) -> Optional[ShardedIndex]:
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        config = json.load(f)
+    authkey = authkey_for(config)
+    shards = [Shard(s['name'], s['address'], authkey, s.get('papers', 0)) for s in config['shards']]
+    index = ShardedIndex(shards, config['dim'], timeout if timeout is not None else config.get('timeout', TIMEOUT),
+                         config.get('retry_after', RETRY_AFTER))
+    index.refresh_counts()
+    return index
@@ -0,0 +1,54 @@
+"""
+Corpus stats (paper count, date bounds, papers published in the last 24/72/168 hours) read from
+the paper_daily_counts rollup that triggers maintain at ingest (scripts/migrations/006).
+
+Whole days come from the rollup; only the partial day at the start of each window is counted
+from papers, as a range on idx_papers_published. So a stats read costs O(days in the corpus)
+rather than several scans of papers, and `StatsCache` keeps the result around for a short TTL.
+"""
+import datetime
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+WINDOWS = (24, 72, 168)  # hours
+TTL = 60  # seconds
+ISO_FORMAT = '%Y-%m-%dT%H:%M:%SZ'  # how arxiv (and so papers.published) writes timestamps
+
+
+def papers_since(db: sqlite3.Connection, since: datetime.datetime) -> int:
+    """Papers published at or after `since` (UTC)."""
+    day = since.strftime('%Y-%m-%d')
+    next_day = (since + datetime.timedelta(days=1)).strftime('%Y-%m-%d')
+    whole_days = db.execute('SELECT COALESCE(SUM(papers), 0) FROM paper_daily_counts WHERE day > ?', (day,)).fetchone()[0]
+    # published is an ISO string, so compare it with ISO strings (not datetimes)
+    partial_day = db.execute('SELECT COUNT(*) FROM papers WHERE published >= ? AND published < ?',
+                             (since.strftime(ISO_FORMAT), next_day)).fetchone()[0]
+    return whole_days + partial_day
+
+
+def corpus_stats(db: sqlite3.Connection, now: Optional[datetime.datetime] = None) -> Dict:
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    total, earliest, latest = db.execute(
+        'SELECT COALESCE(SUM(papers), 0), MIN(day), MAX(day) FROM paper_daily_counts WHERE papers > 0').fetchone()
+    stats = {'papers': total, 'earliest': earliest, 'latest': latest, 'as_of': now.strftime(ISO_FORMAT)}
+    for hours in WINDOWS:
+        stats[f'last_{hours}h'] = papers_since(db, now - datetime.timedelta(hours=hours))
+    return stats
+
+
+class StatsCache:
+    """`corpus_stats`, recomputed at most once per `ttl` seconds per process."""
+
+    def __init__(self, ttl: float = TTL):
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.stats, self.expires = None, 0.0
+
+    def get(self, db: sqlite3.Connection) -> Dict:
+        with self.lock:
+            if self.stats is None or time.monotonic() >= self.expires:
+                self.stats = corpus_stats(db)
+                self.expires = time.monotonic() + self.ttl
+            return self.stats
@@ -0,0 +1,184 @@
+"""
+Harvester end to end against the fake arXiv API (scripts/fake_arxiv.py): full harvest, resume
+from a checkpoint, empty-page retries, failed windows and re-fetching recent windows.
+
+    python -m pytest tests
+"""
+import os, re, sqlite3, sys, threading
+from datetime import datetime, timedelta
+from http.server import ThreadingHTTPServer
+from urllib.parse import unquote
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [REPO_ROOT, os.path.join(REPO_ROOT, 'scripts')]
+
+from fake_arxiv import CATEGORIES, FakeArxivHandler, build_feed, window_papers
+from harvest import Harvester
+from migrate import migrate
+
+PAPERS_PER_DAY = 40
+START, END = datetime(2021, 3, 1), datetime(2021, 3, 7)
+
+
+class ScriptedHandler(FakeArxivHandler):
+    """The fake API, plus a log of (window_start, offset) requests and scripted empty answers.
+
+    `empty[window_start]` is how many more requests for that window get a 200 with no entries
+    (reporting `empty_total`, 0 by default, as arXiv does when it hiccups);
+    `empty[window_start, offset]` does the same for one page of it.
+    """
+    papers_per_day = PAPERS_PER_DAY
+    lock = threading.Lock()
+
+    def do_GET(self):
+        query = unquote(self.path.split('?', 1)[-1])
+        window_start = re.search(r'submittedDate:\[(\d{14})', query).group(1)
+        offset = int(re.search(r'start=(\d+)', query).group(1))
+        with self.lock:
+            self.requests.append((window_start, offset))
+            key = (window_start, offset) if (window_start, offset) in self.empty else window_start
+            empty = self.empty.get(key, 0)
+            if empty:
+                self.empty[key] = empty - 1
+        if empty:
+            self._send(build_feed([], total=self.empty_total))
+        else:
+            super().do_GET()
+
+
+@pytest.fixture
+def api():
+    handler = type('Handler', (ScriptedHandler,), {'requests': [], 'empty': {}, 'empty_total': 0})
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address[:2]
+    yield handler, f"http://{host}:{port}/api/query?search_query="
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def db_file(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # failed_queries.txt goes to the working directory
+    path = str(tmp_path / 'papers.db')
+    db = sqlite3.connect(path)
+    for script in ('schema.sql', 'fts5.sql'):
+        with open(os.path.join(REPO_ROOT, 'scripts', script)) as f:
+            db.executescript(f.read())
+    db.close()
+    migrate(path)
+    return path
+
+
+def harvest(db_file, url, start=START, end=END, **kwargs):
+    options = dict(workers=2, rate=1000, page_size=25, page_retries=3, recent_days=0)
+    options.update(kwargs)
+    harvester = Harvester(db_file, CATEGORIES, base_url=url, **options)
+    try:
+        return harvester.run(start, end, window_days=2)
+    finally:
+        harvester.close()
+
+
+def expected_papers(start=START, end=END) -> int:
+    return len(window_papers(start, end - timedelta(seconds=1), CATEGORIES, PAPERS_PER_DAY))
+
+
+def windows(db_file):
+    db = sqlite3.connect(db_file)
+    rows = db.execute('SELECT window_start, status, next_start FROM harvest_windows ORDER BY window_start').fetchall()
+    db.close()
+    return rows
+
+
+def paper_count(db_file) -> int:
+    db = sqlite3.connect(db_file)
+    count = db.execute('SELECT COUNT(*) FROM papers').fetchone()[0]
+    db.close()
+    return count
+
+
+def test_full_harvest(api, db_file):
+    handler, url = api
+    assert harvest(db_file, url) == expected_papers()
+    assert paper_count(db_file) == expected_papers()
+    assert [status for _, status, _ in windows(db_file)] == ['done'] * 3
+
+    # a second run has nothing left to fetch
+    handler.requests.clear()
+    assert harvest(db_file, url) == 0
+    assert handler.requests == []
+
+
+def test_empty_page_is_retried(api, db_file):
+    handler, url = api
+    handler.empty['20210303000000'] = 2  # two hiccups, then the real page
+    assert harvest(db_file, url) == expected_papers()
+    assert [status for _, status, _ in windows(db_file)] == ['done'] * 3
+    assert handler.requests.count(('20210303000000', 0)) == 3
+
+
+def test_failed_window_then_resume(api, db_file):
+    handler, url = api
+    handler.empty_total = 80  # empty pages that still claim results: not a genuinely empty window
+    handler.empty['20210305000000'] = 3
+    fetched = harvest(db_file, url)
+    state = {start: (status, next_start) for start, status, next_start in windows(db_file)}
+    assert state['20210305000000'] == ('failed', 0)
+    assert fetched == paper_count(db_file) == expected_papers() - expected_papers(datetime(2021, 3, 5), END)
+    with open('failed_queries.txt') as f:
+        assert '20210305000000' in f.read()
+
+    # the next run only asks for the failed window
+    handler.requests.clear()
+    harvest(db_file, url)
+    assert {start for start, _ in handler.requests} == {'20210305000000'}
+    assert paper_count(db_file) == expected_papers()
+    assert [status for _, status, _ in windows(db_file)] == ['done'] * 3
+
+
+def test_resume_from_checkpointed_page(api, db_file):
+    handler, url = api
+    # fail the window's second page: its first page is committed along with next_start=25
+    handler.empty_total = 80
+    handler.empty['20210301000000', 25] = 3
+    end = START + timedelta(days=2)
+    assert harvest(db_file, url, START, end, page_size=25) == paper_count(db_file) == 25
+    assert windows(db_file) == [('20210301000000', 'failed', 25)]
+
+    handler.requests.clear()
+    harvest(db_file, url, START, end, page_size=25)
+    assert handler.requests[0] == ('20210301000000', 25)
+    assert ('20210301000000', 0) not in handler.requests
+    assert [status for _, status, _ in windows(db_file)] == ['done']
+    assert paper_count(db_file) == expected_papers(START, end)
+
+
+def test_genuinely_empty_window_is_done(api, db_file):
+    handler, url = api
+    handler.empty['20210301000000'] = 3  # every attempt reports totalResults 0
+    harvest(db_file, url)
+    state = {start: status for start, status, _ in windows(db_file)}
+    assert state['20210301000000'] == 'done'
+    assert not os.path.exists('failed_queries.txt')
+
+
+def test_recent_windows_are_refetched(api, db_file):
+    handler, url = api
+    today = datetime.combine(datetime.now().date(), datetime.min.time())
+    start, end = today - timedelta(days=6), today + timedelta(days=1)
+    harvest(db_file, url, start, end, recent_days=3)
+    assert all(status == 'done' for _, status, _ in windows(db_file))
+
+    handler.requests.clear()
+    harvest(db_file, url, start, end, recent_days=3)
+    recent = (datetime.now() - timedelta(days=3)).strftime('%Y%m%d%H%M%S')
+    db = sqlite3.connect(db_file)
+    lagging = {s for s, e in db.execute('SELECT window_start, window_end FROM harvest_windows') if e >= recent}
+    db.close()
+    # windows ending inside the announcement lag are asked for again, from the top; older ones stay done
+    assert 0 < len(lagging) < len(windows(db_file))
+    assert {window for window, _ in handler.requests} == lagging
+    assert {(window, 0) for window in lagging} <= set(handler.requests)